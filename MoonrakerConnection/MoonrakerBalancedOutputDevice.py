@@ -0,0 +1,251 @@
+import json
+import os.path
+import re
+from time import monotonic
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtNetwork import QNetworkReply
+else:
+    from PyQt5.QtNetwork import QNetworkReply
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.i18n import i18nCatalog
+from UM.Logger import Logger
+from UM.Message import Message
+from UM.OutputDevice import OutputDeviceError
+from UM.OutputDevice.OutputDevice import OutputDevice
+
+from .MoonrakerGroupOutputDevice import MoonrakerUploadTarget
+from .MoonrakerMetrics import getThroughput
+from .MoonrakerSettings import getConfig
+from .MoonrakerUpload import SpoolFileJob, getOutputFormat, translateFileName, removeSpoolFile, createHeaders, formatSize
+
+catalog = i18nCatalog("cura")
+
+# seconds until the cached state of a printer is queried again
+BALANCE_STATUS_TTL = 30.0
+# the job queue changes less often than the state of the printer
+BALANCE_QUEUE_TTL = 60.0
+# seconds until an unanswered query fails - the cache keeps the last known values
+BALANCE_REQUEST_TIMEOUT = 5.0
+# assumed transfer rate (bytes/s) of printers without a finished upload
+BALANCE_DEFAULT_THROUGHPUT = 1024 * 1024
+# state and progress of the current print job with a single request
+BALANCE_STATUS_QUERY = 'printer/objects/query?webhooks&print_stats&virtual_sdcard'
+
+class MoonrakerBalancedOutputDevice(OutputDevice):
+    # Uploads to the printer of the group which gets the job done first. The state of the printers is queried in the
+    # background (all printers at once, cached with BALANCE_STATUS_TTL / BALANCE_QUEUE_TTL) when the targets change and
+    # when a slice is ready, so requestWrite picks the target from the cache without waiting for the printers.
+    def __init__(self, groupId: str, groupName: str) -> None:
+        super().__init__("MoonrakerBalancedOutputDevice@" + groupId)
+        self._groupName = groupName
+        self._targets = {}
+        # printerId => cached state of the printer (see _onStatus and _onQueueStatus)
+        self._cache = {}
+        self._inFlight = set()
+        self._spoolJob = None
+        self._target = None
+        self.setIconName("print")
+        self.setPriority(3)
+        CuraApplication.getInstance().getPrintInformation().currentPrintTimeChanged.connect(self.refresh)
+        Logger.log("d", "MoonrakerBalancedOutputDevice for group '{}' created.".format(groupId))
+
+    def close(self) -> None:
+        CuraApplication.getInstance().getPrintInformation().currentPrintTimeChanged.disconnect(self.refresh)
+
+    def updateTargets(self, targets: dict) -> None:
+        # targets: printerId => (name, config)
+        self._targets = targets
+        self._cache = {printerId: entry for printerId, entry in self._cache.items() if printerId in targets}
+        description = catalog.i18nc("@action:button", "Upload to any available {0} printer ({1})").format(self._groupName, len(self._targets))
+        self.setName(description)
+        self.setDescription(description)
+        self.setShortDescription(description)
+        self.refresh()
+
+    def refresh(self) -> None:
+        # queries the expired entries of all printers at once
+        now = monotonic()
+        requestManager = CuraApplication.getInstance().getHttpRequestManager()
+        for printerId, (name, config) in self._targets.items():
+            entry = self._cache.setdefault(printerId, {'statusTime': None, 'queueTime': None})
+            url = config.get("url", "").strip()
+            headers = createHeaders(config.get("api_key", "").strip())
+            if (printerId, 'status') not in self._inFlight and (entry['statusTime'] is None or now - entry['statusTime'] > BALANCE_STATUS_TTL):
+                self._inFlight.add((printerId, 'status'))
+                requestManager.get(url + BALANCE_STATUS_QUERY, headers,
+                    callback = lambda reply, printerId = printerId: self._onStatus(printerId, reply),
+                    error_callback = lambda reply, error, printerId = printerId: self._onStatusError(printerId, error),
+                    timeout = BALANCE_REQUEST_TIMEOUT)
+            if config.get("upload_job_queue", False) and (printerId, 'queue') not in self._inFlight and (entry['queueTime'] is None or now - entry['queueTime'] > BALANCE_QUEUE_TTL):
+                self._inFlight.add((printerId, 'queue'))
+                requestManager.get(url + 'server/job_queue/status', headers,
+                    callback = lambda reply, printerId = printerId: self._onQueueStatus(printerId, reply),
+                    error_callback = lambda reply, error, printerId = printerId: self._inFlight.discard((printerId, 'queue')),
+                    timeout = BALANCE_REQUEST_TIMEOUT)
+
+    def _onStatus(self, printerId: str, reply: QNetworkReply) -> None:
+        self._inFlight.discard((printerId, 'status'))
+        if printerId not in self._cache:
+            return
+        try:
+            status = json.loads(str(reply.readAll(), 'utf-8'))['result']['status']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self._onStatusError(printerId, "Invalid response of Moonraker.")
+            return
+        entry = self._cache[printerId]
+        entry['statusTime'] = monotonic()
+        entry['klippyState'] = status.get('webhooks', {}).get('state')
+        entry['printState'] = status.get('print_stats', {}).get('state', '')
+        # remaining time of the current print job from its progress - None if not known yet
+        printDuration = status.get('print_stats', {}).get('print_duration', 0.0)
+        progress = status.get('virtual_sdcard', {}).get('progress', 0.0)
+        entry['remainingTime'] = printDuration * (1 - progress) / progress if progress > 0 else None
+
+    def _onStatusError(self, printerId: str, error) -> None:
+        self._inFlight.discard((printerId, 'status'))
+        if printerId not in self._cache:
+            return
+        Logger.log("d", "State of printer '{}' could not be queried: {}".format(printerId, error))
+        # unreachable => not a candidate until it answers again
+        entry = self._cache[printerId]
+        entry['statusTime'] = monotonic()
+        entry['klippyState'] = None
+
+    def _onQueueStatus(self, printerId: str, reply: QNetworkReply) -> None:
+        self._inFlight.discard((printerId, 'queue'))
+        if printerId not in self._cache:
+            return
+        try:
+            queuedJobs = json.loads(str(reply.readAll(), 'utf-8'))['result']['queued_jobs']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return
+        entry = self._cache[printerId]
+        entry['queueTime'] = monotonic()
+        entry['queueDepth'] = len(queuedJobs)
+
+    def _scorePrinter(self, printerId: str, config: dict, uploadSize: int, startPrint: bool, printTime: float):
+        # expected seconds until the job is done with the upload and the jobs ahead of it - None if the printer can't take it
+        entry = self._cache.get(printerId, {})
+        klippyState = entry.get('klippyState')
+        if not klippyState or startPrint and klippyState != 'ready':
+            return None
+        score = uploadSize / (getThroughput(printerId) or BALANCE_DEFAULT_THROUGHPUT)
+        if not startPrint:
+            return score
+        jobQueue = config.get("upload_job_queue", False)
+        if entry.get('printState') in ('printing', 'paused'):
+            if not jobQueue:
+                # a print job can't be started on a busy printer
+                return None
+            remainingTime = entry.get('remainingTime')
+            score += remainingTime if remainingTime is not None else printTime
+        if jobQueue:
+            score += entry.get('queueDepth', 0) * printTime
+        return score
+
+    def requestWrite(self, nodes, file_name = None, limit_mimetypes = None, file_handler = None, filter_by_machine = False, **kwargs) -> None:
+        if self._target or self._spoolJob:
+            raise OutputDeviceError.DeviceBusyError()
+
+        self.writeStarted.emit(self)
+        # serialized on the job queue - the target is chosen from the cache once the file is written
+        config = getConfig()
+        self._requestedFileName = file_name
+        self._spoolJob = SpoolFileJob(getOutputFormat(config.get("output_format", "gcode")), compressionLevel = config.ufpCompressionLevel, gcodeFilter = config.createGcodeFilter())
+        self._spoolJob.finished.connect(self._onSpoolJobFinished)
+        self._spoolJob.start()
+
+    def _onSpoolJobFinished(self, job: SpoolFileJob) -> None:
+        self._spoolJob = None
+        self._spoolPath, outputFormat = job.getResult() or (None, None)
+        if not self._spoolPath:
+            self.writeError.emit(self)
+            return
+
+        config = getConfig()
+        file_name = self._requestedFileName
+        self._startPrint = config.get("upload_start_print_job", False)
+        printInformation = CuraApplication.getInstance().getPrintInformation()
+        printTime = float(int(printInformation.currentPrintTime)) if printInformation else 0.0
+        uploadSize = os.path.getsize(self._spoolPath)
+        scores = []
+        for printerId, (name, targetConfig) in self._targets.items():
+            score = self._scorePrinter(printerId, targetConfig, uploadSize, self._startPrint, printTime)
+            Logger.log("d", "Score of printer '{}': {}".format(name, "not available" if score is None else "{:.0f} s".format(score)))
+            if score is not None:
+                scores.append((score, name, printerId))
+        # the values of the next upload
+        self.refresh()
+        if not scores:
+            removeSpoolFile(self._spoolPath)
+            self._spoolPath = None
+            message = Message(catalog.i18nc("@info:status", "None of the {} printers is available for the upload.").format(len(self._targets)), 0, False)
+            message.setTitle("Moonraker - Error")
+            message.show()
+            self.writeError.emit(self)
+            return
+
+        score, name, printerId = min(scores)
+        Logger.log("i", "Printer '{}' selected for the upload [score: {:.0f} s; {} candidate(s)].".format(name, score, len(scores)))
+        targetConfig = self._targets[printerId][1]
+        entry = self._cache[printerId]
+        if self._startPrint:
+            # counts until the printer is queried again - the next upload goes to another printer
+            if targetConfig.get("upload_job_queue", False) and entry.get('printState') in ('printing', 'paused'):
+                entry['queueDepth'] = entry.get('queueDepth', 0) + 1
+            else:
+                entry['printState'] = 'printing'
+                entry['remainingTime'] = printTime
+
+        fileName = os.path.basename(file_name) if file_name else "%s." % printInformation.jobName
+        fileName = translateFileName(fileName, config.get("trans_input", ""), config.get("trans_output", ""), config.get("trans_remove", ""))
+        self._fileName = fileName + "." + outputFormat
+        self._uploadAutohideMessagebox = config.get("upload_autohide_messagebox", False)
+        self._message = Message(catalog.i18nc("@info:progress", "Uploading to {} ({})...").format(name, formatSize(uploadSize)), 0, False, -1)
+        self._message.setTitle("Moonraker - Upload")
+        self._message.show()
+        self._target = MoonrakerUploadTarget(printerId, name, targetConfig, self._onTargetProgress, self._onTargetFinished)
+        self._target.start(self._spoolPath, self._fileName, re.sub(r'^[\s/]+|[\s/]+$', '', config.get("upload_path", "")), self._startPrint)
+
+    def _onTargetProgress(self, target: MoonrakerUploadTarget, progress: float) -> None:
+        if self._message:
+            self._message.setProgress(int(progress * 100))
+        self.writeProgress.emit(self, int(progress * 100))
+
+    def _onTargetFinished(self, target: MoonrakerUploadTarget, error: str = None) -> None:
+        if target is not self._target:
+            return
+        self._target = None
+        removeSpoolFile(self._spoolPath)
+        self._spoolPath = None
+        if self._message:
+            self._message.hide()
+            self._message = None
+        # the state of the printer has changed
+        if target.printerId in self._cache:
+            self._cache[target.printerId]['statusTime'] = None
+            self._cache[target.printerId]['queueTime'] = None
+
+        if error:
+            Logger.log("e", "Upload to printer '{}' failed: {}".format(target.name, error))
+            message = Message(catalog.i18nc("@info:status", "Upload of '{}' to {} was not successful.\n\n{}").format(os.path.basename(self._fileName), target.name, error), 0, False)
+            message.setTitle("Moonraker - Error")
+            message.show()
+            self.writeError.emit(self)
+            return
+
+        Logger.log("i", "Upload to printer '{}' completed.".format(target.name))
+        messageText = "Upload of '{}' to {} successfully completed" + (" and print job initialized." if self._startPrint else ".")
+        message = Message(catalog.i18nc("@info:status", messageText.format(os.path.basename(self._fileName), target.name)), 30 if self._uploadAutohideMessagebox else 0, True)
+        message.setTitle("Moonraker")
+        message.show()
+        self.writeSuccess.emit(self)
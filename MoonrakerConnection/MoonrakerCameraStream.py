@@ -0,0 +1,216 @@
+import threading
+import urllib.request
+from time import monotonic
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, QSize, Qt, pyqtProperty, pyqtSignal, pyqtSlot
+    from PyQt6.QtGui import QImage, QTransform
+    from PyQt6.QtQml import QQmlEngine
+    from PyQt6.QtQuick import QQuickImageProvider
+else:
+    from PyQt5.QtCore import QObject, QSize, Qt, pyqtProperty, pyqtSignal, pyqtSlot
+    from PyQt5.QtGui import QImage, QTransform
+    from PyQt5.QtQml import QQmlEngine
+    from PyQt5.QtQuick import QQuickImageProvider
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.Logger import Logger
+
+try:
+    ImageType = QQuickImageProvider.ImageType.Image
+    KeepAspectRatio = Qt.AspectRatioMode.KeepAspectRatio
+    SmoothTransformation = Qt.TransformationMode.SmoothTransformation
+except AttributeError:
+    ImageType = QQuickImageProvider.Image
+    KeepAspectRatio = Qt.KeepAspectRatio
+    SmoothTransformation = Qt.SmoothTransformation
+
+# frames are requested by QML as image://moonrakercamera/<stream>/<frame>
+CAMERA_PROVIDER_ID = "moonrakercamera"
+# frames beyond this rate are dropped before they are decoded
+CAMERA_MAX_FPS = 10
+CAMERA_TIMEOUT = 10
+CAMERA_RECONNECT_DELAY = 2
+READ_SIZE = 64 * 1024
+
+class MoonrakerCameraImageProvider(QQuickImageProvider):
+    def __init__(self) -> None:
+        super().__init__(ImageType)
+        self._frames = {}
+
+    def setFrame(self, streamId: str, image: QImage) -> None:
+        self._frames[streamId] = image
+
+    def removeFrame(self, streamId: str) -> None:
+        self._frames.pop(streamId, None)
+
+    def requestImage(self, id: str, requestedSize: QSize):
+        # the frame is decoded and scaled already - nothing left to do on the ui thread
+        image = self._frames.get(id.split("/")[0], QImage())
+        return image, image.size()
+
+_imageProvider = None
+
+def getImageProvider() -> MoonrakerCameraImageProvider:
+    global _imageProvider
+    if _imageProvider is None:
+        _imageProvider = MoonrakerCameraImageProvider()
+        application = CuraApplication.getInstance()
+        if application.getMainWindow():
+            _registerImageProvider()
+        else:
+            # a module function - the signal only keeps a weak reference to its receivers
+            application.engineCreatedSignal.connect(_registerImageProvider)
+    return _imageProvider
+
+def _registerImageProvider(engine: QQmlEngine = None) -> None:
+    # the engine of the main window if the signal doesn't provide one
+    if engine is None:
+        mainWindow = CuraApplication.getInstance().getMainWindow()
+        context = QQmlEngine.contextForObject(mainWindow) if mainWindow else None
+        engine = context.engine() if context else None
+    if not engine:
+        Logger.log("w", "No QML engine for the camera image provider.")
+        return
+    engine.addImageProvider(CAMERA_PROVIDER_ID, _imageProvider)
+
+class MoonrakerCameraStream(QObject):
+    # Reads an MJPEG stream (or polls a snapshot url) on a worker thread. Every frame is decoded, scaled down
+    # to the size of the view, mirrored and rotated there - QML only shows the finished image.
+    frameChanged = pyqtSignal()
+    _frameReady = pyqtSignal(QImage, object)
+
+    def __init__(self, streamId: str, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._streamId = streamId
+        self._url = ""
+        self._rotation = 0
+        self._mirror = False
+        self._viewSize = (0, 0)
+        self._stopEvent = None
+        self._frameCounter = 0
+        self._frameSize = QSize()
+        # delivered to the ui thread by a queued connection
+        self._frameReady.connect(self._onFrameReady)
+        getImageProvider()
+
+    def setUrl(self, url: str) -> None:
+        if self._url != url:
+            self._url = url
+            if self._stopEvent:
+                self.stop()
+                self.start()
+
+    def setRotation(self, rotation: str) -> None:
+        try:
+            self._rotation = int(rotation) % 360
+        except ValueError:
+            self._rotation = 0
+
+    def setMirror(self, mirror: bool) -> None:
+        self._mirror = mirror
+
+    @pyqtSlot(int, int)
+    def setViewSize(self, width: int, height: int) -> None:
+        self._viewSize = (max(0, width), max(0, height))
+
+    @pyqtSlot()
+    def start(self) -> None:
+        if self._stopEvent or not self._url:
+            return
+        Logger.log("d", "Starting camera stream {}.".format(self._url))
+        self._stopEvent = threading.Event()
+        threading.Thread(target = self._run, args = (self._url, self._stopEvent), daemon = True).start()
+
+    @pyqtSlot()
+    def stop(self) -> None:
+        if not self._stopEvent:
+            return
+        Logger.log("d", "Stopping camera stream {}.".format(self._url))
+        # the worker leaves with the next chunk or timeout
+        self._stopEvent.set()
+        self._stopEvent = None
+
+    @pyqtProperty(str, notify = frameChanged)
+    def source(self) -> str:
+        return "image://{}/{}/{}".format(CAMERA_PROVIDER_ID, self._streamId, self._frameCounter) if self._frameCounter else ""
+
+    @pyqtProperty(int, notify = frameChanged)
+    def frameWidth(self) -> int:
+        return self._frameSize.width()
+
+    @pyqtProperty(int, notify = frameChanged)
+    def frameHeight(self) -> int:
+        return self._frameSize.height()
+
+    def _onFrameReady(self, image: QImage, stopEvent: threading.Event) -> None:
+        if stopEvent is not self._stopEvent:
+            # frame of a stopped stream
+            return
+        getImageProvider().setFrame(self._streamId, image)
+        self._frameSize = image.size()
+        self._frameCounter += 1
+        self.frameChanged.emit()
+
+    def _run(self, url: str, stopEvent: threading.Event) -> None:
+        while not stopEvent.is_set():
+            try:
+                with urllib.request.urlopen(url, timeout = CAMERA_TIMEOUT) as response:
+                    if response.headers.get_content_maintype() == "multipart":
+                        self._readStream(response, stopEvent)
+                    else:
+                        # snapshot url => poll with the maximum frame rate
+                        self._decodeFrame(response.read(), stopEvent)
+                        stopEvent.wait(1.0 / CAMERA_MAX_FPS)
+                        continue
+            except (OSError, ValueError) as e:
+                Logger.log("w", "Camera stream {} failed: {}".format(url, e))
+            stopEvent.wait(CAMERA_RECONNECT_DELAY)
+
+    def _readStream(self, response, stopEvent: threading.Event) -> None:
+        # the frames are cut at the jpeg markers - the part headers of the stream are not needed for that
+        buffer = b""
+        nextFrame = 0.0
+        while not stopEvent.is_set():
+            chunk = response.read1(READ_SIZE)
+            if not chunk:
+                return
+            buffer += chunk
+            while True:
+                start = buffer.find(b"\xff\xd8")
+                if start < 0:
+                    buffer = buffer[-1:]
+                    break
+                end = buffer.find(b"\xff\xd9", start + 2)
+                if end < 0:
+                    buffer = buffer[start:]
+                    break
+                frame = buffer[start:end + 2]
+                buffer = buffer[end + 2:]
+                now = monotonic()
+                if now >= nextFrame:
+                    nextFrame = now + 1.0 / CAMERA_MAX_FPS
+                    self._decodeFrame(frame, stopEvent)
+
+    def _decodeFrame(self, data: bytes, stopEvent: threading.Event) -> None:
+        image = QImage.fromData(data)
+        if image.isNull():
+            return
+        # scale first - mirroring and rotating the small image is cheaper
+        width, height = self._viewSize
+        if self._rotation in (90, 270):
+            width, height = height, width
+        if width > 0 and height > 0 and (image.width() > width or image.height() > height):
+            image = image.scaled(width, height, KeepAspectRatio, SmoothTransformation)
+        if self._mirror:
+            image = image.mirrored(True, False)
+        if self._rotation:
+            image = image.transformed(QTransform().rotate(self._rotation))
+        self._frameReady.emit(image, stopEvent)
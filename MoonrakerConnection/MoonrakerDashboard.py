@@ -0,0 +1,173 @@
+import json
+from time import monotonic
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, QTimer, pyqtProperty, pyqtSignal, pyqtSlot
+    from PyQt6.QtNetwork import QNetworkReply, QNetworkRequest
+else:
+    from PyQt5.QtCore import QObject, QTimer, pyqtProperty, pyqtSignal, pyqtSlot
+    from PyQt5.QtNetwork import QNetworkReply, QNetworkRequest
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.Logger import Logger
+
+from .MoonrakerSettings import MOONRAKER_SETTINGS, getAllConfigs, validateUrl
+from .MoonrakerUpload import createHeaders
+
+try:
+    HttpStatusCodeAttribute = QNetworkRequest.Attribute.HttpStatusCodeAttribute
+except AttributeError:
+    HttpStatusCodeAttribute = QNetworkRequest.HttpStatusCodeAttribute
+
+# one timer drives all printers - each tick starts the status queries which are due
+DASHBOARD_TICK_INTERVAL = 0.25
+# seconds between two status queries of a reachable printer
+DASHBOARD_POLL_INTERVAL = 5.0
+# upper bound of the backoff for unreachable printers
+DASHBOARD_MAX_BACKOFF = 120.0
+# status queries running at the same time - shared by all printers
+DASHBOARD_MAX_IN_FLIGHT = 4
+# seconds until an unanswered status query fails - unreachable hosts must not hold a slot for long
+DASHBOARD_REQUEST_TIMEOUT = 5.0
+# all status of one printer with a single request
+DASHBOARD_STATUS_QUERY = 'printer/objects/query?webhooks&print_stats&display_status'
+
+class MoonrakerDashboard(QObject):
+    # Live state of every configured printer. A single scheduler polls the printers while the dashboard is
+    # visible: the queries are staggered over the poll interval, limited to DASHBOARD_MAX_IN_FLIGHT at a time
+    # and unreachable printers are queried less often (exponential backoff).
+    printersChanged = pyqtSignal()
+
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        # printerId => state of the printer (see _createPrinter)
+        self._printers = {}
+        self._inFlight = {}
+        self._active = 0
+        self._timer = QTimer()
+        self._timer.setInterval(int(DASHBOARD_TICK_INTERVAL * 1000))
+        self._timer.timeout.connect(self._onTick)
+        CuraApplication.getInstance().getPreferences().preferenceChanged.connect(self._onPreferenceChanged)
+
+    @pyqtSlot()
+    def start(self) -> None:
+        # every visible view starts the dashboard once - polling stops with the last one
+        self._active += 1
+        if self._active == 1:
+            self.updatePrinters()
+            self._timer.start()
+
+    @pyqtSlot()
+    def stop(self) -> None:
+        self._active = max(0, self._active - 1)
+        if not self._active:
+            self._timer.stop()
+            requestManager = CuraApplication.getInstance().getHttpRequestManager()
+            inFlight, self._inFlight = self._inFlight, {}
+            for request in inFlight.values():
+                requestManager.abortRequest(request)
+
+    def updatePrinters(self) -> None:
+        containerRegistry = CuraApplication.getInstance().getContainerRegistry()
+        configs = {printerId: config for printerId, config in getAllConfigs().items() if validateUrl(config.url)}
+        printers = {}
+        for index, (printerId, config) in enumerate(sorted(configs.items())):
+            url = config.url if config.url.endswith('/') else config.url + '/'
+            printer = self._printers.get(printerId)
+            if not printer or printer["url"] != url or printer["apiKey"] != config.apiKey:
+                # new printers are staggered over one poll interval
+                printer = self._createPrinter(url, config.apiKey, monotonic() + DASHBOARD_POLL_INTERVAL * index / len(configs))
+            stacks = containerRegistry.findContainerStacks(id = printerId)
+            printer["name"] = stacks[0].getName() if stacks else printerId
+            printers[printerId] = printer
+        for printerId in [printerId for printerId in self._inFlight if printerId not in printers or printers[printerId] is not self._printers.get(printerId)]:
+            # removed or changed printer
+            CuraApplication.getInstance().getHttpRequestManager().abortRequest(self._inFlight.pop(printerId))
+        self._printers = printers
+        self.printersChanged.emit()
+
+    @pyqtProperty("QVariantList", notify = printersChanged)
+    def printers(self) -> list:
+        return [{'id': printerId, 'name': printer["name"], 'url': printer["url"], 'state': printer["state"], 'filename': printer["filename"],
+                 'progress': printer["progress"]} for printerId, printer in sorted(self._printers.items(), key = lambda item: item[1]["name"].lower())]
+
+    def _createPrinter(self, url: str, apiKey: str, nextPoll: float) -> dict:
+        return {'name': '', 'url': url, 'apiKey': apiKey, 'state': 'unknown',
+                'filename': '', 'progress': 0.0, 'failures': 0, 'nextPoll': nextPoll}
+
+    def _onPreferenceChanged(self, key: str) -> None:
+        if key == MOONRAKER_SETTINGS and self._active:
+            self.updatePrinters()
+
+    def _onTick(self) -> None:
+        now = monotonic()
+        due = sorted((printer["nextPoll"], printerId) for printerId, printer in self._printers.items() if printer["nextPoll"] <= now and printerId not in self._inFlight)
+        for nextPoll, printerId in due[:DASHBOARD_MAX_IN_FLIGHT - len(self._inFlight)]:
+            printer = self._printers[printerId]
+            self._inFlight[printerId] = CuraApplication.getInstance().getHttpRequestManager().get(printer["url"] + DASHBOARD_STATUS_QUERY, createHeaders(printer["apiKey"]),
+                callback = lambda reply, printerId = printerId: self._onStatus(printerId, reply),
+                error_callback = lambda reply, error, printerId = printerId: self._onStatusError(printerId, reply, error),
+                timeout = DASHBOARD_REQUEST_TIMEOUT)
+
+    def _onStatus(self, printerId: str, reply: QNetworkReply) -> None:
+        # aborted queries are already removed
+        if self._inFlight.pop(printerId, None) is None or printerId not in self._printers:
+            return
+        printer = self._printers[printerId]
+        try:
+            status = json.loads(str(reply.readAll(), 'utf-8'))['result']['status']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            self._onFailed(printer, reply, "Invalid response of Moonraker.")
+            return
+        klippyState = status.get('webhooks', {}).get('state', 'unknown')
+        printState = status.get('print_stats', {}).get('state', '')
+        # a ready printer shows what it is doing
+        printer["state"] = printState if klippyState == 'ready' and printState else klippyState
+        printer["filename"] = status.get('print_stats', {}).get('filename', '')
+        printer["progress"] = status.get('display_status', {}).get('progress', 0.0)
+        printer["failures"] = 0
+        printer["nextPoll"] = monotonic() + DASHBOARD_POLL_INTERVAL
+        self.printersChanged.emit()
+
+    def _onStatusError(self, printerId: str, reply: QNetworkReply, error) -> None:
+        if self._inFlight.pop(printerId, None) is None or printerId not in self._printers:
+            return
+        self._onFailed(self._printers[printerId], reply, error)
+
+    def _onFailed(self, printer: dict, reply: QNetworkReply, error) -> None:
+        statusCode = reply.attribute(HttpStatusCodeAttribute) if reply else None
+        if statusCode in (401, 403):
+            # wrong or missing API key - asked again rarely, a changed key creates a new entry (see updatePrinters)
+            Logger.log("d", "Printer '{}' rejected the API key [status: {}].".format(printer["name"], statusCode))
+            printer["state"] = 'unauthorized'
+            printer["failures"] = 0
+            printer["nextPoll"] = monotonic() + DASHBOARD_MAX_BACKOFF
+        elif statusCode:
+            # Moonraker answers, but Klipper is not connected - no reason to back off
+            printer["state"] = 'disconnected'
+            printer["failures"] = 0
+            printer["nextPoll"] = monotonic() + DASHBOARD_POLL_INTERVAL
+        else:
+            Logger.log("d", "Printer '{}' is not reachable: {}".format(printer["name"], error))
+            printer["state"] = 'offline'
+            printer["failures"] += 1
+            printer["nextPoll"] = monotonic() + min(DASHBOARD_POLL_INTERVAL * 2 ** printer["failures"], DASHBOARD_MAX_BACKOFF)
+        printer["filename"] = ''
+        printer["progress"] = 0.0
+        self.printersChanged.emit()
+
+# shared by all printers
+_dashboard = None
+
+def getDashboard() -> MoonrakerDashboard:
+    global _dashboard
+    if _dashboard is None:
+        _dashboard = MoonrakerDashboard()
+    return _dashboard
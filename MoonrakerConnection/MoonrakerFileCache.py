@@ -0,0 +1,168 @@
+import json
+import posixpath
+import urllib.parse
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, pyqtSignal
+    from PyQt6.QtNetwork import QNetworkReply
+else:
+    from PyQt5.QtCore import QObject, pyqtSignal
+    from PyQt5.QtNetwork import QNetworkReply
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.Logger import Logger
+
+from .MoonrakerUpload import createHeaders
+from .MoonrakerWebSocket import MoonrakerWebSocket
+
+# upper bound for the directories walked in the background
+MAX_DIRECTORIES = 200
+
+class MoonrakerFileCache(QObject):
+    # Directory tree of the "gcodes" root of one printer. The tree is walked in the background (one
+    # server/files/directory request at a time) and kept up to date by notify_filelist_changed, so the
+    # upload dialog is served from memory.
+    filesChanged = pyqtSignal()
+
+    def __init__(self, webSocket: MoonrakerWebSocket, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._url = None
+        self._apiKey = None
+        # directory ("" is the root) => {"dirs": set of names, "files": {name: {"size", "modified"}}}
+        self._directories = {}
+        self._pending = []
+        self._request = None
+        webSocket.connectedChanged.connect(self._onConnectedChanged)
+        webSocket.notificationReceived.connect(self._onNotificationReceived)
+
+    def open(self, url: str, apiKey: str = None) -> None:
+        if self._url == url and self._apiKey == apiKey:
+            return
+        self.close()
+        self._url = url
+        self._apiKey = apiKey
+        self.refresh()
+
+    def close(self) -> None:
+        self._url = None
+        self._directories = {}
+        self._pending = []
+        if self._request:
+            CuraApplication.getInstance().getHttpRequestManager().abortRequest(self._request)
+            self._request = None
+
+    def refresh(self) -> None:
+        # walk the whole tree again - cached entries stay usable meanwhile
+        self._pending = []
+        self.requestDirectory("")
+
+    def requestDirectory(self, directory: str) -> None:
+        directory = directory.strip("/")
+        if directory not in self._pending:
+            self._pending.append(directory)
+        if not self._request:
+            self._fetchNext()
+
+    def isCached(self, directory: str) -> bool:
+        return directory.strip("/") in self._directories
+
+    def hasDirectory(self, directory: str) -> bool:
+        # known to exist on the printer - content may not be cached yet
+        parent, name = posixpath.split(directory.strip("/"))
+        return not name or name in self._directories.get(parent, {}).get("dirs", set())
+
+    def getDirectories(self) -> list:
+        return sorted(directory for directory in self._directories if directory)
+
+    def getFile(self, directory: str, fileName: str) -> dict:
+        # None if the file is unknown
+        return self._directories.get(directory.strip("/"), {}).get("files", {}).get(fileName)
+
+    def _fetchNext(self) -> None:
+        if not self._url or not self._pending:
+            return
+        directory = self._pending.pop(0)
+        query = urllib.parse.urlencode({'path': '/'.join(filter(None, ['gcodes', directory])), 'extended': 'false'})
+        self._request = CuraApplication.getInstance().getHttpRequestManager().get(self._url + 'server/files/directory?' + query, createHeaders(self._apiKey),
+            callback = lambda reply: self._onDirectory(reply, directory), error_callback = lambda reply, error: self._onDirectoryError(directory, error))
+
+    def _onDirectory(self, reply: QNetworkReply, directory: str) -> None:
+        self._request = None
+        try:
+            result = json.loads(str(reply.readAll(), 'utf-8'))['result']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            result = None
+        if result is not None and self._url:
+            dirs = {item.get('dirname') for item in result.get('dirs', []) if item.get('dirname') and not item['dirname'].startswith('.')}
+            files = {item.get('filename'): {'size': item.get('size'), 'modified': item.get('modified')} for item in result.get('files', []) if item.get('filename')}
+            for name in self._directories.get(directory, {}).get('dirs', set()) - dirs:
+                # removed while the notifications were missed
+                self._removeDirectory('/'.join(filter(None, [directory, name])))
+            self._directories[directory] = {'dirs': dirs, 'files': files}
+            for name in sorted(dirs):
+                subdirectory = '/'.join(filter(None, [directory, name]))
+                if subdirectory not in self._pending and len(self._directories) + len(self._pending) < MAX_DIRECTORIES:
+                    self._pending.append(subdirectory)
+            self.filesChanged.emit()
+        self._fetchNext()
+
+    def _onDirectoryError(self, directory: str, error) -> None:
+        self._request = None
+        Logger.log("d", "Directory '{}' could not be listed: {}".format(directory, error))
+        self._fetchNext()
+
+    def _onConnectedChanged(self, connected: bool) -> None:
+        if connected and self._url:
+            # notifications may have been missed while the websocket was down
+            self.refresh()
+
+    def _onNotificationReceived(self, method: str, params: list) -> None:
+        if method != 'notify_filelist_changed' or not params:
+            return
+        action = params[0].get('action', '')
+        item = params[0].get('item', {})
+        sourceItem = params[0].get('source_item', {})
+        if item.get('root') != 'gcodes':
+            return
+        if action in ('delete_file', 'move_file'):
+            self._removeFile(sourceItem.get('path', '') if action == 'move_file' else item.get('path', ''))
+        if action in ('delete_dir', 'move_dir'):
+            self._removeDirectory(sourceItem.get('path', '') if action == 'move_dir' else item.get('path', ''))
+        if action in ('create_file', 'modify_file', 'move_file'):
+            self._addFile(item)
+        if action in ('create_dir', 'move_dir'):
+            self._addDirectory(item.get('path', ''))
+            if action == 'move_dir':
+                # content of the moved directory is not part of the notification
+                self.requestDirectory(item.get('path', ''))
+        self.filesChanged.emit()
+
+    def _addFile(self, item: dict) -> None:
+        directory, fileName = posixpath.split(item.get('path', '').strip('/'))
+        if directory in self._directories:
+            self._directories[directory]['files'][fileName] = {'size': item.get('size'), 'modified': item.get('modified')}
+
+    def _removeFile(self, path: str) -> None:
+        directory, fileName = posixpath.split(path.strip('/'))
+        self._directories.get(directory, {}).get('files', {}).pop(fileName, None)
+
+    def _addDirectory(self, path: str) -> None:
+        path = path.strip('/')
+        parent, name = posixpath.split(path)
+        if parent in self._directories:
+            self._directories[parent]['dirs'].add(name)
+        self._directories.setdefault(path, {'dirs': set(), 'files': {}})
+
+    def _removeDirectory(self, path: str) -> None:
+        path = path.strip('/')
+        parent, name = posixpath.split(path)
+        self._directories.get(parent, {}).get('dirs', set()).discard(name)
+        for directory in [directory for directory in self._directories if directory == path or directory.startswith(path + '/')]:
+            del self._directories[directory]
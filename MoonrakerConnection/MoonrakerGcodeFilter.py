@@ -0,0 +1,133 @@
+import os
+import re
+
+from UM.Logger import Logger
+
+# comments kept in the body - layer and object markers are used by Moonraker (exclude object), Klipper macros and the viewers of the frontends
+KEPT_COMMENTS = (";LAYER", ";MESH:", ";TYPE:", ";TIME_ELAPSED:", ";SETTING_3", ";END_OF_HEADER", ";PRINT.", ";EXTRUDER_TRAIN.")
+# decimals of coordinates (0.01 mm) and extrusion if the precision is limited
+COORDINATE_PRECISION = 2
+EXTRUSION_PRECISION = 4
+# commands which neither move nor change the feedrate - the tracked position stays valid
+NON_MOTION_COMMANDS = {"M73", "M104", "M105", "M106", "M107", "M109", "M117", "M118", "M140", "M190", "M204", "M205", "M220", "M221"}
+PARAMETER = re.compile(r"([A-Z])([^\sA-Z]*)")
+NUMBER = re.compile(r"-?\d*\.?\d+")
+
+class MoonrakerGcodeFilter:
+    # Streaming size reduction of G-code: strips comments (the header, thumbnails and the markers above are kept), drops
+    # parameters of G0/G1 which repeat the modal state and limits the decimals of coordinates. Works line by line on the
+    # spool file, so the size of the job doesn't matter - apply() runs on the job queue (SpoolFileJob), never on the
+    # main thread. Only used for G-code of Cura. originalSize and filteredSize are set by apply().
+    def __init__(self, stripComments: bool = False, dropModal: bool = False, limitPrecision: bool = False) -> None:
+        self.stripComments = stripComments
+        self.dropModal = dropModal
+        self.limitPrecision = limitPrecision
+        self.originalSize = None
+        self.filteredSize = None
+
+    def isEnabled(self) -> bool:
+        return self.stripComments or self.dropModal or self.limitPrecision
+
+    def apply(self, path: str) -> bool:
+        # replaces the file - the original file is kept if filtering fails
+        targetPath = path + ".filtered"
+        try:
+            with open(path, "r", encoding = "utf-8", newline = "") as source, open(targetPath, "w", encoding = "utf-8", newline = "") as target:
+                self._reset()
+                target.writelines(line for line in map(self._filterLine, source) if line)
+            self.originalSize = os.path.getsize(path)
+            self.filteredSize = os.path.getsize(targetPath)
+            os.replace(targetPath, path)
+        except (OSError, UnicodeDecodeError) as e:
+            Logger.log("w", "G-code could not be filtered: {}".format(e))
+            if os.path.exists(targetPath):
+                os.remove(targetPath)
+            return False
+        Logger.log("i", "G-code filtered from {} to {} bytes ({:.1%} smaller).".format(self.originalSize, self.filteredSize, self.getReduction()))
+        return True
+
+    def getReduction(self) -> float:
+        if not self.originalSize:
+            return 0.0
+        return 1 - self.filteredSize / self.originalSize
+
+    def _reset(self) -> None:
+        self._inHeader = True
+        self._inThumbnail = False
+        self._absolute = True
+        self._absoluteExtrusion = True
+        self._state = {}
+
+    def _filterLine(self, line: str) -> str:
+        command, separator, comment = line.partition(";")
+        command = command.strip()
+        if not command:
+            return self._filterComment(line)
+        # the header ends with the first command
+        self._inHeader = False
+        ending = "\r\n" if line.endswith("\r\n") else "\n"
+        code = command.split(None, 1)[0].upper()
+        if code in ("G0", "G1", "G2", "G3"):
+            command = self._filterMotion(code, command)
+            if not command:
+                return ""
+        else:
+            self._updateState(code)
+        if separator and not self.stripComments:
+            command += " ;" + comment.rstrip("\r\n")
+        return command + ending
+
+    def _filterComment(self, line: str) -> str:
+        if not self.stripComments or self._inHeader:
+            return line
+        if line.startswith("; thumbnail"):
+            self._inThumbnail = not line.startswith("; thumbnail end")
+            return line
+        if self._inThumbnail or line.startswith(KEPT_COMMENTS):
+            return line
+        return ""
+
+    def _filterMotion(self, code: str, command: str) -> str:
+        parameters = []
+        for name, value in PARAMETER.findall(command[len(code):].upper()):
+            if not NUMBER.fullmatch(value):
+                # unknown parameter => passed as is
+                parameters.append(name + value)
+                continue
+            if self.limitPrecision and name in "XYZEIJR":
+                value = self._formatNumber(value, EXTRUSION_PRECISION if name == "E" else COORDINATE_PRECISION)
+            # repeated feedrates and absolute positions of linear moves don't change anything
+            modal = name == "F" or (code in ("G0", "G1") and self._absolute and (name in "XYZ" or (name == "E" and self._absoluteExtrusion)))
+            if self.dropModal and modal and self._state.get(name) == value:
+                continue
+            if modal:
+                self._state[name] = value
+            elif name in "XYZE":
+                # relative move => the position is unknown
+                self._state.pop(name, None)
+            parameters.append(name + value)
+        if code in ("G2", "G3"):
+            # the end point of an arc is not tracked
+            self._state = {key: value for key, value in self._state.items() if key == "F"}
+        if not parameters and self.dropModal and code in ("G0", "G1"):
+            # nothing left to do
+            return ""
+        return " ".join([code] + parameters)
+
+    def _updateState(self, code: str) -> None:
+        # Klipper keeps M82/M83 apart from G90/G91 - E is absolute only with G90 and M82
+        if code == "G90":
+            self._absolute = True
+        elif code == "G91":
+            self._absolute = False
+        elif code == "M82":
+            self._absoluteExtrusion = True
+        elif code == "M83":
+            self._absoluteExtrusion = False
+        if code not in NON_MOTION_COMMANDS:
+            # homing, G92, macros etc. may move or reset the position
+            self._state = {}
+
+    def _formatNumber(self, value: str, precision: int) -> str:
+        value = "{:.{}f}".format(float(value), precision).rstrip("0").rstrip(".")
+        return "0" if value in ("-0", "") else value
@@ -0,0 +1,223 @@
+import json
+import os.path
+import re
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtNetwork import QNetworkReply
+else:
+    from PyQt5.QtNetwork import QNetworkReply
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.i18n import i18nCatalog
+from UM.Logger import Logger
+from UM.Message import Message
+from UM.OutputDevice import OutputDeviceError
+from UM.OutputDevice.OutputDevice import OutputDevice
+
+from .MoonrakerMetrics import MoonrakerUploadMetrics
+from .MoonrakerSettings import getConfig
+from .MoonrakerUpload import SpoolFileJob, getOutputFormat, translateFileName, removeSpoolFile, openBodyDevice, createHeaders, createUploadFields, createMultiPart
+
+catalog = i18nCatalog("cura")
+
+# number of printers receiving the payload at the same time
+MAX_CONCURRENT_UPLOADS = 3
+
+class MoonrakerUploadTarget:
+    def __init__(self, printerId: str, name: str, config: dict, on_progress, on_finished) -> None:
+        self.printerId = printerId
+        self.name = name
+        self._url = config.get("url", "").strip()
+        self._apiKey = config.get("api_key", "").strip()
+        self._jobQueue = config.get("upload_job_queue", False)
+        self._onProgressCallback = on_progress
+        self._onFinishedCallback = on_finished
+        self._postData = None
+        # the transfer rate of the target is used to balance uploads
+        self._metrics = MoonrakerUploadMetrics(printerId)
+
+    def start(self, spoolPath: str, fileName: str, pathName: str, startPrint: bool) -> None:
+        self._spoolPath = spoolPath
+        self._fileName = fileName
+        self._pathName = pathName
+        self._startPrint = startPrint
+        if self._startPrint and not self._jobQueue:
+            # a print job can only be started on a ready printer
+            requestManager = CuraApplication.getInstance().getHttpRequestManager()
+            requestManager.get(self._url + 'server/info', createHeaders(self._apiKey), callback = self._checkPrinterStatus, error_callback = self._onError)
+        else:
+            self._upload()
+
+    def _checkPrinterStatus(self, reply: QNetworkReply) -> None:
+        try:
+            status = json.loads(str(reply.readAll(), 'utf-8'))['result']['klippy_state']
+        except (json.JSONDecodeError, KeyError):
+            self._finish("Invalid response of Moonraker.")
+            return
+        if status != 'ready':
+            self._finish("The status of the printer is '{}'.".format(status))
+            return
+        self._upload()
+
+    def _upload(self) -> None:
+        Logger.log("i", "Uploading file '{}' to {} [path: {}].".format(self._fileName, self._url, self._pathName))
+        # every target reads the shared spool file through its own device
+        self._postData = openBodyDevice(self._spoolPath)
+        if not self._postData:
+            self._finish("Upload file could not be opened.")
+            return
+        headers = createHeaders(self._apiKey)
+        # the job queue starts the print job on its own
+        postData, headers['Content-Type'] = createMultiPart(self._postData, self._fileName, createUploadFields(self._pathName, self._startPrint and not self._jobQueue))
+        uploadSize = os.path.getsize(self._spoolPath)
+        self._metrics.setSizes(uploadSize, uploadSize)
+        self._metrics.start("transfer")
+        requestManager = CuraApplication.getInstance().getHttpRequestManager()
+        requestManager.post(self._url + 'server/files/upload', headers, postData, callback = self._onUploaded, error_callback = self._onError, upload_progress_callback = self._onUploadProgress)
+
+    def _onUploadProgress(self, bytesSent: int, bytesTotal: int) -> None:
+        self._metrics.onUploadProgress(bytesSent, bytesTotal)
+        if bytesTotal > 0:
+            self._onProgressCallback(self, bytesSent / bytesTotal)
+
+    def _onUploaded(self, reply: QNetworkReply) -> None:
+        if not self._startPrint or not self._jobQueue:
+            self._finish()
+            return
+        try:
+            uploadedPath = json.loads(str(reply.readAll(), 'utf-8'))['item']['path']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            uploadedPath = '/'.join(filter(None, [self._pathName, self._fileName]))
+        headers = createHeaders(self._apiKey)
+        headers['Content-Type'] = 'application/json'
+        requestManager = CuraApplication.getInstance().getHttpRequestManager()
+        requestManager.post(self._url + 'server/job_queue/job', headers, json.dumps({'filenames': [uploadedPath]}).encode(), callback = lambda reply: self._finish(), error_callback = self._onError)
+
+    def _onError(self, reply: QNetworkReply, error) -> None:
+        self._finish("{} {}".format(error, ("- " + reply.errorString()) if reply else "").strip())
+
+    def _finish(self, error: str = None) -> None:
+        if self._postData:
+            self._postData.close()
+            self._postData = None
+        self._metrics.finish(error is None)
+        self._onFinishedCallback(self, error)
+
+class MoonrakerGroupOutputDevice(OutputDevice):
+    def __init__(self, groupId: str, groupName: str) -> None:
+        super().__init__("MoonrakerGroupOutputDevice@" + groupId)
+        self._groupName = groupName
+        self._targets = {}
+        self._writing = False
+        self.setIconName("print")
+        self.setPriority(4)
+        Logger.log("d", "MoonrakerGroupOutputDevice for group '{}' created.".format(groupId))
+
+    def updateTargets(self, targets: dict) -> None:
+        # targets: printerId => (name, config)
+        self._targets = targets
+        description = catalog.i18nc("@action:button", "Upload to all {0} printers ({1})").format(self._groupName, len(self._targets))
+        self.setName(description)
+        self.setDescription(description)
+        self.setShortDescription(description)
+
+    def requestWrite(self, nodes, file_name = None, limit_mimetypes = None, file_handler = None, filter_by_machine = False, **kwargs) -> None:
+        if self._writing:
+            raise OutputDeviceError.DeviceBusyError()
+
+        self._writing = True
+        self.writeStarted.emit(self)
+
+        # the slice is serialized once on the job queue and shared by all targets
+        config = getConfig()
+        self._requestedFileName = file_name
+        job = SpoolFileJob(getOutputFormat(config.get("output_format", "gcode")), compressionLevel = config.ufpCompressionLevel, gcodeFilter = config.createGcodeFilter())
+        job.finished.connect(self._onSpoolJobFinished)
+        job.start()
+
+    def _onSpoolJobFinished(self, job: SpoolFileJob) -> None:
+        self._spoolPath, outputFormat = job.getResult() or (None, None)
+        if not self._spoolPath:
+            self._writing = False
+            self.writeError.emit(self)
+            return
+
+        config = getConfig()
+        file_name = self._requestedFileName
+        fileName = os.path.basename(file_name) if file_name else "%s." % CuraApplication.getInstance().getPrintInformation().jobName
+        fileName = translateFileName(fileName, config.get("trans_input", ""), config.get("trans_output", ""), config.get("trans_remove", ""))
+        self._fileName = fileName + "." + outputFormat
+        self._pathName = re.sub(r'^[\s/]+|[\s/]+$', '', config.get("upload_path", ""))
+        self._startPrint = config.get("upload_start_print_job", False)
+        self._uploadAutohideMessagebox = config.get("upload_autohide_messagebox", False)
+
+        self._pending = [MoonrakerUploadTarget(printerId, name, targetConfig, self._onTargetProgress, self._onTargetFinished) for printerId, (name, targetConfig) in self._targets.items()]
+        self._active = []
+        self._progress = {target.printerId: 0.0 for target in self._pending}
+        self._results = {}
+
+        self._message = Message(catalog.i18nc("@info:progress", "Uploading to {} printers...").format(len(self._pending)), 0, False, -1)
+        self._message.setTitle("Moonraker - Upload")
+        self._message.show()
+        if self._pending:
+            self._startNextTargets()
+        else:
+            self._onFinished()
+
+    def _startNextTargets(self) -> None:
+        while self._pending and len(self._active) < MAX_CONCURRENT_UPLOADS:
+            target = self._pending.pop(0)
+            self._active.append(target)
+            target.start(self._spoolPath, self._fileName, self._pathName, self._startPrint)
+
+    def _onTargetProgress(self, target: MoonrakerUploadTarget, progress: float) -> None:
+        self._progress[target.printerId] = progress
+        # one progress for all targets - each target has the same weight
+        totalProgress = int(sum(self._progress.values()) * 100 / len(self._progress))
+        if self._message:
+            self._message.setProgress(totalProgress)
+        self.writeProgress.emit(self, totalProgress)
+
+    def _onTargetFinished(self, target: MoonrakerUploadTarget, error: str = None) -> None:
+        if target not in self._active:
+            return
+        self._active.remove(target)
+        self._results[target.printerId] = (target.name, error)
+        if error:
+            Logger.log("e", "Upload to printer '{}' failed: {}".format(target.name, error))
+        else:
+            Logger.log("i", "Upload to printer '{}' completed.".format(target.name))
+        self._onTargetProgress(target, 1.0)
+
+        if self._pending or self._active:
+            self._startNextTargets()
+        else:
+            self._onFinished()
+
+    def _onFinished(self) -> None:
+        removeSpoolFile(self._spoolPath)
+        self._spoolPath = None
+        if self._message:
+            self._message.hide()
+            self._message = None
+
+        failed = [(name, error) for name, error in self._results.values() if error]
+        lines = ["✓ {}".format(name) for name, error in self._results.values() if not error]
+        lines += ["✗ {}: {}".format(name, error) for name, error in failed]
+        messageText = "Upload of '{}' to {} of {} printers successfully completed{}\n\n{}".format(os.path.basename(self._fileName), len(self._results) - len(failed), len(self._results), " and print jobs initialized." if self._startPrint else ".", "\n".join(lines))
+        message = Message(catalog.i18nc("@info:status", messageText), 30 if self._uploadAutohideMessagebox and not failed else 0, True)
+        message.setTitle("Moonraker - Error" if failed else "Moonraker")
+        message.show()
+
+        self._writing = False
+        if len(failed) == len(self._results):
+            self.writeError.emit(self)
+        else:
+            self.writeSuccess.emit(self)
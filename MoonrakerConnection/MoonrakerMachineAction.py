@@ -30,7 +30,12 @@ class MoonrakerMachineAction(MachineAction):
         super().__init__("MoonrakerMachineAction", catalog.i18nc("@action", "Connect Moonraker"))
         self._qml_url = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'qml', 'qt5' if USE_QT5 else 'qt6', 'MoonrakerConfiguration.qml')
         CuraApplication.getInstance().globalContainerStackChanged.connect(self._onGlobalContainerStackChanged)
-        CuraApplication.getInstance().getContainerRegistry().containerAdded.connect(self._onContainerAdded)
+        # the action is added to all machine definitions at once after the registry is loaded - per container while loading is slow
+        containerRegistry = CuraApplication.getInstance().getContainerRegistry()
+        if containerRegistry.findDefinitionContainersMetadata(type = "machine"):
+            self._addSupportedActions()
+        else:
+            containerRegistry.allMetadataLoaded.connect(self._onAllMetadataLoaded)
 
     def _onGlobalContainerStackChanged(self) -> None:
         self.settingsExistsChanged.emit()
@@ -40,19 +45,45 @@ class MoonrakerMachineAction(MachineAction):
         self.settingsRetryIntervalChanged.emit()
         self.settingsFrontendUrlChanged.emit()
         self.settingsOutputFormatChanged.emit()
+        self.settingsUfpCompressionLevelChanged.emit()
         self.settingsUploadDialogChanged.emit()
         self.settingsUploadStartPrintJobChanged.emit()
         self.settingsUploadRememberStateChanged.emit()
         self.settingsUploadAutohideMessageboxChanged.emit()
+        self.settingsUploadCompressionChanged.emit()
         self.settingsTranslateInputChanged.emit()
         self.settingsTranslateOutputChanged.emit()
         self.settingsTranslateRemoveChanged.emit()
         self.settingsCameraUrlChanged.emit()
         self.settingsCameraImageRotationChanged.emit()
         self.settingsCameraImageMirrorChanged.emit()
+        self.settingsUploadJobQueueChanged.emit()
+        self.settingsUploadPreheatChanged.emit()
+        self.settingsGcodeLimitPrecisionChanged.emit()
+        self.settingsGcodeDropModalChanged.emit()
+        self.settingsGcodeStripCommentsChanged.emit()
+        self.settingsUploadWhileBootingChanged.emit()
+        self.settingsUploadEmbedMetadataChanged.emit()
+        self.settingsUploadPipelinedChanged.emit()
+        self.settingsMetricsDumpChanged.emit()
+        self.settingsUploadSkipIdenticalChanged.emit()
+        self.settingsUploadVerifyChanged.emit()
  
-    def _onContainerAdded(self, container) -> None:
+    def _onAllMetadataLoaded(self) -> None:
+        CuraApplication.getInstance().getContainerRegistry().allMetadataLoaded.disconnect(self._onAllMetadataLoaded)
+        self._addSupportedActions()
+
+    def _addSupportedActions(self) -> None:
         # Add this action as a supported action to all machine definitions
+        machineActionManager = CuraApplication.getInstance().getMachineActionManager()
+        containerRegistry = CuraApplication.getInstance().getContainerRegistry()
+        for definition in containerRegistry.findDefinitionContainersMetadata(type = "machine"):
+            machineActionManager.addSupportedAction(definition["id"], self.getKey())
+        # definitions added later on (e.g. by a plugin or package installed at runtime) are handled one by one
+        containerRegistry.containerAdded.connect(self._onContainerAdded)
+
+    def _onContainerAdded(self, container) -> None:
+        # Add this action as a supported action to new machine definitions
         if isinstance(container, DefinitionContainer) and container.getMetaDataEntry("type") == "machine":
             CuraApplication.getInstance().getMachineActionManager().addSupportedAction(container.getId(), self.getKey())
 
@@ -64,16 +95,29 @@ class MoonrakerMachineAction(MachineAction):
         self.settingsRetryIntervalChanged.emit()
         self.settingsFrontendUrlChanged.emit()
         self.settingsOutputFormatChanged.emit()
+        self.settingsUfpCompressionLevelChanged.emit()
         self.settingsUploadDialogChanged.emit()
         self.settingsUploadStartPrintJobChanged.emit()
         self.settingsUploadRememberStateChanged.emit()
         self.settingsUploadAutohideMessageboxChanged.emit()
+        self.settingsUploadCompressionChanged.emit()
         self.settingsTranslateInputChanged.emit()
         self.settingsTranslateOutputChanged.emit()
         self.settingsTranslateRemoveChanged.emit()
         self.settingsCameraUrlChanged.emit()
         self.settingsCameraImageRotationChanged.emit()
         self.settingsCameraImageMirrorChanged.emit()
+        self.settingsUploadJobQueueChanged.emit()
+        self.settingsUploadPreheatChanged.emit()
+        self.settingsGcodeLimitPrecisionChanged.emit()
+        self.settingsGcodeDropModalChanged.emit()
+        self.settingsGcodeStripCommentsChanged.emit()
+        self.settingsUploadWhileBootingChanged.emit()
+        self.settingsUploadEmbedMetadataChanged.emit()
+        self.settingsUploadPipelinedChanged.emit()
+        self.settingsMetricsDumpChanged.emit()
+        self.settingsUploadSkipIdenticalChanged.emit()
+        self.settingsUploadVerifyChanged.emit()
 
     settingsExistsChanged = pyqtSignal()
     settingsUrlChanged = pyqtSignal()
@@ -82,16 +126,29 @@ class MoonrakerMachineAction(MachineAction):
     settingsRetryIntervalChanged = pyqtSignal()
     settingsFrontendUrlChanged = pyqtSignal()
     settingsOutputFormatChanged = pyqtSignal()
+    settingsUfpCompressionLevelChanged = pyqtSignal()
     settingsUploadDialogChanged = pyqtSignal()
     settingsUploadStartPrintJobChanged = pyqtSignal()
     settingsUploadRememberStateChanged = pyqtSignal()
     settingsUploadAutohideMessageboxChanged = pyqtSignal()
+    settingsUploadCompressionChanged = pyqtSignal()
     settingsTranslateInputChanged = pyqtSignal()
     settingsTranslateOutputChanged = pyqtSignal()
     settingsTranslateRemoveChanged = pyqtSignal()
     settingsCameraUrlChanged = pyqtSignal()
     settingsCameraImageRotationChanged = pyqtSignal()
     settingsCameraImageMirrorChanged = pyqtSignal()
+    settingsUploadJobQueueChanged = pyqtSignal()
+    settingsUploadPreheatChanged = pyqtSignal()
+    settingsGcodeLimitPrecisionChanged = pyqtSignal()
+    settingsGcodeDropModalChanged = pyqtSignal()
+    settingsGcodeStripCommentsChanged = pyqtSignal()
+    settingsUploadWhileBootingChanged = pyqtSignal()
+    settingsUploadEmbedMetadataChanged = pyqtSignal()
+    settingsUploadPipelinedChanged = pyqtSignal()
+    settingsMetricsDumpChanged = pyqtSignal()
+    settingsUploadSkipIdenticalChanged = pyqtSignal()
+    settingsUploadVerifyChanged = pyqtSignal()
 
     @pyqtProperty(bool, notify = settingsExistsChanged)
     def settingsExists(self) -> Optional[bool]:
@@ -130,6 +187,11 @@ class MoonrakerMachineAction(MachineAction):
         config = getConfig()
         return config.get("output_format", "gcode") if config else "gcode"
 
+    @pyqtProperty(str, notify = settingsUfpCompressionLevelChanged)
+    def settingsUfpCompressionLevel(self) -> Optional[str]:
+        config = getConfig()
+        return config.get("ufp_compression_level", "") if config else ""
+
     @pyqtProperty(bool, notify = settingsUploadDialogChanged)
     def settingsUploadDialog(self) -> Optional[bool]:
         config = getConfig()
@@ -150,6 +212,11 @@ class MoonrakerMachineAction(MachineAction):
         config = getConfig()
         return config.get("upload_autohide_messagebox", False) if config else False
 
+    @pyqtProperty(bool, notify = settingsUploadCompressionChanged)
+    def settingsUploadCompression(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_compression", False) if config else False
+
     @pyqtProperty(str, notify = settingsTranslateInputChanged)
     def settingsTranslateInput(self) -> Optional[str]:
         config = getConfig()
@@ -181,6 +248,61 @@ class MoonrakerMachineAction(MachineAction):
         config = getConfig()
         return config.get("camera_image_mirror", False) if config else False
 
+    @pyqtProperty(bool, notify = settingsUploadVerifyChanged)
+    def settingsUploadVerify(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_verify", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadSkipIdenticalChanged)
+    def settingsUploadSkipIdentical(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_skip_identical", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsMetricsDumpChanged)
+    def settingsMetricsDump(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("metrics_dump", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadPipelinedChanged)
+    def settingsUploadPipelined(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_pipelined", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadEmbedMetadataChanged)
+    def settingsUploadEmbedMetadata(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_embed_metadata", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadWhileBootingChanged)
+    def settingsUploadWhileBooting(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_while_booting", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsGcodeStripCommentsChanged)
+    def settingsGcodeStripComments(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("gcode_strip_comments", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsGcodeDropModalChanged)
+    def settingsGcodeDropModal(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("gcode_drop_modal", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsGcodeLimitPrecisionChanged)
+    def settingsGcodeLimitPrecision(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("gcode_limit_precision", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadPreheatChanged)
+    def settingsUploadPreheat(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_preheat", False) if config else False
+
+    @pyqtProperty(bool, notify = settingsUploadJobQueueChanged)
+    def settingsUploadJobQueue(self) -> Optional[bool]:
+        config = getConfig()
+        return config.get("upload_job_queue", False) if config else False
+
     @pyqtSlot(QVariant)
     def saveConfig(self, paramsQJSValObj):
         oldConfig = getConfig()
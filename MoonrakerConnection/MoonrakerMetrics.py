@@ -0,0 +1,86 @@
+import json
+import os.path
+from collections import deque
+from time import monotonic, time
+
+from UM.Logger import Logger
+from UM.Resources import Resources
+
+# number of uploads remembered per printer
+METRICS_HISTORY_LIMIT = 100
+METRICS_FILE_NAME = "moonraker_metrics.json"
+
+# printerId => recent upload records (oldest first)
+_history = {}
+
+def getHistory(printerId: str) -> list:
+    return list(_history.get(printerId, []))
+
+def getThroughput(printerId: str):
+    # average transfer rate of the recent successful uploads in bytes/s - None if unknown
+    rates = [record["throughput"] for record in _history.get(printerId, []) if record.get("success") and record.get("throughput")]
+    return sum(rates) / len(rates) if rates else None
+
+def dumpHistory(path: str = None) -> str:
+    path = path if path else os.path.join(Resources.getDataStoragePath(), METRICS_FILE_NAME)
+    try:
+        with open(path, "w") as metricsFile:
+            json.dump({printerId: list(records) for printerId, records in _history.items()}, metricsFile, indent = 2)
+    except OSError as e:
+        Logger.log("w", "Upload metrics could not be written to '{}': {}".format(path, e))
+    return path
+
+class MoonrakerUploadMetrics:
+    # Phases of an upload:
+    #   serialization - mesh writer output into the spool file
+    #   encoding      - checksum and compression of the payload
+    #   connect       - power devices and readiness of the printer
+    #   transfer      - first to last byte sent
+    #   response      - last byte sent until Moonraker answers (metadata processing, print start)
+    def __init__(self, printerId: str) -> None:
+        self._printerId = printerId
+        self._timestamp = time()
+        self._started = {}
+        self._durations = {}
+        self._uploadSize = 0
+        self._transferSize = 0
+        self._finished = False
+
+    def start(self, phase: str) -> None:
+        self._started[phase] = monotonic()
+
+    def stop(self, phase: str) -> None:
+        startTime = self._started.pop(phase, None)
+        if startTime is not None:
+            # phases may run several times (e.g. resent uploads) - sum them up
+            self._durations[phase] = self._durations.get(phase, 0.0) + monotonic() - startTime
+
+    def setSizes(self, uploadSize: int, transferSize: int) -> None:
+        self._uploadSize = uploadSize
+        self._transferSize = transferSize
+
+    def onUploadProgress(self, bytesSent: int, bytesTotal: int) -> None:
+        if bytesTotal > 0 and bytesSent >= bytesTotal and "transfer" in self._started:
+            self.stop("transfer")
+            self.start("response")
+
+    def finish(self, success: bool, dump: bool = False) -> dict:
+        if self._finished:
+            return None
+        self._finished = True
+        self.stop("response")
+        transfer = self._durations.get("transfer")
+        record = {
+            "timestamp": self._timestamp,
+            "success": success,
+            "upload_size": self._uploadSize,
+            "transfer_size": self._transferSize,
+            "throughput": self._transferSize / transfer if transfer else None,
+            "durations": {phase: round(duration, 3) for phase, duration in self._durations.items()}
+        }
+        _history.setdefault(self._printerId, deque(maxlen = METRICS_HISTORY_LIMIT)).append(record)
+        # one structured line per upload - easy to grep from cura.log
+        Logger.log("i", "MoonrakerMetrics {}".format(json.dumps(dict(record, printer = self._printerId))))
+        if dump:
+            dumpHistory()
+        return record
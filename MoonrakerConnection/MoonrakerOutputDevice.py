@@ -3,9 +3,6 @@ import os.path
 import re
 import urllib.parse
 from enum import Enum
-from io import BytesIO, StringIO
-from typing import cast
-from time import sleep
 
 USE_QT5 = False
 try:
@@ -13,13 +10,13 @@ try:
 except ImportError: # Cura <= 3.6   
     CuraSDKVersion = "6.0.0"
 if CuraSDKVersion >= "8.0.0":
-    from PyQt6.QtCore import QByteArray, QObject, QUrl, QVariant, pyqtSlot, pyqtProperty
+    from PyQt6.QtCore import QIODevice, QObject, QTimer, QUrl, QVariant, pyqtSlot, pyqtProperty
     from PyQt6.QtGui import QDesktopServices
-    from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply, QHttpMultiPart, QHttpPart
+    from PyQt6.QtNetwork import QNetworkRequest, QNetworkReply
 else:
-    from PyQt5.QtCore import QByteArray, QObject, QUrl, QVariant, pyqtSlot, pyqtProperty
+    from PyQt5.QtCore import QIODevice, QObject, QTimer, QUrl, QVariant, pyqtSlot, pyqtProperty
     from PyQt5.QtGui import QDesktopServices
-    from PyQt5.QtNetwork import QNetworkRequest, QNetworkReply, QHttpMultiPart, QHttpPart
+    from PyQt5.QtNetwork import QNetworkRequest, QNetworkReply
     USE_QT5 = True
 
 from cura.CuraApplication import CuraApplication
@@ -27,31 +24,41 @@ from cura.PrinterOutput.PrinterOutputDevice import PrinterOutputDevice, Connecti
 
 from UM.i18n import i18nCatalog
 from UM.Logger import Logger
-from UM.Mesh.MeshWriter import MeshWriter
 from UM.Message import Message
 from UM.OutputDevice import OutputDeviceError
 
+from .MoonrakerFileCache import MoonrakerFileCache
 from .MoonrakerOutputController import MoonrakerOutputController
+from .MoonrakerMetrics import MoonrakerUploadMetrics
 from .MoonrakerOutputModel import MoonrakerOutputModel
-from .MoonrakerSettings import getConfig, saveConfig, validateUrl
+from .MoonrakerRetryScheduler import MoonrakerRetryScheduler
+from .MoonrakerSession import MoonrakerSession
+from .MoonrakerSettings import MoonrakerConfig, getConfig, saveConfig, getUploadHash, saveUploadHash, validateUrl
+from .MoonrakerTelemetry import MoonrakerTelemetry
+from .MoonrakerWebSocket import MoonrakerWebSocket
+from .MoonrakerUploadQueue import MoonrakerUploadQueue
+from .MoonrakerUpload import SpoolFileJob, getOutputFormat, createMetadataHeader, createPreheatTargets, createPreheatScript, writeSpoolFile, createHeaders, translateFileName, removeSpoolFile, openBodyDevice, createUploadFields, ChecksumJob, createMultiPart, CompressedBodyJob, formatSize
 
 try:
 	NoError = QNetworkReply.NetworkError.NoError
-	FormDataType = QHttpMultiPart.ContentType.FormDataType
-	ContentDispositionHeader = QNetworkRequest.KnownHeaders.ContentDispositionHeader
-	ContentTypeHeader = QNetworkRequest.KnownHeaders.ContentTypeHeader
+	HttpStatusCodeAttribute = QNetworkRequest.Attribute.HttpStatusCodeAttribute
 except AttributeError:
 	NoError = 0
-	FormDataType = QHttpMultiPart.FormDataType
-	ContentDispositionHeader = QNetworkRequest.ContentDispositionHeader
-	ContentTypeHeader = QNetworkRequest.ContentTypeHeader
+	HttpStatusCodeAttribute = QNetworkRequest.HttpStatusCodeAttribute
 
 catalog = i18nCatalog("cura")
 spinner = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
+# seconds a printer may take to boot after its power devices were turned on
+POWER_ON_TIMEOUT = 180.0
+# print_stats states of a printer without a print job - klippy is 'ready' while printing as well
+IDLE_PRINT_STATES = ('standby', 'complete', 'cancelled')
+# transmissions of the whole file per upload - Moonraker can't resume an upload, every retry sends the file again
+MAX_UPLOAD_TRANSMISSIONS = 3
 
 class OutputStage(Enum):
     Ready = 0
     Writing = 1
+    Connecting = 2
 
 class MoonrakerOutputDevice(PrinterOutputDevice):
     def __init__(self, deviceId: str, canConnect: bool = True) -> None:
@@ -68,8 +75,40 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
             self._monitor_view_qml_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', "qml", 'qt5' if USE_QT5 else 'qt6', "MoonrakerMonitor.qml")
             #self._control_view_qml_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', "qml", 'qt5' if USE_QT5 else 'qt6', "MoonrakerControl.qml")
             globalContainerStack.setMetaDataEntry("group_name", globalContainerStack.getName())
+        self._printerId = deviceId
         self._config = None
         self._stage = OutputStage.Ready
+        self._request = None
+        self._gcodeFilter = None
+        self._retryScheduler = MoonrakerRetryScheduler()
+        # keeps the spinner of the connect message alive while waiting for the printer
+        self._spinnerCounter = 0
+        self._spinnerTimer = QTimer()
+        self._spinnerTimer.setInterval(100)
+        self._spinnerTimer.timeout.connect(self._onSpinnerTimer)
+        # persistent connection for notifications - HTTP is used if it is not available
+        self._webSocket = MoonrakerWebSocket(self)
+        self._webSocket.klippyStateChanged.connect(self._onKlippyStateChanged)
+        self._webSocket.powerDeviceChanged.connect(self._onPowerDeviceChanged)
+        # warm connection and cached readiness of the printer between uploads
+        self._session = MoonrakerSession(self._webSocket, self)
+        # directories and files on the printer for the upload dialog
+        self._fileCache = MoonrakerFileCache(self._webSocket, self)
+        self._fileCache.filesChanged.connect(self._onRemoteFilesChanged)
+        self._dialog = None
+        # temperatures and print job for the monitor
+        self._telemetry = MoonrakerTelemetry(self._webSocket, self._printers[0], globalContainerStack.getProperty("machine_extruder_count", "value"), self)
+        # jobs sent while the device is busy - drained one after another
+        self._uploadQueue = MoonrakerUploadQueue(deviceId, self)
+        self._uploadQueue.queueChanged.connect(self._onQueueChanged)
+        self._queueDialog = None
+        self._queueNotified = False
+        # spool jobs of uploads sent while the device is busy => file name of the upload
+        self._queuedSpoolJobs = {}
+        # uploaded files of the drained queue waiting to be added to the job queue of Moonraker in one request
+        self._jobBatch = []
+        # id of the queued job being uploaded - it leaves the upload queue only after its upload is completed
+        self._queuedJobId = None
         Logger.log("d", "MoonrakerOutputDevice [canConnect: {}] for printer '{}' created.".format(canConnect, deviceId))
 
     def requestWrite(self, node, fileName: str = None, *args, **kwargs) -> None:
@@ -80,36 +119,41 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
             return
         
         if self._stage != OutputStage.Ready:
-            raise OutputDeviceError.DeviceBusyError()
+            self._enqueueWrite(fileName)
+            return
 
         # Make sure post-processing plugin are run on the gcode
         self.writeStarted.emit(self)
-
-        # The presliced print should always be send using `GCodeWriter`
-        printInformation = CuraApplication.getInstance().getPrintInformation()
-        pluginRegistry = CuraApplication.getInstance().getPluginRegistry()
-        if self._outputFormat != "ufp" or not printInformation or printInformation.preSliced:
-            self._outputFormat = "gcode"
-            meshWriter = cast(MeshWriter, pluginRegistry.getPluginObject("GCodeWriter"))
-            self._stream = StringIO()
+        # drop a payload left over by a cancelled upload dialog
+        removeSpoolFile(self._spoolPath)
+
+        self._metrics = MoonrakerUploadMetrics(self._printerId)
+        self._metrics.start("serialization")
+        header = self._getMetadataHeader()
+        self._gcodeFilter = self._config.createGcodeFilter()
+        self._preheatTargets = self._getPreheatTargets()
+        if self._uploadPipelined or self._gcodeFilter and self._gcodeFilter.isEnabled() or self._needsChecksum():
+            # the writer runs on the job queue while the dialog is open and the printer is checked - always with a
+            # filter or a checksum, they would block the UI for large jobs
+            self._outputFormat = getOutputFormat(self._outputFormat)
+            self._spoolJob = SpoolFileJob(self._outputFormat, header, self._config.ufpCompressionLevel, self._gcodeFilter, self._needsChecksum())
+            self._spoolJob.finished.connect(self._onSpoolJobFinished)
+            self._spoolJob.start()
         else:
-            meshWriter = cast(MeshWriter, pluginRegistry.getPluginObject("UFPWriter"))
-            self._stream = BytesIO()
-
-        if not meshWriter.write(self._stream, None):
-            Logger.log("e", "MeshWriter failed: %s" % meshWriter.getInformation())
-            return
+            self._spoolPath, self._outputFormat = writeSpoolFile(self._outputFormat, header, self._config.ufpCompressionLevel, self._gcodeFilter)
+            self._metrics.stop("serialization")
+            if not self._spoolPath:
+                self._resetState()
+                return
 
         # Prepare filename for upload
         if fileName:
             fileName = os.path.basename(fileName)
         else:
-            fileName = "%s." % printInformation.jobName
+            fileName = "%s." % CuraApplication.getInstance().getPrintInformation().jobName
         
         # Translate filename
-        if self._translateInput and self._translateOutput:
-            translatedFileName = fileName.translate(fileName.maketrans(self._translateInput, self._translateOutput, self._translateRemove if self._translateRemove else ""))
-            fileName = translatedFileName
+        fileName = translateFileName(fileName, self._translateInput, self._translateOutput, self._translateRemove)
 
         self._pathName = re.sub(r'^[\s/]+|[\s/]+$', '', self._uploadPath)
         self._fileName = fileName  + "." + self._outputFormat
@@ -121,22 +165,160 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
             self._dialog.pathesChanged.connect(self._onUploadPathesChanged)
             self._dialog.textChanged.connect(self._onUploadFilenameChanged)
             self._dialog.accepted.connect(self._onUploadFilenameAccepted)
+            self._dialog.rejected.connect(self._onUploadFilenameRejected)
             self._dialog.show()
             self._dialog.findChild(QObject, "printField").setProperty('checked', self._uploadStartPrintJob)
             self._dialog.findChild(QObject, "pathField").setProperty('path', self._pathName)
             self._dialog.findChild(QObject, "pathField").setProperty('pathes', self._uploadPathes)
+            # served from the cache - the dialog doesn't wait for the printer
+            self._dialog.findChild(QObject, "pathField").setProperty('remotePathes', self._fileCache.getDirectories())
+            if not self._webSocket.isConnected():
+                # no notifications => the cache may be outdated
+                self._fileCache.refresh()
             self._dialog.findChild(QObject, "nameField").setProperty('text', self._fileName)
             self._dialog.findChild(QObject, "nameField").select(0, len(self._fileName) - len(self._outputFormat) - 1)
         else:
             # Bypass upload dialog
             self._onUploadFilenameAccepted()
-    
+
+    def _getMetadataHeader(self) -> str:
+        # ufp packages carry their own thumbnail, presliced G-code has its own header
+        printInformation = CuraApplication.getInstance().getPrintInformation()
+        if not self._uploadEmbedMetadata or getOutputFormat(self._outputFormat) != "gcode" or not printInformation or printInformation.preSliced:
+            return None
+        return createMetadataHeader()
+
+    def _getPreheatTargets(self) -> dict:
+        # temperatures of presliced G-code are unknown
+        printInformation = CuraApplication.getInstance().getPrintInformation()
+        if not self._uploadPreheat or not printInformation or printInformation.preSliced:
+            return None
+        return createPreheatTargets()
+
+    def _onSpoolJobFinished(self, job: SpoolFileJob) -> None:
+        # None => the job failed with an exception before it returned its result
+        spoolPath, outputFormat = job.getResult() or (None, None)
+        if job is not self._spoolJob:
+            # upload was cancelled in the meantime
+            removeSpoolFile(spoolPath)
+            return
+        self._spoolJob = None
+        self._metrics.stop("serialization")
+        if not spoolPath:
+            if self._stage == OutputStage.Ready:
+                # _onError ignores this stage - the upload dialog may still be open
+                if self._dialog:
+                    self._dialog.deleteLater()
+                    self._dialog = None
+                self.writeError.emit(self)
+                self._resetState()
+            else:
+                self._onError(None, "G-code could not be written.")
+            return
+
+        Logger.log("d", "Serialization finished [stage: {}].".format(self._stage))
+        self._spoolPath = spoolPath
+        self._checksum = job.getChecksum()
+        if self._stage == OutputStage.Writing:
+            # printer was ready first
+            self._startTransfer()
+
+    def _enqueueWrite(self, fileName: str = None) -> None:
+        # the device is busy => spool the slice now and upload it later with the default path and start print setting
+        self.writeStarted.emit(self)
+        # the writer runs on the job queue - the running upload goes on meanwhile
+        job = SpoolFileJob(getOutputFormat(self._outputFormat), self._getMetadataHeader(), self._config.ufpCompressionLevel, self._config.createGcodeFilter(), self._needsChecksum())
+        self._queuedSpoolJobs[job] = fileName
+        job.finished.connect(self._onQueuedSpoolJobFinished)
+        job.start()
+
+    def _onQueuedSpoolJobFinished(self, job: SpoolFileJob) -> None:
+        fileName = self._queuedSpoolJobs.pop(job, None)
+        spoolPath, outputFormat = job.getResult() or (None, None)
+        if not spoolPath:
+            self.writeError.emit(self)
+            return
+
+        if fileName:
+            fileName = os.path.basename(fileName)
+        else:
+            fileName = "%s." % CuraApplication.getInstance().getPrintInformation().jobName
+        fileName = translateFileName(fileName, self._translateInput, self._translateOutput, self._translateRemove) + "." + outputFormat
+
+        position = self._uploadQueue.enqueue(spoolPath, fileName, re.sub(r'^[\s/]+|[\s/]+$', '', self._uploadPath), self._uploadStartPrintJob, outputFormat, job.getChecksum())
+        message = Message(catalog.i18nc("@info:status", "Upload of '{}' to {} queued at position {}.").format(fileName, self._name, position), 30, True)
+        message.setTitle("Moonraker - Queue")
+        message.addAction("show_queue", catalog.i18nc("@action:button", "Show Queue"), "", catalog.i18nc("@info:tooltip", "Show the queued uploads."))
+        message.actionTriggered.connect(self._onMessageActionTriggered)
+        message.show()
+        self.writeSuccess.emit(self)
+
+    def _onQueueChanged(self) -> None:
+        # deferred - the queue may be changed while a job is taken from it
+        QTimer.singleShot(0, self._processQueue)
+
+    def _processQueue(self) -> None:
+        if self._stage != OutputStage.Ready:
+            return
+        if self._jobBatch and not self._holdsJobBatch():
+            # the queue was paused or emptied before the next upload => the held files are not kept waiting
+            self._flushJobBatch()
+        # a pending upload dialog owns the spool file and blocks the queue as well
+        if self._spoolPath or self._spoolJob or not self._canConnect or self._uploadQueue.isPaused():
+            return
+        job = self._uploadQueue.take()
+        if not job:
+            return
+
+        Logger.log("i", "Starting queued upload of '{}'.".format(job["file_name"]))
+        self.writeStarted.emit(self)
+        self._metrics = MoonrakerUploadMetrics(self._printerId)
+        # the spool file of the job belongs to the queue - removed with the job once the upload is completed
+        self._queuedJobId = job["id"]
+        self._spoolPath = job["spool_path"]
+        self._outputFormat = job["output_format"]
+        self._pathName = job["path_name"]
+        self._fileName = job["file_name"]
+        self._startPrint = job["start_print"]
+        self._checksum = job.get("checksum")
+        self._startUpload()
+
+    def _showQueue(self) -> None:
+        if self._queueDialog:
+            self._queueDialog.deleteLater()
+        qmlUrl = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'resources', 'qml', 'qt5' if USE_QT5 else 'qt6', 'MoonrakerQueue.qml')
+        self._queueDialog = CuraApplication.getInstance().createQmlComponent(qmlUrl, {"queue": self._uploadQueue, "printerName": self._name})
+        self._queueDialog.show()
+
+    def connect(self) -> None:
+        super().connect()
+        if self._canConnect:
+            self._webSocket.open(self._url, self._apiKey)
+            self._session.open(self._url, self._apiKey, self._getPowerDevices())
+            self._fileCache.open(self._url, self._apiKey)
+            if not self._queueNotified and not self._uploadQueue.isEmpty():
+                # queue survived a restart of Cura - let the user decide when to continue
+                self._queueNotified = True
+                message = Message(catalog.i18nc("@info:status", "{} queued upload(s) to {} are waiting.").format(len(self._uploadQueue.jobs), self._name), 0, True)
+                message.setTitle("Moonraker - Queue")
+                message.addAction("resume_queue", catalog.i18nc("@action:button", "Resume"), "", catalog.i18nc("@info:tooltip", "Continue with the queued uploads."))
+                message.addAction("show_queue", catalog.i18nc("@action:button", "Show Queue"), "", catalog.i18nc("@info:tooltip", "Show the queued uploads."))
+                message.actionTriggered.connect(self._onMessageActionTriggered)
+                message.show()
+
+    def close(self) -> None:
+        super().close()
+        self._webSocket.close()
+        self._session.close()
+        self._fileCache.close()
+
     def updateConfig(self, config: dict = None) -> None:
         if self._stage != OutputStage.Ready:
             raise OutputDeviceError.DeviceBusyError()
 
         if not config:
             config = getConfig()
+        config = MoonrakerConfig(config)
 
         if self._config != config:
             self._config = config
@@ -155,6 +337,16 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
             self._uploadStartPrintJob = self._config.get("upload_start_print_job", False)
             self._uploadRememberState = self._config.get("upload_remember_state", False)
             self._uploadAutohideMessagebox = self._config.get("upload_autohide_messagebox", False)
+            self._uploadCompression = self._config.get("upload_compression", False)
+            self._uploadVerify = self._config.get("upload_verify", False)
+            self._uploadSkipIdentical = self._config.get("upload_skip_identical", False)
+            self._uploadPipelined = self._config.get("upload_pipelined", False)
+            self._uploadEmbedMetadata = self._config.get("upload_embed_metadata", False)
+            self._uploadWhileBooting = self._config.get("upload_while_booting", False)
+            self._uploadPreheat = self._config.get("upload_preheat", False)
+            self._uploadJobQueue = self._config.get("upload_job_queue", False)
+            self._metricsDump = self._config.get("metrics_dump", False)
+            self._configureRetries()
             self._translateInput = self._config.get("trans_input", "")
             self._translateOutput = self._config.get("trans_output", "")
             self._translateRemove = self._config.get("trans_remove", "")
@@ -200,24 +392,73 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
                 Logger.log("i", "No valid configuration for printer '{}' found.".format(globalContainerStack.getId()))
 
             self._message = None
-            self._stream = None
+            self._spoolPath = None
+            self._spoolJob = None
+            self._postData = None
+            self._metrics = None
+            self._compressedPath = None
+            # None => unknown; probed with the first compressed upload
+            self._compressionSupported = None
+            self._moonrakerVersion = None
             self._resetState()
 
     def _resetState(self) -> None:
         Logger.log("d", "Reset state of device.")
-        if self._stream:
-            self._stream.close()
-        self._stream = None
+        if self._postData:
+            self._postData.close()
+        self._postData = None
+        if self._queuedJobId:
+            # the queued job failed or was cancelled => it stays at the head of the paused queue with its spool file
+            self._uploadQueue.release(self._queuedJobId)
+            self._queuedJobId = None
+            self._spoolPath = None
+        removeSpoolFile(self._spoolPath)
+        self._spoolPath = None
+        # a running serialization removes its spool file when it finishes
+        self._spoolJob = None
+        removeSpoolFile(self._compressedPath)
+        self._compressedPath = None
+        # boundary, sizes and fields of the compressed body - reused when the upload is sent again
+        self._compressedBody = None
+        # a running compression removes its file when it finishes
+        self._compressJob = None
+        self._uploadSize = None
+        self._transferSize = None
+        self._transmissions = 0
+        self._gcodeFilter = None
+        self._preheatTargets = None
+        self._preheatPending = None
+        self._preheated = None
+        self._queueDepth = None
+        self._checksum = None
+        self._checksumJob = None
+        self._checksumContinuation = None
+        self._uploadedPath = None
+        self._uploadSkipped = False
+        if self._metrics:
+            # an upload which did not reach _onUploadCompleted
+            self._metrics.finish(False, self._metricsDump)
+        self._metrics = None
         self._pathName = None
         self._fileName = None
+        # a queued job or the available writers may have changed the format of the last upload
+        self._outputFormat = self._config.outputFormat
         self._startPrint = None
-        self._postData = None
-        self._errorCounter = 0
+        self._bootingUpload = False
+        self._request = None
+        self._retryScheduler.reset()
+        self._configureRetries()
+        self._spinnerTimer.stop()
         self._stage = OutputStage.Ready
+        self._session.setIdle(True)
+        if not self._uploadQueue.isEmpty() or self._jobBatch:
+            QTimer.singleShot(0, self._processQueue)
 
     def _onUploadPathesChanged(self, pathes: QVariant) -> None:
         if pathes:
-            self._uploadPathes = pathes.toVariant()
+            # directories of the printer are listed, but only the own entries are remembered
+            remoteDirectories = set(self._fileCache.getDirectories())
+            self._uploadPathes = [path for path in pathes.toVariant() if path not in remoteDirectories or path in self._uploadPathes]
             Logger.log("d", "Pathes for upload set to '{}'.".format(self._uploadPathes))
             config = getConfig()
             config["upload_pathes"] = self._uploadPathes
@@ -265,6 +506,25 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
         self._dialog.setProperty('validName', validName)
         self._dialog.setProperty('validationNameError', validationNameError)
 
+        # Check existing file on the printer
+        overwriteWarning = ''
+        if validPath and validName:
+            pathName = re.sub(r'^[\s/]+|[\s/]+$', '', pathName)
+            if '.' not in fileName:
+                fileName += '.' + self._outputFormat
+            if not self._fileCache.isCached(pathName):
+                if self._fileCache.hasDirectory(pathName):
+                    # answered by _onRemoteFilesChanged
+                    self._fileCache.requestDirectory(pathName)
+            elif self._fileCache.getFile(pathName, fileName):
+                overwriteWarning = '*exists on the printer and will be overwritten'
+        self._dialog.setProperty('overwriteWarning', overwriteWarning)
+
+    def _onRemoteFilesChanged(self) -> None:
+        if self._dialog:
+            self._dialog.findChild(QObject, "pathField").setProperty('remotePathes', self._fileCache.getDirectories())
+            self._onUploadFilenameChanged()
+
     def _onUploadFilenameAccepted(self) -> None:
         pathName = self._uploadPath
         fileName = self._fileName
@@ -280,7 +540,8 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
                 config["upload_path"] = re.sub(r'^[\s/]+|[\s/]+$', '', pathName)
                 config["upload_start_print_job"] = startPrint
                 saveConfig(config)
-            self._dialog.deleteLater()       
+            self._dialog.deleteLater()
+            self._dialog = None
 
         # Resolve pathname
         self._pathName = re.sub(r'^[\s/]+|[\s/]+$', '', pathName)
@@ -295,13 +556,34 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
         # Resolve startPrint
         self._startPrint = startPrint
         Logger.log("d", "StartPrint set to '{}'.".format(self._startPrint))
+        self._startUpload()
+
+    def _onUploadFilenameRejected(self) -> None:
+        self._dialog.deleteLater()
+        self._dialog = None
+        # not an upload => nothing to record
+        self._metrics = None
+        self._resetState()
 
+    def _startUpload(self) -> None:
         Logger.log("i", "Connecting to Moonraker at {}.".format(self._url))
+        self._stage = OutputStage.Connecting
+        self._session.setIdle(False)
+        self._metrics.start("connect")
+        if self._isPrinterReady():
+            # the cached state is fresh => no need to ask the printer again
+            Logger.log("d", "Printer state [klippy {}] known from session - uploading right away.".format(self._session.getKlippyState()))
+            self._onPrinterOnline()
+            return
+
         # Show a message with status of connection
         messageText = self._getConnectMessage()
         self._message = Message(catalog.i18nc("@info:status", messageText), 0, False)
         self._message.setTitle("Moonraker - Connect")
+        self._message.addAction("cancel", catalog.i18nc("@action:button", "Cancel"), "", catalog.i18nc("@info:tooltip", "Cancel upload to Moonraker."))
+        self._message.actionTriggered.connect(self._onMessageActionTriggered)
         self._message.show()
+        self._spinnerTimer.start()
 
         # Handle power device first
         if self._powerDevice:
@@ -309,53 +591,137 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
         else:
             self._getPrinterStatus()
     
+    def _getPowerDevices(self) -> list:
+        return [x.strip() for x in self._powerDevice.split(',') if x.strip()]
+
+    def _startsPrintJob(self) -> bool:
+        # the job queue of Moonraker waits for klippy on its own - power devices with 'on_when_job_queued' are turned on by Moonraker
+        return self._startPrint and not self._uploadJobQueue
+
+    def _isPrinterReady(self) -> bool:
+        klippyState = self._session.getKlippyState()
+        if not self._startsPrintJob():
+            return bool(klippyState)
+        # barrier for a print job: klippy is ready and no power device is known to be off
+        return klippyState == 'ready' and all(self._session.getPowerState(powerDevice) != 'off' for powerDevice in self._getPowerDevices())
+
     def _getPowerDeviceStatus(self) -> None:
-        # only check first power device
-        powerDevice = [x.strip() for x in self._powerDevice.split(',')][0]
-        Logger.log("d", "Checking printer device [power {}] status.".format(powerDevice))
+        powerDevices = self._getPowerDevices()
+        powerDeviceStates = {powerDevice: self._session.getPowerState(powerDevice) for powerDevice in powerDevices}
+        if all(powerDeviceStates.values()):
+            Logger.log("d", "Power devices [power {}] status known from session.".format(powerDeviceStates))
+            self._onPowerDeviceStatus(powerDeviceStates)
+            return
+        Logger.log("d", "Checking printer devices [power {}] status.".format(", ".join(powerDevices)))
 
-        self._sendRequest('machine/device_power/device?device={}'.format(powerDevice), on_success = self._checkPowerDeviceStatus)
+        # one request for the status of all power devices
+        self._sendRequest('machine/device_power/status?' + '&'.join(urllib.parse.quote(powerDevice) for powerDevice in powerDevices), on_success = self._checkPowerDeviceStatus, retry = True)
 
     def _checkPowerDeviceStatus(self, reply: QNetworkReply) -> None:
+        if self._stage != OutputStage.Connecting:
+            return
         response = self._getResponse(reply)
-        powerDevice = list(response['result'].keys())[0]
-        powerDeviceStatus = list(response['result'].values())[0]
-        logMessage = "Power device [power {}] status == '{}'; startPrint is {} => ".format(powerDevice, powerDeviceStatus, self._startPrint)
+        powerDeviceStates = response.get('result', {}) if isinstance(response, dict) else {}
+        for powerDevice, powerDeviceStatus in powerDeviceStates.items():
+            self._session.updatePowerState(powerDevice, powerDeviceStatus)
+        self._onPowerDeviceStatus(powerDeviceStates)
+
+    def _onPowerDeviceStatus(self, powerDeviceStates: dict) -> None:
+        powerDevicesOff = [powerDevice for powerDevice, powerDeviceStatus in powerDeviceStates.items() if powerDeviceStatus == 'off']
+        logMessage = "Power devices [power {}] status; startPrint is {} => ".format(powerDeviceStates, self._startPrint)
         
-        # only turn on power device if start print job is requested
-        if self._startPrint and powerDeviceStatus == 'off':
-            Logger.log("d", logMessage + "Calling _turnPowerDeviceOn() - turn on power device.")
-            self._turnPowerDeviceOn()
+        # only turn on power devices if start print job is requested
+        if self._startsPrintJob() and powerDevicesOff:
+            Logger.log("d", logMessage + "Calling _turnPowerDeviceOn() - turn on power devices {}.".format(", ".join(powerDevicesOff)))
+            self._turnPowerDeviceOn(powerDevicesOff)
         else:
-            Logger.log("d", logMessage + "Calling _getPrinterStatus() - override status of power device (only upload file).")
+            Logger.log("d", logMessage + "Calling _getPrinterStatus() - override status of power devices (only upload file).")
             self._getPrinterStatus()
 
-    def _turnPowerDeviceOn(self) -> None:
-        for index, powerDevice in enumerate([x.strip() for x in self._powerDevice.split(',')]):
-            Logger.log("i", "Turning on Moonraker power device [power {}].".format(powerDevice))
-            # on_success-callback: track the status of the printer only through the first powerDevice for the subsequent flow
-            self._sendRequest('machine/device_power/device?' + urllib.parse.urlencode({'device': powerDevice, 'action': 'on'}), data = '{}'.encode(), dataIsJSON = True, on_success = self._getPrinterStatus if index == 0 else None)
+    def _turnPowerDeviceOn(self, powerDevices: list) -> None:
+        Logger.log("i", "Turning on Moonraker power devices [power {}].".format(", ".join(powerDevices)))
+        # all devices are switched by one request
+        self._sendRequest('machine/device_power/on?' + '&'.join(urllib.parse.quote(powerDevice) for powerDevice in powerDevices), data = '{}'.encode(), dataIsJSON = True, on_success = self._onPowerDeviceOn, retry = True)
+
+    def _onPowerDeviceOn(self, reply: QNetworkReply) -> None:
+        if self._stage != OutputStage.Connecting:
+            return
+        response = self._getResponse(reply)
+        for powerDevice, powerDeviceStatus in (response.get('result', {}) if isinstance(response, dict) else {}).items():
+            self._session.updatePowerState(powerDevice, powerDeviceStatus)
+        # the printer is booting now => wait up to POWER_ON_TIMEOUT for it
+        self._retryScheduler.reset()
+        self._configureRetries(POWER_ON_TIMEOUT)
+        if self._uploadWhileBooting:
+            # the upload doesn't need klippy - the print job is started as soon as the printer is ready
+            Logger.log("i", "Uploading while the printer is booting.")
+            self._bootingUpload = True
+            self._onPrinterOnline()
+        else:
+            self._getPrinterStatus()
 
     def _getPrinterStatus(self, reply: QNetworkReply = None) -> None:
+        if self._stage != OutputStage.Connecting:
+            return
+        if self._isPrinterReady():
+            # state is known from the websocket or a recent response => no need to ask for it
+            Logger.log("d", "Klippy state '{}' known from session.".format(self._session.getKlippyState()))
+            self._onPrinterOnline()
+            return
         self._sendRequest('server/info', on_success = self._checkPrinterStatus, on_error = self._onPrinterError)
 
     def _checkPrinterStatus(self, reply: QNetworkReply) -> None:
+        if self._stage != OutputStage.Connecting:
+            return
         response = self._getResponse(reply)
         status = response['result']['klippy_state']
-
-        if self._startPrint and status == 'ready' or not self._startPrint:
-            # startPrint & status == 'ready' => printer is online || no startPrint => upload only
+        self._session.updateKlippyState(status)
+        moonrakerVersion = response['result'].get('moonraker_version')
+        if moonrakerVersion != self._moonrakerVersion:
+            # a different Moonraker release may behave differently => probe compression again
+            self._moonrakerVersion = moonrakerVersion
+            self._compressionSupported = None
+
+        if status == 'ready' or not self._startsPrintJob():
+            # status == 'ready' => printer is online || no print job started by the upload => upload only
             self._onPrinterOnline(reply)
         else:
             # printer is not ready => increase timeoutCounter
             self._onPrinterError(reply, "The status of the printer is '{}'.\n\n{}".format(status, status.strip()))
 
-    def _onPrinterOnline(self, reply: QNetworkReply) -> None:
+    def _onKlippyStateChanged(self, klippyState: str) -> None:
+        if klippyState == 'ready' and self._stage == OutputStage.Writing and self._bootingUpload:
+            # the printer booted during the upload => heat up while the rest is transferred
+            self._preheat()
+        if klippyState != 'ready' or not self._retryScheduler.isActive():
+            return
+        # don't wait for the next retry
+        if self._stage == OutputStage.Connecting:
+            self._retryScheduler.cancel()
+            self._getPrinterStatus()
+        elif self._stage == OutputStage.Writing and self._bootingUpload:
+            self._retryScheduler.cancel()
+            self._awaitPrinterReady()
+
+    def _onPowerDeviceChanged(self, powerDevice: str, status: str) -> None:
+        if self._stage == OutputStage.Connecting and status == 'on' and self._retryScheduler.isActive():
+            # the printer is booting now => restart the backoff and the deadline
+            Logger.log("d", "Power device [power {}] turned on.".format(powerDevice))
+            self._retryScheduler.reset()
+            self._getPrinterStatus()
+
+    def _onPrinterOnline(self, reply: QNetworkReply = None) -> None:
         # remove connection timeout message
-        self._message.hide()
-        self._message = None
+        self._metrics.stop("connect")
+        self._spinnerTimer.stop()
+        self._retryScheduler.reset()
+        if self._message:
+            self._message.hide()
+            self._message = None
 
         self._stage = OutputStage.Writing
+        if not self._bootingUpload:
+            self._configureRetries()
         # show a progress message
         self._message = Message(catalog.i18nc("@info:progress", "Uploading to {}...").format(self._name), 0, False, -1)
         self._message.setTitle("Moonraker - Upload")
@@ -363,32 +729,251 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
 
         if self._stage != OutputStage.Writing:
             return # never gets here now?
-        if reply.error() != NoError: # QNetworkReply.NetworkError.NoError // 0            
+        if reply and reply.error() != NoError: # QNetworkReply.NetworkError.NoError // 0            
             Logger.log("e", "Stopping due to reply error: {}.".format(reply.error()))
             self._onError(reply)
             return
 
+        if not self._bootingUpload:
+            # klippy is ready => heat up while the file is transferred
+            self._preheat()
+        if self._spoolJob:
+            # pipelined => the transfer starts as soon as the serialization is finished
+            Logger.log("d", "Printer is ready - waiting for the serialization.")
+            return
+        self._startTransfer()
+
+    def _preheat(self) -> None:
+        # the job queue of Moonraker decides when the job starts
+        if not self._preheatTargets or not self._startPrint or self._uploadJobQueue:
+            return
+        targets, self._preheatTargets = self._preheatTargets, None
+        # a running print job must not be touched => the state of the printer and its heaters is checked first
+        self._preheatPending = targets
+        self._getDetached(self._getHeaterQuery(targets), lambda reply: self._onPreheatStatus(reply, targets), lambda reply, error: Logger.log("w", "Printer could not be preheated: {}".format(error)))
+
+    def _getHeaterQuery(self, targets: dict) -> str:
+        return 'printer/objects/query?' + '&'.join(['print_stats'] + list(targets))
+
+    def _readHeaterStatus(self, reply: QNetworkReply) -> dict:
+        try:
+            return json.loads(str(reply.readAll(), 'utf-8'))['result']['status']
+        except (json.JSONDecodeError, KeyError, TypeError):
+            return None
+
+    def _onPreheatStatus(self, reply: QNetworkReply, targets: dict) -> None:
+        if self._preheatPending is not targets:
+            # upload finished or failed in the meantime
+            return
+        self._preheatPending = None
+        status = self._readHeaterStatus(reply)
+        printState = status.get('print_stats', {}).get('state') if status else None
+        if printState not in IDLE_PRINT_STATES:
+            Logger.log("i", "Printer is not preheated [print state: {}].".format(printState))
+            return
+        # heaters already at the target are left alone
+        changed = {heater: temperature for heater, temperature in targets.items() if status.get(heater, {}).get('target') != temperature}
+        if not changed:
+            return
+        script = createPreheatScript(changed)
+        Logger.log("i", "Preheating printer [{}].".format(script.replace("\n", "; ")))
+        self._preheated = changed
+        # independent of the upload - a failed preheat only delays the print job
+        self._sendScript(script, lambda reply, error: Logger.log("w", "Printer could not be preheated: {}".format(error)))
+
+    def _coolDown(self, preheated: dict) -> None:
+        # runs after the state was reset - only the heaters set by the preheat of the failed upload are turned off again
+        self._getDetached(self._getHeaterQuery(preheated), lambda reply: self._onCoolDownStatus(reply, preheated), lambda reply, error: Logger.log("w", "Heaters could not be checked: {}".format(error)))
+
+    def _onCoolDownStatus(self, reply: QNetworkReply, preheated: dict) -> None:
+        status = self._readHeaterStatus(reply)
+        if not status or status.get('print_stats', {}).get('state') not in IDLE_PRINT_STATES:
+            # a print job was started in the meantime
+            return
+        # heaters changed by someone else keep their target
+        heaters = {heater: 0 for heater, temperature in preheated.items() if status.get(heater, {}).get('target') == temperature}
+        if heaters:
+            Logger.log("i", "Turning off the preheated heaters [{}].".format(", ".join(heaters)))
+            self._sendScript(createPreheatScript(heaters), lambda reply, error: Logger.log("w", "Heaters could not be turned off: {}".format(error)))
+
+    def _sendScript(self, script: str, on_error) -> None:
+        self._postDetached('printer/gcode/script?' + urllib.parse.urlencode({'script': script}), {}, on_error)
+
+    def _getDetached(self, path: str, on_success, on_error) -> None:
+        # not tracked as self._request - runs beside the upload or after it failed
+        CuraApplication.getInstance().getHttpRequestManager().get(self._url + path, createHeaders(self._apiKey), callback = on_success, error_callback = on_error)
+
+    def _postDetached(self, path: str, data: dict, on_error) -> None:
+        # not tracked as self._request - runs beside the upload or after it failed
+        headers = createHeaders(self._apiKey)
+        headers['Content-Type'] = 'application/json'
+        CuraApplication.getInstance().getHttpRequestManager().post(self._url + path, headers, json.dumps(data).encode(),
+            callback = lambda reply: None, error_callback = on_error)
+
+    def _startTransfer(self) -> None:
+        if self._skipsIdentical():
+            self._checkIdenticalFile()
+        else:
+            self._uploadFile()
+
+    def _getUploadKey(self) -> str:
+        return '/'.join(filter(None, [self._pathName, self._fileName]))
+
+    def _needsChecksum(self) -> bool:
+        return self._uploadVerify or self._skipsIdentical()
+
+    def _skipsIdentical(self) -> bool:
+        # ufp packages are written with new timestamps every time - their checksum never matches
+        return self._uploadSkipIdentical and getOutputFormat(self._outputFormat) == "gcode"
+
+    def _computeChecksum(self, continuation) -> None:
+        # spool files written on the main thread (or queued by an older version) get their checksum on the job queue
+        self._metrics.start("encoding")
+        self._checksumContinuation = continuation
+        self._checksumJob = ChecksumJob(self._spoolPath)
+        self._checksumJob.finished.connect(self._onChecksumJobFinished)
+        self._checksumJob.start()
+
+    def _onChecksumJobFinished(self, job: ChecksumJob) -> None:
+        if job is not self._checksumJob or self._stage != OutputStage.Writing:
+            return
+        self._checksumJob = None
+        self._metrics.stop("encoding")
+        if not job.getResult():
+            self._onError(None, "Checksum of the upload could not be computed.")
+            return
+        self._checksum = job.getResult()
+        self._checksumContinuation()
+
+    def _checkIdenticalFile(self) -> None:
+        if not self._checksum:
+            self._computeChecksum(self._checkIdenticalFile)
+            return
+        uploadHash = getUploadHash(self._printerId, self._getUploadKey())
+        if uploadHash.get('checksum') != self._checksum:
+            self._uploadFile()
+            return
+        # same content was uploaded before - check that the file on the printer is still the uploaded one
+        directory, fileName = os.path.split(uploadHash.get('path', ''))
+        self._sendRequest('server/files/directory?' + urllib.parse.urlencode({'path': '/'.join(filter(None, ['gcodes', directory])), 'extended': 'false'}), on_success = lambda reply: self._checkRemoteFile(reply, uploadHash, fileName), on_error = lambda reply, error: self._uploadFile())
+
+    def _checkRemoteFile(self, reply: QNetworkReply, uploadHash: dict, fileName: str) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        response = self._getResponse(reply)
+        files = {item.get('filename'): item for item in response.get('result', {}).get('files', [])} if isinstance(response, dict) else {}
+        remoteFile = files.get(fileName)
+        if not remoteFile or remoteFile.get('size') != uploadHash.get('size') or remoteFile.get('modified') != uploadHash.get('modified'):
+            Logger.log("d", "File '{}' on printer differs from the last upload.".format(uploadHash.get('path')))
+            self._uploadFile()
+            return
+
+        Logger.log("i", "Identical file '{}' already exists on printer - skipping upload.".format(uploadHash.get('path')))
+        self._uploadSkipped = True
+        self._uploadSize = self._transferSize = os.path.getsize(self._spoolPath)
+        self._uploadedPath = uploadHash.get('path')
+        if self._startPrint:
+            self._startPrintJob()
+        else:
+            self._onUploadCompleted()
+
+    def _uploadFile(self) -> None:
+        if self._postData:
+            self._postData.close()
+        self._uploadSize = os.path.getsize(self._spoolPath)
+        self._transferSize = self._uploadSize
+        self._metrics.start("encoding")
+        if self._uploadVerify:
+            # the print job is started after the verification of the uploaded file
+            if not self._checksum:
+                self._computeChecksum(self._uploadFile)
+                return
+            fields = createUploadFields(self._pathName, False, self._checksum)
+        else:
+            # a booting printer can't start the print job with the upload, the job queue starts it on its own
+            fields = createUploadFields(self._pathName, self._startPrint and not self._bootingUpload and not self._uploadJobQueue)
+
+        if self._uploadCompression and self._compressionSupported is not False:
+            if self._compressedPath and self._compressedBody and self._compressedBody[3] == fields:
+                # sent again => the body is already compressed
+                self._sendCompressedBody()
+                return
+            if self._compressJob:
+                return
+            removeSpoolFile(self._compressedPath)
+            self._compressedPath = None
+            self._compressJob = CompressedBodyJob(self._spoolPath, self._fileName, fields)
+            self._compressJob.finished.connect(self._onCompressJobFinished)
+            self._compressJob.start()
+            return
+
         Logger.log("i", "Uploading file '{}' [path: {}; format: {}].".format(self._fileName, self._pathName, self._outputFormat))
-        self._stream.seek(0)
-        self._postData = QByteArray()
-        if isinstance(self._stream, BytesIO):
-            self._postData.append(self._stream.getvalue())
+        self._metrics.stop("encoding")
+        self._metrics.setSizes(self._uploadSize, self._transferSize)
+        self._postData = openBodyDevice(self._spoolPath)
+        if not self._postData:
+            self._onError(None, "Upload file could not be opened.")
+            return
+        self._metrics.start("transfer")
+        self._sendRequest('server/files/upload', fileName = self._fileName, fields = fields, data = self._postData, on_success = self._onFileUploaded, on_error = self._onUploadError, retry = True)
+
+    def _onCompressJobFinished(self, job: CompressedBodyJob) -> None:
+        result = job.getResult()
+        if job is not self._compressJob or self._stage != OutputStage.Writing:
+            # upload was cancelled or failed in the meantime
+            if result:
+                removeSpoolFile(result[0])
+            return
+        self._compressJob = None
+        if not result:
+            self._onError(None, "Upload could not be compressed.")
+            return
+        self._compressedPath, boundary, uploadSize, transferSize = result
+        self._compressedBody = (boundary, uploadSize, transferSize, job.fields)
+        Logger.log("d", "Upload compressed from {} to {}.".format(uploadSize, transferSize))
+        self._sendCompressedBody()
+
+    def _sendCompressedBody(self) -> None:
+        boundary, self._uploadSize, self._transferSize, fields = self._compressedBody
+        Logger.log("i", "Uploading file '{}' gzip-compressed [path: {}; format: {}].".format(self._fileName, self._pathName, self._outputFormat))
+        self._metrics.stop("encoding")
+        self._metrics.setSizes(self._uploadSize, self._transferSize)
+        self._postData = openBodyDevice(self._compressedPath)
+        if not self._postData:
+            self._onError(None, "Upload file could not be opened.")
+            return
+        self._metrics.start("transfer")
+        self._sendRequest('server/files/upload', data = self._postData, contentType = 'multipart/form-data; boundary="' + boundary + '"', contentEncoding = 'gzip', on_success = self._onFileUploaded, on_error = self._onUploadError, retry = True)
+
+    def _onUploadError(self, reply: QNetworkReply, error) -> None:
+        statusCode = reply.attribute(HttpStatusCodeAttribute) if reply else None
+        if statusCode in (400, 415) and self._transferSize != self._uploadSize:
+            # the request body was not decoded by the server => fall back to plain uploads for this instance
+            Logger.log("w", "Moonraker at {} does not accept compressed uploads [status: {}] - falling back to plain upload.".format(self._url, statusCode))
+            self._compressionSupported = False
+            self._uploadFile()
+        elif statusCode == 422 and self._checksum:
+            # checksum mismatch => the file was damaged on its way, send it again from the spool file
+            self._resendUpload("Checksum of the uploaded file does not match.", reply, error)
         else:
-            self._postData.append(self._stream.getvalue().encode())
-        self._sendRequest('server/files/upload', pathName = self._pathName, fileName = self._fileName, data = self._postData, on_success = self._onFileUploaded)    
+            self._onError(reply, error)
+
+    def _resendUpload(self, reason: str, reply: QNetworkReply = None, error = None) -> None:
+        Logger.log("w", "{} Uploading '{}' again.".format(reason, self._fileName))
+        # the compressed body and the checksum are reused - only the transfer is repeated
+        if self._transmissions >= MAX_UPLOAD_TRANSMISSIONS or not self._retryScheduler.schedule(self._uploadFile):
+            self._onError(reply, error if error else reason)
     
     def _onPrinterError(self, reply: QNetworkReply = None, error = None) -> None:
-        self._errorCounter += 1        
-        if self._errorCounter > 20:
+        if self._stage != OutputStage.Connecting:
+            return
+        if not self._retryScheduler.schedule(self._getPrinterStatus):
             self._onError(reply, error)
-        else:
-            try:
-                sleep(float(self._retryInterval))
-            except ValueError:
-                sleep(0.5)
-            if (self._message):
-                self._message.setText(self._getConnectMessage())
-            self._getPrinterStatus()
+
+    def _onSpinnerTimer(self) -> None:
+        self._spinnerCounter += 1
+        if self._message:
+            self._message.setText(self._getConnectMessage())
 
     def _onFileUploaded(self, reply: QNetworkReply) -> None:
         if self._stage != OutputStage.Writing:
@@ -399,28 +984,179 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
             return
 
         Logger.log("i", "Upload completed.")
-        self._stream.close()
-        self._stream = None
+        self._metrics.stop("transfer")
+        self._metrics.stop("response")
+        if self._transferSize != self._uploadSize:
+            self._compressionSupported = True
+
+        response = self._getResponse(reply)
+        item = response.get('item', {}) if isinstance(response, dict) else {}
+        self._uploadedPath = item.get('path', self._getUploadKey())
+        if self._skipsIdentical():
+            # remember the upload to detect identical files next time
+            saveUploadHash(self._printerId, self._getUploadKey(), {'checksum': self._checksum, 'path': self._uploadedPath, 'size': item.get('size'), 'modified': item.get('modified')})
+        if self._uploadVerify:
+            self._verifyUpload()
+        elif self._startPrint and (self._bootingUpload or self._uploadJobQueue):
+            self._startPrintJob()
+        else:
+            self._onUploadCompleted()
+
+    def _startPrintJob(self) -> None:
+        if self._uploadJobQueue:
+            # Moonraker starts the job once the printer is ready and the previous jobs are done
+            self._addToJobQueue()
+            return
+        if self._bootingUpload:
+            # uploaded while the printer was booting => wait for klippy first
+            self._retryScheduler.reset()
+            self._configureRetries(POWER_ON_TIMEOUT)
+            if self._message:
+                self._message.setText(catalog.i18nc("@info:progress", "Waiting for {} to start the print job...").format(self._name))
+            self._awaitPrinterReady()
+            return
+        self._sendRequest('printer/print/start?' + urllib.parse.urlencode({'filename': self._uploadedPath}), data = '{}'.encode(), dataIsJSON = True, on_success = self._onUploadCompleted)
+
+    def _addToJobQueue(self) -> None:
+        self._jobBatch.append(self._uploadedPath)
+        if self._holdsJobBatch():
+            # the queued uploads are added with one request after the last of them
+            Logger.log("i", "'{}' is added to the job queue with the next queued upload.".format(self._uploadedPath))
+            self._onUploadCompleted()
+            return
+        filenames, self._jobBatch = self._jobBatch, []
+        Logger.log("i", "Adding {} to the job queue.".format(", ".join(filenames)))
+        self._sendRequest('server/job_queue/job', data = json.dumps({'filenames': filenames}).encode(), dataIsJSON = True, on_success = self._onJobQueued, retry = True)
 
+    def _holdsJobBatch(self) -> bool:
+        # another queued upload is going to the job queue as well
+        return not self._uploadQueue.isPaused() and any(job["start_print"] for job in self._uploadQueue.jobs if job["id"] != self._queuedJobId)
+
+    def _flushJobBatch(self) -> None:
+        filenames, self._jobBatch = self._jobBatch, []
+        Logger.log("i", "Adding {} to the job queue.".format(", ".join(filenames)))
+        # not tracked as self._request - the uploads of the files are already completed
+        self._postDetached('server/job_queue/job', {'filenames': filenames}, lambda reply, error: Logger.log("w", "Files {} could not be added to the job queue: {}".format(", ".join(filenames), error)))
+
+    def _onJobQueued(self, reply: QNetworkReply) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        response = self._getResponse(reply)
+        result = response.get('result', {}) if isinstance(response, dict) else {}
+        self._queueDepth = (len(result.get('queued_jobs', [])), result.get('queue_state', 'unknown'))
+        self._onUploadCompleted()
+
+    def _awaitPrinterReady(self) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        if self._isPrinterReady():
+            Logger.log("i", "Printer is ready - starting print job '{}'.".format(self._uploadedPath))
+            self._bootingUpload = False
+            self._startPrintJob()
+            return
+        self._sendRequest('server/info', on_success = self._checkPrinterReady, on_error = self._onPrinterNotReady)
+
+    def _checkPrinterReady(self, reply: QNetworkReply) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        response = self._getResponse(reply)
+        status = response.get('result', {}).get('klippy_state') if isinstance(response, dict) else None
+        if status:
+            self._session.updateKlippyState(status)
+        if self._isPrinterReady():
+            self._awaitPrinterReady()
+        else:
+            self._onPrinterNotReady(reply, "The status of the printer is '{}'.".format(status))
+
+    def _onPrinterNotReady(self, reply: QNetworkReply = None, error = None) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        if not self._retryScheduler.schedule(self._awaitPrinterReady):
+            self._onError(reply, error)
+
+    def _verifyUpload(self) -> None:
+        # the checksum was verified by Moonraker during the upload - double check the size of the stored file
+        directory, fileName = os.path.split(self._uploadedPath)
+        Logger.log("d", "Verifying uploaded file '{}'.".format(self._uploadedPath))
+        self._sendRequest('server/files/directory?' + urllib.parse.urlencode({'path': '/'.join(filter(None, ['gcodes', directory])), 'extended': 'false'}), on_success = lambda reply: self._checkUploadedFile(reply, fileName), retry = True)
+
+    def _checkUploadedFile(self, reply: QNetworkReply, fileName: str) -> None:
+        if self._stage != OutputStage.Writing:
+            return
+        response = self._getResponse(reply)
+        files = {item.get('filename'): item.get('size') for item in response.get('result', {}).get('files', [])} if isinstance(response, dict) else {}
+        if fileName not in files:
+            self._resendUpload("Uploaded file '{}' not found.".format(self._uploadedPath))
+        elif self._outputFormat == "gcode" and files[fileName] != self._uploadSize:
+            # ufp packages are converted by Moonraker, so only the size of gcode can be compared
+            self._resendUpload("Size of the uploaded file is {} instead of {}.".format(files[fileName], self._uploadSize))
+        elif self._startPrint:
+            Logger.log("i", "Upload verified - starting print job '{}'.".format(self._uploadedPath))
+            self._startPrintJob()
+        else:
+            Logger.log("i", "Upload verified.")
+            self._onUploadCompleted()
+
+    def _onUploadCompleted(self, reply: QNetworkReply = None) -> None:
+        if self._stage != OutputStage.Writing:
+            return
         if self._message:
             self._message.hide()
             self._message = None
-        messageText = "Upload of '{}' to {} successfully completed" + (" and print job initialized." if self._startPrint else ".")
+        if self._startPrint and self._uploadJobQueue:
+            # Moonraker starts the print job once the jobs ahead of it are done
+            messageResult = " - added to the job queue with the next queued upload." if self._jobBatch else " and added to the job queue."
+        else:
+            messageResult = " and print job initialized." if self._startPrint else "."
+        if self._uploadSkipped:
+            messageText = "Identical file '{}' already exists on {} - upload skipped" + messageResult
+            messageText += "\n\n{} saved.".format(formatSize(self._uploadSize))
+        else:
+            messageText = "Upload of '{}' to {} successfully completed" + messageResult
+        if self._queueDepth:
+            messageText += "\n\n{} job(s) in the queue [state: {}].".format(*self._queueDepth)
+        if self._gcodeFilter and self._gcodeFilter.filteredSize is not None:
+            messageText += "\n\nG-code reduced by {:.1%} - {} instead of {}.".format(self._gcodeFilter.getReduction(), formatSize(self._gcodeFilter.filteredSize), formatSize(self._gcodeFilter.originalSize))
+        if self._transferSize != self._uploadSize and self._transferSize:
+            messageText += "\n\nCompression ratio {:.1f}:1 - {} of {} transferred.".format(self._uploadSize / self._transferSize, formatSize(self._transferSize), formatSize(self._uploadSize))
         self._message = Message(catalog.i18nc("@info:status", messageText.format(os.path.basename(self._fileName), self._name)), 30 if self._uploadAutohideMessagebox else 0, True)
         self._message.setTitle("Moonraker")
         self._message.addAction("open_browser", catalog.i18nc("@action:button", "Open Browser"), "globe", catalog.i18nc("@info:tooltip", "Open browser to Moonraker."))
         self._message.actionTriggered.connect(self._onMessageActionTriggered)
         self._message.show()
 
+        self._metrics.finish(True, self._metricsDump)
+        self._metrics = None
+        if self._queuedJobId:
+            # the job and its spool file leave the queue only now
+            self._uploadQueue.remove(self._queuedJobId)
+            self._queuedJobId = None
+            self._spoolPath = None
         self.writeSuccess.emit(self)
         self._resetState()
 
     def _onMessageActionTriggered(self, message: Message, action: str) -> None:
-        if action == "open_browser":
+        if action == "show_queue":
+            self._showQueue()
+        elif action == "resume_queue":
+            message.hide()
+            self._uploadQueue.resume()
+        elif action == "open_browser":
             QDesktopServices.openUrl(QUrl(self._frontendUrl if self._frontendUrl else self._url))
             if self._message:
                 self._message.hide()
                 self._message = None
+        elif action == "cancel" and self._stage == OutputStage.Connecting:
+            Logger.log("i", "Connecting to Moonraker at {} cancelled.".format(self._url))
+            message.hide()
+            if self._message == message:
+                self._message = None
+            if self._request:
+                CuraApplication.getInstance().getHttpRequestManager().abortRequest(self._request)
+            if not self._uploadQueue.isEmpty():
+                self._uploadQueue.pause()
+            self.writeError.emit(self)
+            self._resetState()
 
     def _getResponse(self, reply: QNetworkReply):
         byte_string = reply.readAll()
@@ -434,74 +1170,91 @@ class MoonrakerOutputDevice(PrinterOutputDevice):
 
         return response
 
-    def _sendRequest(self, path: str, pathName: str = None, fileName: str = None, data: QByteArray = None, dataIsJSON: bool = False, on_success = None, on_error = None) -> None:
+    def _sendRequest(self, path: str, pathName: str = None, fileName: str = None, data = None, dataIsJSON: bool = False, contentType: str = None, contentEncoding: str = None, on_success = None, on_error = None, retry: bool = False, fields: dict = None) -> None:
         url = self._url + path
-
-        headers = {'User-Agent': 'Cura Plugin Moonraker', 'Accept': 'application/json, text/plain', 'Connection': 'keep-alive'}
-        if self._apiKey:
-            headers['X-API-Key'] = self._apiKey
+        errorCallback = on_error if on_error else self._onError
+        if retry:
+            # network errors and server errors are retried by the scheduler before errorCallback is called
+            resend = lambda: self._sendRequest(path, pathName, fileName, data, dataIsJSON, contentType, contentEncoding, on_success, on_error, retry, fields)
+            errorCallback = lambda reply, error: self._onRequestError(reply, error, resend, on_error if on_error else self._onError, isinstance(data, QIODevice))
+        if isinstance(data, QIODevice):
+            # the file is sent from its start - counted against MAX_UPLOAD_TRANSMISSIONS
+            data.seek(0)
+            self._transmissions += 1
+
+        headers = createHeaders(self._apiKey)
 
         postData = data
         requestManager = CuraApplication.getInstance().getHttpRequestManager()
         if data is not None:
-            if not dataIsJSON:
-                # Create multi_part request           
-                parts = QHttpMultiPart(FormDataType)
-
-                part_file = QHttpPart()
-                part_file.setHeader(ContentDispositionHeader, QVariant('form-data; name="file"; filename="' + fileName + '"'))
-                part_file.setHeader(ContentTypeHeader, QVariant('application/octet-stream'))
-                part_file.setBody(data)
-                parts.append(part_file)
-
-                part_root = QHttpPart()
-                part_root.setHeader(ContentDispositionHeader, QVariant('form-data; name="root"'))
-                part_root.setBody(b"gcodes")
-                parts.append(part_root)
-
-                if pathName:
-                    part_path = QHttpPart()
-                    part_path.setHeader(ContentDispositionHeader, QVariant('form-data; name="path"'))
-                    part_path.setBody(pathName.encode("UTF-8"))
-                    parts.append(part_path)
-
-                if self._startPrint:
-                    part_print = QHttpPart()
-                    part_print.setHeader(ContentDispositionHeader, QVariant('form-data; name="print"'))
-                    part_print.setBody(b"true")
-                    parts.append(part_print)
-
-                headers['Content-Type'] = 'multipart/form-data; boundary="'+ str(parts.boundary().data(), encoding = 'utf-8') + '"'
-
-                postData = parts
+            if contentType:
+                # postData is a prepared body (e.g. a compressed multipart request)
+                headers['Content-Type'] = contentType
+                if contentEncoding:
+                    headers['Content-Encoding'] = contentEncoding
+            elif not dataIsJSON:
+                # Create multi_part request
+                postData, headers['Content-Type'] = createMultiPart(data, fileName, fields if fields is not None else createUploadFields(pathName, self._startPrint))
             else:
                 # postData is JSON
                 headers['Content-Type'] = 'application/json'
 
-            requestManager.post(url, headers, postData, callback = on_success, error_callback = on_error if on_error else self._onError, upload_progress_callback = self._onUploadProgress if not dataIsJSON else None)
+            self._request = requestManager.post(url, headers, postData, callback = on_success, error_callback = errorCallback, upload_progress_callback = self._onUploadProgress if not dataIsJSON else None)
         else:
-            requestManager.get(url, headers, callback = on_success, error_callback = on_error if on_error else self._onError)
+            self._request = requestManager.get(url, headers, callback = on_success, error_callback = errorCallback)
+
+    def _onRequestError(self, reply: QNetworkReply, error, resend, on_error, upload: bool = False) -> None:
+        if self._stage == OutputStage.Ready:
+            return
+        statusCode = reply.attribute(HttpStatusCodeAttribute) if reply else None
+        if upload and self._transmissions >= MAX_UPLOAD_TRANSMISSIONS:
+            Logger.log("w", "Upload to Moonraker at {} failed {} times [status: {}] - giving up.".format(self._url, self._transmissions, statusCode))
+        elif (statusCode is None or statusCode >= 500) and self._retryScheduler.schedule(resend):
+            Logger.log("w", "Request to Moonraker at {} failed [status: {}] - retrying.".format(self._url, statusCode))
+            return
+        on_error(reply, error)
 
     def _onUploadProgress(self, bytesSent, bytesTotal) -> None:
+        if self._metrics:
+            self._metrics.onUploadProgress(bytesSent, bytesTotal)
         if bytesTotal > 0:
             progress = int(bytesSent * 100 / bytesTotal)
             if self._message:
                 self._message.setProgress(progress)
             self.writeProgress.emit(self, progress)
 
-    def _onError(self, reply: QNetworkReply, error) -> None:
+    def _onError(self, reply: QNetworkReply, error = None) -> None:
+        if self._stage == OutputStage.Ready:
+            # upload was cancelled or already finished
+            return
         Logger.log("e", repr(error))
         if self._message:
             self._message.hide()
             self._message = None
 
+        if self._preheated:
+            # no print job will use the heat
+            self._coolDown(self._preheated)
         messageText = "Uploading to Moonraker at {} was not successful.\n\n{} {}".format(self._url, error, ("- " + reply.errorString()) if reply else "")
         message = Message(catalog.i18nc("@info:status", messageText.strip()), 0, False)
         message.setTitle("Moonraker - Error")
+        if not self._uploadQueue.isEmpty():
+            # don't run the remaining jobs into the same error
+            self._uploadQueue.pause()
+            message.addAction("resume_queue", catalog.i18nc("@action:button", "Resume Queue"), "", catalog.i18nc("@info:tooltip", "Continue with the queued uploads."))
+            message.actionTriggered.connect(self._onMessageActionTriggered)
         message.show()
 
         self.writeError.emit(self)
         self._resetState()
     
+    def _configureRetries(self, deadline: float = None) -> None:
+        retryInterval = self._config.retryInterval
+        if deadline:
+            # waiting for a booting printer => only the deadline counts, the attempts would end it early
+            self._retryScheduler.configure(interval = retryInterval, maxInterval = max(5.0, 4 * retryInterval), maxAttempts = None, deadline = deadline)
+        else:
+            self._retryScheduler.configure(interval = retryInterval, maxInterval = max(5.0, 4 * retryInterval), deadline = max(60.0, 40 * retryInterval))
+
     def _getConnectMessage(self):
-        return "Connecting to Moonraker at {}     {}".format(self._url, spinner[self._errorCounter % len(spinner)])
+        return "Connecting to Moonraker at {}     {}".format(self._url, spinner[self._spinnerCounter % len(spinner)])
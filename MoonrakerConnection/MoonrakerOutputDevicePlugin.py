@@ -1,25 +1,32 @@
+import time
+
 from cura.CuraApplication import CuraApplication
 
 from UM.Logger import Logger
 from UM.OutputDevice.OutputDevicePlugin import OutputDevicePlugin
 
-from .MoonrakerOutputDevice import MoonrakerOutputDevice
-from .MoonrakerSettings import initConfig, getConfig, validateUrl
+from .MoonrakerSettings import initConfig, getConfig, getAllConfigs, validateUrl
 
 class MoonrakerOutputDevicePlugin(OutputDevicePlugin):
     def __init__(self) -> None:
+        started = time.perf_counter()
         super().__init__()
         Logger.log("d", "Initialising plugin.")
         initConfig()
         self._moonrakerOutputDevices = {}
         self._currentMoonrakerOutputDevice = None
+        self._groupOutputDevice = None
+        self._balancedOutputDevice = None
         CuraApplication.getInstance().globalContainerStackChanged.connect(self._checkMoonrakerOutputDevice)
+        Logger.log("d", "MoonrakerOutputDevicePlugin constructed in {:.1f} ms.".format((time.perf_counter() - started) * 1000))
 
     def start(self) -> None:
         Logger.log("d", "Starting plugin.")
 
     def stop(self) -> None:
         Logger.log("d", "Stopping plugin.")
+        if self._currentMoonrakerOutputDevice:
+            self._currentMoonrakerOutputDevice.close()
 
     def _checkMoonrakerOutputDevice(self) -> None:
         Logger.log("d", "Check current MoonrakerOutputDevice.")
@@ -35,6 +42,7 @@ class MoonrakerOutputDevicePlugin(OutputDevicePlugin):
         # remove inactive device
         if self._currentMoonrakerOutputDevice and (self._currentMoonrakerOutputDevice.getId() != "MoonrakerOutputDevice@" + deviceId or canConnect != self._currentMoonrakerOutputDevice._canConnect):
             self.getOutputDeviceManager().removeOutputDevice(self._currentMoonrakerOutputDevice.getId())
+            self._currentMoonrakerOutputDevice.close()
             self._currentMoonrakerOutputDevice = None
 
         # add active device
@@ -46,10 +54,57 @@ class MoonrakerOutputDevicePlugin(OutputDevicePlugin):
                     self._moonrakerOutputDevices.pop(deviceId)
             if config:
                 if not self._currentMoonrakerOutputDevice:
-                    self._currentMoonrakerOutputDevice = MoonrakerOutputDevice(deviceId, canConnect)
+                    self._currentMoonrakerOutputDevice = self._createMoonrakerOutputDevice(deviceId, canConnect)
                     self._moonrakerOutputDevices[deviceId] = self._currentMoonrakerOutputDevice
                 self.getOutputDeviceManager().addOutputDevice(self._currentMoonrakerOutputDevice)
 
         # update config of device
         if self._currentMoonrakerOutputDevice:
             self._currentMoonrakerOutputDevice.updateConfig(config)
+            self._currentMoonrakerOutputDevice.connect()
+
+        self._checkMoonrakerGroupOutputDevice()
+
+    def _createMoonrakerOutputDevice(self, deviceId: str, canConnect: bool):
+        # the device (websocket, camera, upload pipeline) is only imported once a printer is configured
+        started = time.perf_counter()
+        from .MoonrakerOutputDevice import MoonrakerOutputDevice
+        moonrakerOutputDevice = MoonrakerOutputDevice(deviceId, canConnect)
+        Logger.log("d", "MoonrakerOutputDevice for printer '{}' constructed in {:.1f} ms.".format(deviceId, (time.perf_counter() - started) * 1000))
+        return moonrakerOutputDevice
+
+    def _checkMoonrakerGroupOutputDevice(self) -> None:
+        globalContainerStack = CuraApplication.getInstance().getGlobalContainerStack()
+        containerRegistry = CuraApplication.getInstance().getContainerRegistry()
+        # connected printers sharing the machine definition of the active printer form a group
+        definitionId = globalContainerStack.definition.getId()
+        targets = {}
+        for printerId, config in getAllConfigs().items():
+            if not validateUrl(config.get("url", "")):
+                continue
+            stacks = containerRegistry.findContainerStacks(id = printerId)
+            if stacks and stacks[0].definition.getId() == definitionId:
+                targets[printerId] = (stacks[0].getName(), config)
+
+        # remove group of another definition
+        if self._groupOutputDevice and (self._groupOutputDevice.getId() != "MoonrakerGroupOutputDevice@" + definitionId or len(targets) < 2):
+            self.getOutputDeviceManager().removeOutputDevice(self._groupOutputDevice.getId())
+            self._groupOutputDevice = None
+        if self._balancedOutputDevice and (self._balancedOutputDevice.getId() != "MoonrakerBalancedOutputDevice@" + definitionId or len(targets) < 2):
+            self.getOutputDeviceManager().removeOutputDevice(self._balancedOutputDevice.getId())
+            self._balancedOutputDevice.close()
+            self._balancedOutputDevice = None
+
+        # add group with at least two printers
+        if len(targets) >= 2:
+            if not self._groupOutputDevice:
+                from .MoonrakerGroupOutputDevice import MoonrakerGroupOutputDevice
+                self._groupOutputDevice = MoonrakerGroupOutputDevice(definitionId, globalContainerStack.definition.getName())
+                self.getOutputDeviceManager().addOutputDevice(self._groupOutputDevice)
+            self._groupOutputDevice.updateTargets(targets)
+            # the same printers as target of a single upload - the best one is chosen
+            if not self._balancedOutputDevice:
+                from .MoonrakerBalancedOutputDevice import MoonrakerBalancedOutputDevice
+                self._balancedOutputDevice = MoonrakerBalancedOutputDevice(definitionId, globalContainerStack.definition.getName())
+                self.getOutputDeviceManager().addOutputDevice(self._balancedOutputDevice)
+            self._balancedOutputDevice.updateTargets(targets)
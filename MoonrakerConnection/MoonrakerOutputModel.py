@@ -1,18 +1,22 @@
+from uuid import uuid4
+
 USE_QT5 = False
 try:
     from cura.ApplicationMetadata import CuraSDKVersion
 except ImportError: # Cura <= 3.6   
     CuraSDKVersion = "6.0.0"
 if CuraSDKVersion >= "8.0.0":
-    from PyQt6.QtCore import pyqtProperty, pyqtSignal
+    from PyQt6.QtCore import QObject, QUrl, pyqtProperty, pyqtSignal
 else:
-    from PyQt5.QtCore import pyqtProperty, pyqtSignal
+    from PyQt5.QtCore import QObject, QUrl, pyqtProperty, pyqtSignal
     USE_QT5 = True
     
 from cura.PrinterOutput.Models.PrinterOutputModel import PrinterOutputModel
 
 from UM.Logger import Logger
 
+from .MoonrakerCameraStream import MoonrakerCameraStream
+from .MoonrakerDashboard import MoonrakerDashboard, getDashboard
 from .MoonrakerOutputController import MoonrakerOutputController
 
 class MoonrakerOutputModel(PrinterOutputModel):
@@ -24,11 +28,26 @@ class MoonrakerOutputModel(PrinterOutputModel):
         super().__init__(output_controller, number_of_extruders)
         self._camera_image_rotation = "0"
         self._camera_image_mirror = False
+        self._camera_stream = MoonrakerCameraStream(uuid4().hex, self)
         Logger.log("d", "MoonrakerOutputModel [number_of_extruders: {}] created.".format(number_of_extruders))
 
+    def setCameraUrl(self, camera_url: QUrl) -> None:
+        super().setCameraUrl(camera_url)
+        self._camera_stream.setUrl(camera_url.toString())
+
+    @pyqtProperty(QObject, constant = True)
+    def cameraStream(self) -> MoonrakerCameraStream:
+        return self._camera_stream
+
+    @pyqtProperty(QObject, constant = True)
+    def dashboard(self) -> MoonrakerDashboard:
+        # state of all configured printers - shared by the models of all printers
+        return getDashboard()
+
     def setCameraImageRotation(self, camera_image_rotation: str) -> None:
         if self._camera_image_rotation != camera_image_rotation:
             self._camera_image_rotation = camera_image_rotation
+            self._camera_stream.setRotation(camera_image_rotation)
             self.cameraImageRotationChanged.emit()
 
     @pyqtProperty(str, fset = setCameraImageRotation, notify = cameraImageRotationChanged)
@@ -38,6 +57,7 @@ class MoonrakerOutputModel(PrinterOutputModel):
     def setCameraImageMirror(self, camera_image_mirror: bool) -> None:
         if self._camera_image_mirror != camera_image_mirror:
             self._camera_image_mirror = camera_image_mirror
+            self._camera_stream.setMirror(camera_image_mirror)
             self.cameraImageMirrorChanged.emit()
 
     @pyqtProperty(bool, fset = setCameraImageMirror, notify = cameraImageMirrorChanged)
@@ -0,0 +1,75 @@
+import random
+from time import monotonic
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QTimer
+else:
+    from PyQt5.QtCore import QTimer
+    USE_QT5 = True
+
+from UM.Logger import Logger
+
+# Schedules retries through the Qt event loop instead of blocking it: the delay grows exponentially
+# from interval up to maxInterval and is randomized by jitter. Retrying stops when maxAttempts (None => no
+# limit) or the total deadline (seconds since the first retry) is exceeded.
+class MoonrakerRetryScheduler:
+    def __init__(self, interval: float = 0.5, factor: float = 1.5, maxInterval: float = 5.0, jitter: float = 0.2, maxAttempts: int = 20, deadline: float = 60.0) -> None:
+        self._timer = QTimer()
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._onTimeout)
+        self._callback = None
+        self.configure(interval, factor, maxInterval, jitter, maxAttempts, deadline)
+        self.reset()
+
+    def configure(self, interval: float = 0.5, factor: float = 1.5, maxInterval: float = 5.0, jitter: float = 0.2, maxAttempts: int = 20, deadline: float = 60.0) -> None:
+        self._interval = interval
+        self._factor = factor
+        self._maxInterval = max(interval, maxInterval)
+        self._jitter = jitter
+        self._maxAttempts = maxAttempts
+        self._deadline = deadline
+
+    def reset(self) -> None:
+        self.cancel()
+        self._attempts = 0
+        self._startTime = None
+
+    def cancel(self) -> None:
+        self._timer.stop()
+        self._callback = None
+
+    def isActive(self) -> bool:
+        return self._timer.isActive()
+
+    def getAttempts(self) -> int:
+        return self._attempts
+
+    def schedule(self, callback) -> bool:
+        # returns False if no further retry is allowed - the caller has to handle the error then
+        now = monotonic()
+        if self._startTime is None:
+            self._startTime = now
+        if self._maxAttempts is not None and self._attempts >= self._maxAttempts or now - self._startTime >= self._deadline:
+            Logger.log("d", "Retry limit reached [attempts: {}; elapsed: {:.1f}s].".format(self._attempts, now - self._startTime))
+            return False
+
+        delay = min(self._interval * self._factor ** self._attempts, self._maxInterval)
+        delay *= 1 + random.uniform(-self._jitter, self._jitter)
+        # never wait beyond the deadline
+        delay = max(0, min(delay, self._deadline - (now - self._startTime)))
+        self._attempts += 1
+        self._callback = callback
+        Logger.log("d", "Retry #{} scheduled in {:.2f}s.".format(self._attempts, delay))
+        self._timer.start(int(delay * 1000))
+        return True
+
+    def _onTimeout(self) -> None:
+        callback = self._callback
+        self._callback = None
+        if callback:
+            callback()
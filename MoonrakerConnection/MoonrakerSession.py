@@ -0,0 +1,119 @@
+import json
+from time import monotonic
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, QTimer
+    from PyQt6.QtNetwork import QNetworkReply
+else:
+    from PyQt5.QtCore import QObject, QTimer
+    from PyQt5.QtNetwork import QNetworkReply
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+
+from UM.Logger import Logger
+
+from .MoonrakerUpload import createHeaders
+from .MoonrakerWebSocket import MoonrakerWebSocket
+
+# seconds a cached klippy or power state is trusted
+SESSION_STATE_TTL = 15.0
+# seconds between two pings while the device is idle - below the ttl, so an idle printer always has a fresh state
+KEEPALIVE_INTERVAL = 10.0
+
+class MoonrakerSession(QObject):
+    # Keeps the HTTP connection to Moonraker warm and caches the readiness of the printer. States pushed by the
+    # websocket are always fresh, states of HTTP responses expire after SESSION_STATE_TTL.
+    def __init__(self, webSocket: MoonrakerWebSocket, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._webSocket = webSocket
+        self._url = None
+        self._apiKey = None
+        self._powerDevices = []
+        self._idle = True
+        self._klippyState = (None, 0.0)
+        self._powerStates = {}
+        self._keepAliveTimer = QTimer()
+        self._keepAliveTimer.setInterval(int(KEEPALIVE_INTERVAL * 1000))
+        self._keepAliveTimer.timeout.connect(self._ping)
+        self._webSocket.klippyStateChanged.connect(self.updateKlippyState)
+        self._webSocket.powerDeviceChanged.connect(self.updatePowerState)
+
+    def open(self, url: str, apiKey: str = None, powerDevices: list = None) -> None:
+        if self._url == url and self._apiKey == apiKey and self._powerDevices == (powerDevices or []):
+            return
+        self.close()
+        self._url = url
+        self._apiKey = apiKey
+        self._powerDevices = powerDevices or []
+        self.setIdle(self._idle)
+        self._ping()
+
+    def close(self) -> None:
+        self._url = None
+        self._keepAliveTimer.stop()
+        self.invalidate()
+
+    def setIdle(self, idle: bool) -> None:
+        # no pings during uploads - the upload keeps the connection busy anyway
+        self._idle = idle
+        if idle and self._url:
+            self._keepAliveTimer.start()
+        else:
+            self._keepAliveTimer.stop()
+
+    def invalidate(self) -> None:
+        self._klippyState = (None, 0.0)
+        self._powerStates = {}
+
+    def updateKlippyState(self, klippyState: str) -> None:
+        self._klippyState = (klippyState, monotonic())
+
+    def updatePowerState(self, powerDevice: str, status: str) -> None:
+        self._powerStates[powerDevice] = (status, monotonic())
+
+    def getKlippyState(self) -> str:
+        # None if the state is unknown or expired
+        if self._webSocket.isConnected() and self._webSocket.getKlippyState():
+            return self._webSocket.getKlippyState()
+        klippyState, timestamp = self._klippyState
+        return klippyState if monotonic() - timestamp < SESSION_STATE_TTL else None
+
+    def getPowerState(self, powerDevice: str) -> str:
+        status, timestamp = self._powerStates.get(powerDevice, (None, 0.0))
+        return status if monotonic() - timestamp < SESSION_STATE_TTL else None
+
+    def _ping(self) -> None:
+        if not self._url or not self._idle:
+            return
+        requestManager = CuraApplication.getInstance().getHttpRequestManager()
+        headers = createHeaders(self._apiKey)
+        requestManager.get(self._url + 'server/info', headers, callback = self._onServerInfo, error_callback = self._onPingError)
+        if self._powerDevices:
+            # one request for the state of all power devices
+            requestManager.get(self._url + 'machine/device_power/devices', headers, callback = self._onPowerDevices, error_callback = self._onPingError)
+
+    def _readResult(self, reply: QNetworkReply) -> dict:
+        try:
+            return json.loads(str(reply.readAll(), 'utf-8')).get('result', {})
+        except (json.JSONDecodeError, AttributeError):
+            return {}
+
+    def _onServerInfo(self, reply: QNetworkReply) -> None:
+        klippyState = self._readResult(reply).get('klippy_state')
+        if klippyState:
+            self.updateKlippyState(klippyState)
+
+    def _onPowerDevices(self, reply: QNetworkReply) -> None:
+        for powerDevice in self._readResult(reply).get('devices', []):
+            if powerDevice.get('device') in self._powerDevices:
+                self.updatePowerState(powerDevice['device'], powerDevice.get('status'))
+
+    def _onPingError(self, reply: QNetworkReply, error) -> None:
+        Logger.log("d", "Ping of Moonraker at {} failed: {}".format(self._url, error))
+        self.invalidate()
@@ -1,4 +1,5 @@
 import re
+import copy
 import json
 from enum import Enum
 
@@ -6,28 +7,93 @@ from cura.CuraApplication import CuraApplication
 
 from UM.Logger import Logger
 
+from .MoonrakerGcodeFilter import MoonrakerGcodeFilter
+
 MOONRAKER_SETTINGS = "moonraker/instances"
+MOONRAKER_UPLOAD_HASHES = "moonraker/upload_hashes"
+# number of remembered uploads per printer
+UPLOAD_HASHES_LIMIT = 50
+
+class MoonrakerConfig(dict):
+    # typed access to the config of one printer - still a plain dict for json and the existing callers
+    @property
+    def url(self) -> str:
+        return self.get("url", "").strip()
+
+    @property
+    def apiKey(self) -> str:
+        return self.get("api_key", "").strip()
+
+    @property
+    def powerDevices(self) -> list:
+        return [x.strip() for x in self.get("power_device", "").split(',') if x.strip()]
+
+    @property
+    def retryInterval(self) -> float:
+        try:
+            return float(self.get("retry_interval", ""))
+        except ValueError:
+            return 0.5
+
+    @property
+    def outputFormat(self) -> str:
+        return "ufp" if self.get("output_format", "gcode") == "ufp" else "gcode"
+
+    def createGcodeFilter(self) -> MoonrakerGcodeFilter:
+        # one filter per upload - it records the size reduction. None for presliced files, only the G-code of Cura is
+        # filtered - other slicers keep their metadata in comments (e.g. the footer of PrusaSlicer).
+        printInformation = CuraApplication.getInstance().getPrintInformation()
+        if not printInformation or printInformation.preSliced:
+            return None
+        return MoonrakerGcodeFilter(self.get("gcode_strip_comments", False), self.get("gcode_drop_modal", False), self.get("gcode_limit_precision", False))
+
+    @property
+    def ufpCompressionLevel(self) -> int:
+        # None => level of the UFPWriter
+        try:
+            return min(max(int(self.get("ufp_compression_level", "")), 0), 9)
+        except ValueError:
+            return None
+
+# parsed MOONRAKER_SETTINGS - invalidated whenever the preference changes
+_settingsCache = None
+
+def _loadSettings() -> dict:
+    global _settingsCache
+    if _settingsCache is None:
+        preferences = CuraApplication.getInstance().getPreferences()
+        _settingsCache = {printerId: MoonrakerConfig(config) for printerId, config in json.loads(preferences.getValue(MOONRAKER_SETTINGS)).items()}
+    return _settingsCache
+
+def _invalidateSettings(key: str = MOONRAKER_SETTINGS) -> None:
+    global _settingsCache
+    if key == MOONRAKER_SETTINGS:
+        _settingsCache = None
 
 def _loadConfig():
-    application = CuraApplication.getInstance()
-    globalContainerStack = application.getGlobalContainerStack()
+    globalContainerStack = CuraApplication.getInstance().getGlobalContainerStack()
     if not globalContainerStack:
         return {}, None
-    printerId = globalContainerStack.getId()
-    preferences = application.getPreferences()
-    settings = json.loads(preferences.getValue(MOONRAKER_SETTINGS))
-    return settings, printerId
+    # callers modify the settings => never hand out the cache itself
+    return dict(_loadSettings()), globalContainerStack.getId()
 
 def initConfig():
     preferences = CuraApplication.getInstance().getPreferences()
     preferences.addPreference(MOONRAKER_SETTINGS, json.dumps({}))
+    preferences.addPreference(MOONRAKER_UPLOAD_HASHES, json.dumps({}))
+    preferences.preferenceChanged.connect(_invalidateSettings)
+    _invalidateSettings()
 
-def getConfig() -> dict:
+def getConfig() -> MoonrakerConfig:
     settings, printerId = _loadConfig()
     
     if printerId in settings:
-        return settings[printerId]
-    return {}
+        return copy.deepcopy(settings[printerId])
+    return MoonrakerConfig()
+
+def getAllConfigs() -> dict:
+    # configs of all printers - keyed by the id of the global container stack
+    return copy.deepcopy(_loadSettings())
 
 def saveConfig(config: dict) -> dict:
     settings, printerId = _loadConfig()
@@ -36,6 +102,7 @@ def saveConfig(config: dict) -> dict:
     settings[printerId] = config
     preferences = CuraApplication.getInstance().getPreferences()
     preferences.setValue(MOONRAKER_SETTINGS, json.dumps(settings))
+    _invalidateSettings()
     return settings
 
 def deleteConfig(printerId: str = None) -> bool:
@@ -48,9 +115,27 @@ def deleteConfig(printerId: str = None) -> bool:
         del settings[printerId]
         preferences = CuraApplication.getInstance().getPreferences()
         preferences.setValue(MOONRAKER_SETTINGS, json.dumps(settings))
+        _invalidateSettings()
         return True
     return False
 
+def getUploadHash(printerId: str, fileName: str) -> dict:
+    preferences = CuraApplication.getInstance().getPreferences()
+    uploadHashes = json.loads(preferences.getValue(MOONRAKER_UPLOAD_HASHES))
+    return uploadHashes.get(printerId, {}).get(fileName, {})
+
+def saveUploadHash(printerId: str, fileName: str, uploadHash: dict) -> None:
+    preferences = CuraApplication.getInstance().getPreferences()
+    uploadHashes = json.loads(preferences.getValue(MOONRAKER_UPLOAD_HASHES))
+    printerHashes = uploadHashes.get(printerId, {})
+    # re-insert to keep the most recent upload at the end
+    printerHashes.pop(fileName, None)
+    printerHashes[fileName] = uploadHash
+    while len(printerHashes) > UPLOAD_HASHES_LIMIT:
+        printerHashes.pop(next(iter(printerHashes)))
+    uploadHashes[printerId] = printerHashes
+    preferences.setValue(MOONRAKER_UPLOAD_HASHES, json.dumps(uploadHashes))
+
 def validateUrl(url: str = None) -> bool:
     if not url:
         return False
@@ -0,0 +1,109 @@
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, QTimer
+else:
+    from PyQt5.QtCore import QObject, QTimer
+    USE_QT5 = True
+
+from cura.PrinterOutput.Models.PrintJobOutputModel import PrintJobOutputModel
+
+from UM.Logger import Logger
+
+from .MoonrakerOutputModel import MoonrakerOutputModel
+from .MoonrakerWebSocket import MoonrakerWebSocket
+
+# the model (and the monitor) is updated at most once per interval - independent of the rate of the notifications
+UPDATE_INTERVAL = 500
+
+# print_stats.state => state of printer and print job in Cura
+PRINTER_STATES = {"standby": "idle", "printing": "printing", "paused": "paused", "complete": "idle", "cancelled": "idle", "error": "error"}
+PRINT_JOB_STATES = {"printing": "printing", "paused": "paused", "complete": "finished", "cancelled": "aborted", "error": "error"}
+
+class MoonrakerTelemetry(QObject):
+    def __init__(self, webSocket: MoonrakerWebSocket, printer: MoonrakerOutputModel, extruderCount: int = 1, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._webSocket = webSocket
+        self._printer = printer
+        # klipper names the extruders extruder, extruder1, extruder2, ...
+        self._extruders = ["extruder" + (str(index) if index else "") for index in range(max(1, extruderCount))]
+        self._status = {}
+        self._pending = {}
+        self._printJob = None
+        self._updateTimer = QTimer()
+        self._updateTimer.setSingleShot(True)
+        self._updateTimer.setInterval(UPDATE_INTERVAL)
+        self._updateTimer.timeout.connect(self._onUpdateTimer)
+        self._webSocket.connectedChanged.connect(self._onConnectedChanged)
+        self._webSocket.klippyStateChanged.connect(self._onKlippyStateChanged)
+        self._webSocket.notificationReceived.connect(self._onNotificationReceived)
+
+    def _onConnectedChanged(self, connected: bool) -> None:
+        if not connected:
+            self._updateTimer.stop()
+            self._pending = {}
+            self._status = {}
+            self._printer.updateState("offline")
+
+    def _onKlippyStateChanged(self, klippyState: str) -> None:
+        if klippyState != "ready":
+            self._printer.updateState("error" if klippyState in ("shutdown", "error") else "offline")
+            return
+        objects = {name: None for name in self._extruders + ["heater_bed", "print_stats", "virtual_sdcard"]}
+        Logger.log("d", "Subscribing printer objects {}.".format(list(objects.keys())))
+        self._webSocket.call("printer.objects.subscribe", {"objects": objects}, on_success = lambda result: self._mergeStatus(result.get("status", {})))
+
+    def _onNotificationReceived(self, method: str, params: list) -> None:
+        if method == "notify_status_update" and params:
+            self._mergeStatus(params[0])
+
+    def _mergeStatus(self, status: dict) -> None:
+        # coalesce all notifications until the next update of the model
+        for name, values in status.items():
+            self._pending.setdefault(name, {}).update(values)
+        if not self._updateTimer.isActive():
+            self._updateTimer.start()
+
+    def _onUpdateTimer(self) -> None:
+        for name, values in self._pending.items():
+            self._status.setdefault(name, {}).update(values)
+        changed = self._pending
+        self._pending = {}
+
+        if "heater_bed" in changed:
+            heaterBed = self._status["heater_bed"]
+            self._printer.updateBedTemperature(float(heaterBed.get("temperature", 0)))
+            self._printer.updateTargetBedTemperature(float(heaterBed.get("target", 0)))
+
+        for index, name in enumerate(self._extruders):
+            if name in changed and index < len(self._printer.extruders):
+                extruder = self._status[name]
+                self._printer.extruders[index].updateHotendTemperature(float(extruder.get("temperature", 0)))
+                self._printer.extruders[index].updateTargetHotendTemperature(float(extruder.get("target", 0)))
+
+        if "print_stats" in changed or "virtual_sdcard" in changed:
+            self._updatePrintJob()
+
+    def _updatePrintJob(self) -> None:
+        printStats = self._status.get("print_stats", {})
+        state = printStats.get("state", "standby")
+        self._printer.updateState(PRINTER_STATES.get(state, "idle"))
+
+        fileName = printStats.get("filename", "")
+        if not fileName or state == "standby":
+            self._printer.updateActivePrintJob(None)
+            self._printJob = None
+            return
+
+        if not self._printJob or self._printJob.name != fileName:
+            self._printJob = PrintJobOutputModel(output_controller = self._printer.getController(), key = fileName, name = fileName)
+        self._printJob.updateState(PRINT_JOB_STATES.get(state, "printing"))
+        elapsed = int(printStats.get("print_duration", 0))
+        progress = float(self._status.get("virtual_sdcard", {}).get("progress", 0))
+        self._printJob.updateTimeElapsed(elapsed)
+        # estimated from the progress of the file - klipper doesn't know the total time
+        self._printJob.updateTimeTotal(int(elapsed / progress) if progress > 0 else 0)
+        self._printer.updateActivePrintJob(self._printJob)
@@ -0,0 +1,359 @@
+import base64
+import hashlib
+import os
+import shutil
+import tempfile
+import zipfile
+import zlib
+from typing import cast
+from uuid import uuid4
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QBuffer, QFile, QIODevice, QVariant
+    from PyQt6.QtNetwork import QNetworkRequest, QHttpMultiPart, QHttpPart
+else:
+    from PyQt5.QtCore import QBuffer, QFile, QIODevice, QVariant
+    from PyQt5.QtNetwork import QNetworkRequest, QHttpMultiPart, QHttpPart
+    USE_QT5 = True
+
+from cura.CuraApplication import CuraApplication
+from cura.Snapshot import Snapshot
+
+from UM.Job import Job
+from UM.Logger import Logger
+from UM.Mesh.MeshWriter import MeshWriter
+
+try:
+    ReadOnly = QIODevice.OpenModeFlag.ReadOnly
+    WriteOnly = QIODevice.OpenModeFlag.WriteOnly
+    FormDataType = QHttpMultiPart.ContentType.FormDataType
+    ContentDispositionHeader = QNetworkRequest.KnownHeaders.ContentDispositionHeader
+    ContentTypeHeader = QNetworkRequest.KnownHeaders.ContentTypeHeader
+except AttributeError:
+    ReadOnly = QIODevice.ReadOnly
+    WriteOnly = QIODevice.WriteOnly
+    FormDataType = QHttpMultiPart.FormDataType
+    ContentDispositionHeader = QNetworkRequest.ContentDispositionHeader
+    ContentTypeHeader = QNetworkRequest.ContentTypeHeader
+
+SPOOL_PREFIX = "cura_moonraker_"
+CHUNK_SIZE = 1024 * 1024
+COMPRESSION_LEVEL = 6
+# thumbnails embedded into the G-code - small one for lists, big one for the detail view of the frontends
+THUMBNAIL_SIZES = [(32, 32), (300, 300)]
+THUMBNAIL_LINE_LENGTH = 78
+# last line of the header block of Cura - Moonraker detects the slicer by this block at the start of the file
+CURA_HEADER_END = ";Generated with Cura_SteamEngine"
+
+def createSpoolFile(binary: bool = False):
+    # The payload is written to disk instead of memory, so the size of the job doesn't matter
+    if binary:
+        return tempfile.NamedTemporaryFile(mode = "w+b", prefix = SPOOL_PREFIX, suffix = ".upload", delete = False)
+    # newline = "" keeps the line endings of the writer untouched (same as StringIO)
+    return tempfile.NamedTemporaryFile(mode = "w+", encoding = "utf-8", newline = "", prefix = SPOOL_PREFIX, suffix = ".upload", delete = False)
+
+def getOutputFormat(outputFormat: str) -> str:
+    # The presliced print should always be send using `GCodeWriter`
+    printInformation = CuraApplication.getInstance().getPrintInformation()
+    if outputFormat != "ufp" or not printInformation or printInformation.preSliced:
+        return "gcode"
+    return outputFormat
+
+def createThumbnail(width: int, height: int) -> str:
+    # PrusaSlicer style thumbnail block - found by the metadata parser of Moonraker in the header of the file
+    try:
+        image = Snapshot.snapshot(width = width, height = height)
+    except Exception as e:
+        Logger.log("w", "Snapshot for thumbnail {}x{} failed: {}".format(width, height, e))
+        return ""
+    if not image:
+        return ""
+    buffer = QBuffer()
+    buffer.open(WriteOnly)
+    image.save(buffer, "PNG")
+    data = base64.b64encode(bytes(buffer.data())).decode("ascii")
+    lines = ["; thumbnail begin {}x{} {}".format(image.width(), image.height(), len(data))]
+    lines += ["; " + data[index:index + THUMBNAIL_LINE_LENGTH] for index in range(0, len(data), THUMBNAIL_LINE_LENGTH)]
+    lines += ["; thumbnail end"]
+    return ";\n" + "\n".join(lines) + "\n;\n"
+
+def createMetadataHeader() -> str:
+    # Metadata of the slice which the G-code header of Cura doesn't contain for most flavors, written in the
+    # notation of the Griffin header. Has to run on the main thread - the snapshots are rendered.
+    application = CuraApplication.getInstance()
+    globalStack = application.getGlobalContainerStack()
+    lines = []
+    if globalStack:
+        lines.append(";BUILD_PLATE.INITIAL_TEMPERATURE:{}".format(globalStack.getProperty("material_bed_temperature_layer_0", "value")))
+        for index, extruder in enumerate(globalStack.extruderList):
+            lines.append(";EXTRUDER_TRAIN.{}.INITIAL_TEMPERATURE:{}".format(index, extruder.getProperty("material_print_temperature_layer_0", "value")))
+            lines.append(";EXTRUDER_TRAIN.{}.NOZZLE.DIAMETER:{}".format(index, extruder.getProperty("machine_nozzle_size", "value")))
+        materials = [extruder.material for extruder in globalStack.extruderList if extruder.isEnabled]
+        if materials:
+            lines.append(";Filament name = {}".format(";".join(material.getName() for material in materials)))
+    header = "\n".join(lines) + "\n" if lines else ""
+    for width, height in THUMBNAIL_SIZES:
+        header += createThumbnail(width, height)
+    return header
+
+def createPreheatTargets() -> dict:
+    # First layer temperatures of the slice by the name of the Klipper heater (heater_bed, extruder, extruder1, ...).
+    # Returns None if there is nothing to heat.
+    globalStack = CuraApplication.getInstance().getGlobalContainerStack()
+    if not globalStack:
+        return None
+    targets = {}
+    if globalStack.getProperty("machine_heated_bed", "value"):
+        temperature = globalStack.getProperty("material_bed_temperature_layer_0", "value")
+        if temperature and temperature > 0:
+            targets["heater_bed"] = float(temperature)
+    for index, extruder in enumerate(globalStack.extruderList):
+        temperature = extruder.getProperty("material_print_temperature_layer_0", "value")
+        if extruder.isEnabled and temperature and temperature > 0:
+            targets["extruder" + (str(index) if index else "")] = float(temperature)
+    return targets if targets else None
+
+def createPreheatScript(targets: dict) -> str:
+    # Sets the targets without waiting (M140/M104) - the start G-code waits for the remaining heat-up
+    lines = []
+    for heater, temperature in targets.items():
+        if heater == "heater_bed":
+            lines.append("M140 S{:g}".format(temperature))
+        else:
+            lines.append("M104 T{} S{:g}".format(heater[len("extruder"):] or 0, temperature))
+    return "\n".join(lines)
+
+def repackPackage(path: str, compressionLevel: int) -> None:
+    # The UFPWriter deflates with its own level - the entries are streamed one by one into a package with the requested
+    # level (0 => stored). The package of the writer is kept if repacking fails.
+    target = createSpoolFile(binary = True)
+    target.close()
+    try:
+        with zipfile.ZipFile(path) as source, zipfile.ZipFile(target.name, "w", zipfile.ZIP_DEFLATED if compressionLevel else zipfile.ZIP_STORED, compresslevel = compressionLevel or None) as package:
+            for entry in source.infolist():
+                with source.open(entry) as sourceEntry, package.open(entry.filename, "w", force_zip64 = entry.file_size >= zipfile.ZIP64_LIMIT) as packageEntry:
+                    shutil.copyfileobj(sourceEntry, packageEntry, CHUNK_SIZE)
+        os.replace(target.name, path)
+    except (zipfile.BadZipFile, OSError) as e:
+        Logger.log("w", "Package could not be repacked with compression level {}: {}".format(compressionLevel, e))
+        removeSpoolFile(target.name)
+
+class MetadataHeaderStream:
+    # Text stream for the GCodeWriter which inserts the header behind the header block of Cura (after CURA_HEADER_END, or
+    # in front of the first command) like the thumbnail script of Cura - only the lines up to there are buffered.
+    def __init__(self, stream, header: str = None) -> None:
+        self._stream = stream
+        self._header = header
+        self._buffer = ""
+        self._scanned = 0
+
+    def write(self, data: str) -> int:
+        if self._header is None:
+            return self._stream.write(data)
+        self._buffer += data
+        while self._header is not None:
+            end = self._buffer.find("\n", self._scanned)
+            if end < 0:
+                break
+            if self._buffer.startswith(CURA_HEADER_END, self._scanned):
+                self._insertHeader(end + 1)
+            elif not self._buffer.startswith(";", self._scanned):
+                self._insertHeader(self._scanned)
+            else:
+                self._scanned = end + 1
+        return len(data)
+
+    def finish(self) -> None:
+        # G-code without commands - the header is appended
+        if self._header is not None:
+            self._insertHeader(len(self._buffer))
+
+    def _insertHeader(self, offset: int) -> None:
+        self._stream.write(self._buffer[:offset] + self._header + self._buffer[offset:])
+        self._header = None
+        self._buffer = ""
+
+def writeSpoolFile(outputFormat: str, header: str = None, compressionLevel: int = None, gcodeFilter = None):
+    # Serializes the current slice once - returns the path of the spool file (None on failure) and the effective format.
+    # The optional header (see createMetadataHeader) is inserted behind the header block of Cura and the optional gcodeFilter
+    # (MoonrakerGcodeFilter) is applied to it afterwards, the optional compressionLevel applies to ufp packages.
+    # Filtering reads and writes the whole file - callers with a filter use SpoolFileJob.
+    pluginRegistry = CuraApplication.getInstance().getPluginRegistry()
+    outputFormat = getOutputFormat(outputFormat)
+    if outputFormat == "gcode":
+        meshWriter = cast(MeshWriter, pluginRegistry.getPluginObject("GCodeWriter"))
+        stream = createSpoolFile()
+        writerStream = MetadataHeaderStream(stream, header)
+    else:
+        meshWriter = cast(MeshWriter, pluginRegistry.getPluginObject("UFPWriter"))
+        stream = writerStream = createSpoolFile(binary = True)
+
+    success = meshWriter.write(writerStream, None)
+    if writerStream is not stream:
+        writerStream.finish()
+    # flush the payload to disk - the upload reads it from there
+    stream.close()
+    if not success:
+        Logger.log("e", "MeshWriter failed: %s" % meshWriter.getInformation())
+        removeSpoolFile(stream.name)
+        return None, outputFormat
+    if outputFormat == "gcode" and gcodeFilter and gcodeFilter.isEnabled():
+        gcodeFilter.apply(stream.name)
+    if outputFormat == "ufp" and compressionLevel is not None:
+        repackPackage(stream.name, compressionLevel)
+    return stream.name, outputFormat
+
+class SpoolFileJob(Job):
+    # writeSpoolFile() on the job queue - same as WriteFileJob of Cura, the mesh writers are safe to run there.
+    # With checksum the SHA256 of the written file is computed as well (see getChecksum).
+    def __init__(self, outputFormat: str, header: str = None, compressionLevel: int = None, gcodeFilter = None, checksum: bool = False) -> None:
+        super().__init__()
+        self._outputFormat = outputFormat
+        self._header = header
+        self._compressionLevel = compressionLevel
+        self._gcodeFilter = gcodeFilter
+        self._computeChecksum = checksum
+        self._checksum = None
+
+    def run(self) -> None:
+        result = writeSpoolFile(self._outputFormat, self._header, self._compressionLevel, self._gcodeFilter)
+        if self._computeChecksum and result[0]:
+            self._checksum = computeChecksum(result[0])
+        self.setResult(result)
+
+    def getChecksum(self) -> str:
+        return self._checksum
+
+class ChecksumJob(Job):
+    # computeChecksum() on the job queue - for spool files written without SpoolFileJob
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self._path = path
+
+    def run(self) -> None:
+        try:
+            self.setResult(computeChecksum(self._path))
+        except OSError as e:
+            Logger.log("e", "Checksum of '{}' could not be computed: {}".format(self._path, e))
+            self.setResult(None)
+
+def translateFileName(fileName: str, translateInput: str, translateOutput: str, translateRemove: str) -> str:
+    if translateInput and translateOutput:
+        return fileName.translate(fileName.maketrans(translateInput, translateOutput, translateRemove if translateRemove else ""))
+    return fileName
+
+def removeSpoolFile(path: str = None) -> None:
+    if path and os.path.exists(path):
+        try:
+            os.remove(path)
+        except OSError as e:
+            Logger.log("w", "Spool file '{}' could not be removed: {}".format(path, e))
+
+def openBodyDevice(path: str):
+    # QFile is handed to QHttpPart.setBodyDevice() and read by Qt in chunks during the transfer
+    device = QFile(path)
+    if not device.open(ReadOnly):
+        Logger.log("e", "Spool file '{}' could not be opened: {}".format(path, device.errorString()))
+        return None
+    return device
+
+def createHeaders(apiKey: str = None) -> dict:
+    headers = {'User-Agent': 'Cura Plugin Moonraker', 'Accept': 'application/json, text/plain', 'Connection': 'keep-alive'}
+    if apiKey:
+        headers['X-API-Key'] = apiKey
+    return headers
+
+def createUploadFields(pathName: str = None, startPrint: bool = False, checksum: str = None) -> dict:
+    # form fields of server/files/upload besides the file itself
+    fields = {"root": "gcodes"}
+    if pathName:
+        fields["path"] = pathName
+    if startPrint:
+        fields["print"] = "true"
+    if checksum:
+        # Moonraker compares the SHA256 of the received file and rejects the upload on mismatch
+        fields["checksum"] = checksum
+    return fields
+
+def computeChecksum(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as source:
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+def createMultiPart(data, fileName: str, fields: dict):
+    # returns the multipart request and its content type
+    parts = QHttpMultiPart(FormDataType)
+
+    part_file = QHttpPart()
+    part_file.setHeader(ContentDispositionHeader, QVariant('form-data; name="file"; filename="' + fileName + '"'))
+    part_file.setHeader(ContentTypeHeader, QVariant('application/octet-stream'))
+    if isinstance(data, QIODevice):
+        # stream the payload from the device instead of copying it into memory
+        part_file.setBodyDevice(data)
+    else:
+        part_file.setBody(data)
+    parts.append(part_file)
+
+    for name, value in fields.items():
+        part = QHttpPart()
+        part.setHeader(ContentDispositionHeader, QVariant('form-data; name="{}"'.format(name)))
+        part.setBody(value.encode("UTF-8"))
+        parts.append(part)
+
+    return parts, 'multipart/form-data; boundary="'+ str(parts.boundary().data(), encoding = 'utf-8') + '"'
+
+def createCompressedBody(path: str, fileName: str, fields: dict, level: int = COMPRESSION_LEVEL):
+    # Builds the complete multipart/form-data body gzip-compressed on disk, because a
+    # "Content-Encoding: gzip" request has to carry the whole body compressed - not only the file part.
+    # The payload is compressed chunk by chunk, so the memory usage stays constant.
+    boundary = "CuraMoonraker" + uuid4().hex
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    rawSize = 0
+    with open(path, "rb") as source, createSpoolFile(binary = True) as target:
+        header = '--{}\r\nContent-Disposition: form-data; name="file"; filename="{}"\r\nContent-Type: application/octet-stream\r\n\r\n'.format(boundary, fileName)
+        target.write(compressor.compress(header.encode("UTF-8")))
+        while True:
+            chunk = source.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            rawSize += len(chunk)
+            target.write(compressor.compress(chunk))
+        footer = "\r\n"
+        for name, value in fields.items():
+            footer += '--{}\r\nContent-Disposition: form-data; name="{}"\r\n\r\n{}\r\n'.format(boundary, name, value)
+        footer += "--{}--\r\n".format(boundary)
+        target.write(compressor.compress(footer.encode("UTF-8")))
+        target.write(compressor.flush())
+        return target.name, boundary, rawSize, target.tell()
+
+class CompressedBodyJob(Job):
+    # createCompressedBody() on the job queue - compressing large jobs would block the UI
+    def __init__(self, path: str, fileName: str, fields: dict) -> None:
+        super().__init__()
+        self._path = path
+        self._fileName = fileName
+        self.fields = fields
+
+    def run(self) -> None:
+        try:
+            self.setResult(createCompressedBody(self._path, self._fileName, self.fields))
+        except (OSError, zlib.error) as e:
+            Logger.log("e", "Upload could not be compressed: {}".format(e))
+            self.setResult(None)
+
+def formatSize(size: int) -> str:
+    for unit in ["B", "KB", "MB"]:
+        if size < 1024:
+            return "{:.1f} {}".format(size, unit) if unit != "B" else "{} {}".format(size, unit)
+        size /= 1024
+    return "{:.1f} GB".format(size)
@@ -0,0 +1,163 @@
+import json
+import os
+import re
+import shutil
+from time import time
+from uuid import uuid4
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, pyqtProperty, pyqtSignal, pyqtSlot
+else:
+    from PyQt5.QtCore import QObject, pyqtProperty, pyqtSignal, pyqtSlot
+    USE_QT5 = True
+
+from UM.Logger import Logger
+from UM.Resources import Resources
+
+QUEUE_DIRECTORY = "moonraker_queue"
+QUEUE_FILE_NAME = "queue.json"
+
+class MoonrakerUploadQueue(QObject):
+    # Jobs waiting for the upload to one printer. The payload of every job is moved into
+    # <data storage>/moonraker_queue/<printer>/ and the queue is saved there, so it survives a restart of Cura.
+    queueChanged = pyqtSignal()
+
+    def __init__(self, printerId: str, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._directory = os.path.join(Resources.getDataStoragePath(), QUEUE_DIRECTORY, re.sub(r'[^\w\-.]', '_', printerId))
+        self._jobs = []
+        # job being uploaded - it stays in the queue until the upload is completed
+        self._activeJobId = None
+        self._load()
+        # jobs left over from the last session wait until the user resumes the queue
+        self._paused = bool(self._jobs)
+
+    def _load(self) -> None:
+        path = os.path.join(self._directory, QUEUE_FILE_NAME)
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path) as queueFile:
+                jobs = json.load(queueFile)
+        except (OSError, json.JSONDecodeError) as e:
+            Logger.log("w", "Upload queue '{}' could not be loaded: {}".format(path, e))
+            return
+        # drop jobs without payload
+        self._jobs = [job for job in jobs if os.path.exists(job.get("spool_path", ""))]
+        Logger.log("i", "Upload queue '{}' loaded with {} job(s).".format(path, len(self._jobs)))
+
+    def _save(self) -> None:
+        if not self._jobs:
+            # an empty queue is never paused
+            self._paused = False
+        try:
+            os.makedirs(self._directory, exist_ok = True)
+            with open(os.path.join(self._directory, QUEUE_FILE_NAME), "w") as queueFile:
+                json.dump(self._jobs, queueFile, indent = 2)
+        except OSError as e:
+            Logger.log("w", "Upload queue could not be saved: {}".format(e))
+        self.queueChanged.emit()
+
+    def enqueue(self, spoolPath: str, fileName: str, pathName: str, startPrint: bool, outputFormat: str, checksum: str = None) -> int:
+        # returns the position of the new job
+        os.makedirs(self._directory, exist_ok = True)
+        jobId = uuid4().hex
+        queuedPath = os.path.join(self._directory, jobId + ".upload")
+        shutil.move(spoolPath, queuedPath)
+        self._jobs.append({"id": jobId, "spool_path": queuedPath, "file_name": fileName, "path_name": pathName, "start_print": startPrint, "output_format": outputFormat, "checksum": checksum, "size": os.path.getsize(queuedPath), "created": time()})
+        Logger.log("i", "Job '{}' queued at position {}.".format(fileName, len(self._jobs)))
+        self._save()
+        return len(self._jobs)
+
+    def take(self) -> dict:
+        # the job stays in the queue (and keeps its payload) until remove() or release() is called for it
+        if not self._jobs or self._activeJobId:
+            return None
+        job = self._jobs[0]
+        self._activeJobId = job["id"]
+        self.queueChanged.emit()
+        return dict(job)
+
+    def remove(self, jobId: str) -> None:
+        # upload completed => the job and its payload are dropped
+        self._activeJobId = None
+        for job in self._jobs:
+            if job["id"] == jobId:
+                self._removeJob(job)
+                return
+
+    def release(self, jobId: str) -> None:
+        # upload failed or cancelled => the job is tried again first once the paused queue is resumed
+        self._activeJobId = None
+        for index, job in enumerate(self._jobs):
+            if job["id"] == jobId:
+                self._jobs.insert(0, self._jobs.pop(index))
+                self._paused = True
+                Logger.log("i", "Queued job '{}' kept at the head of the paused queue.".format(job["file_name"]))
+                self._save()
+                return
+
+    def isEmpty(self) -> bool:
+        return not self._jobs
+
+    def isPaused(self) -> bool:
+        return self._paused
+
+    @pyqtProperty(bool, notify = queueChanged)
+    def paused(self) -> bool:
+        return self._paused
+
+    @pyqtSlot()
+    def pause(self) -> None:
+        if not self._paused:
+            self._paused = True
+            self.queueChanged.emit()
+
+    @pyqtSlot()
+    def resume(self) -> None:
+        if self._paused:
+            self._paused = False
+            self.queueChanged.emit()
+
+    @pyqtProperty("QVariantList", notify = queueChanged)
+    def jobs(self) -> list:
+        return [dict(job, active = job["id"] == self._activeJobId) for job in self._jobs]
+
+    @pyqtSlot(str)
+    def cancelJob(self, jobId: str) -> None:
+        if jobId == self._activeJobId:
+            # the payload is being uploaded
+            return
+        for job in self._jobs:
+            if job["id"] == jobId:
+                self._removeJob(job)
+                Logger.log("i", "Queued job '{}' cancelled.".format(job["file_name"]))
+                return
+
+    def _removeJob(self, job: dict) -> None:
+        self._jobs.remove(job)
+        if os.path.exists(job["spool_path"]):
+            os.remove(job["spool_path"])
+        self._save()
+
+    @pyqtSlot(str)
+    def moveJobUp(self, jobId: str) -> None:
+        self._moveJob(jobId, -1)
+
+    @pyqtSlot(str)
+    def moveJobDown(self, jobId: str) -> None:
+        self._moveJob(jobId, 1)
+
+    def _moveJob(self, jobId: str, offset: int) -> None:
+        for index, job in enumerate(self._jobs):
+            if job["id"] == jobId:
+                newIndex = index + offset
+                if 0 <= newIndex < len(self._jobs):
+                    self._jobs.insert(newIndex, self._jobs.pop(index))
+                    self._save()
+                return
@@ -0,0 +1,168 @@
+import json
+
+USE_QT5 = False
+try:
+    from cura.ApplicationMetadata import CuraSDKVersion
+except ImportError: # Cura <= 3.6
+    CuraSDKVersion = "6.0.0"
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QObject, QUrl, pyqtSignal
+    from PyQt6.QtNetwork import QAbstractSocket, QNetworkRequest
+    try:
+        from PyQt6.QtWebSockets import QWebSocket
+    except ImportError:
+        QWebSocket = None
+else:
+    from PyQt5.QtCore import QObject, QUrl, pyqtSignal
+    from PyQt5.QtNetwork import QAbstractSocket, QNetworkRequest
+    try:
+        from PyQt5.QtWebSockets import QWebSocket
+    except ImportError:
+        QWebSocket = None
+    USE_QT5 = True
+
+from UM.Logger import Logger
+
+from .MoonrakerRetryScheduler import MoonrakerRetryScheduler
+
+try:
+    UnconnectedState = QAbstractSocket.SocketState.UnconnectedState
+except AttributeError:
+    UnconnectedState = QAbstractSocket.UnconnectedState
+
+# without QtWebSockets the plugin talks to Moonraker by HTTP only
+WEBSOCKET_AVAILABLE = QWebSocket is not None
+
+# klippy states reported by notifications
+KLIPPY_NOTIFICATIONS = {"notify_klippy_ready": "ready", "notify_klippy_shutdown": "shutdown", "notify_klippy_disconnected": "disconnected"}
+
+class MoonrakerWebSocket(QObject):
+    connectedChanged = pyqtSignal(bool)
+    klippyStateChanged = pyqtSignal(str)
+    powerDeviceChanged = pyqtSignal(str, str)
+    notificationReceived = pyqtSignal(str, list)
+
+    def __init__(self, parent: QObject = None) -> None:
+        super().__init__(parent)
+        self._url = None
+        self._apiKey = None
+        self._connected = False
+        self._klippyState = None
+        self._requestId = 0
+        self._callbacks = {}
+        # reconnects never give up, the delay grows up to one minute
+        self._reconnectScheduler = MoonrakerRetryScheduler(interval = 1.0, factor = 2.0, maxInterval = 60.0, maxAttempts = 1 << 30, deadline = float("inf"))
+        self._webSocket = None
+        if WEBSOCKET_AVAILABLE:
+            self._webSocket = QWebSocket()
+            self._webSocket.connected.connect(self._onConnected)
+            # covers failed connection attempts as well as lost connections
+            self._webSocket.stateChanged.connect(self._onStateChanged)
+            self._webSocket.textMessageReceived.connect(self._onTextMessageReceived)
+
+    def open(self, url: str, apiKey: str = None) -> None:
+        if not self._webSocket:
+            return
+        webSocketUrl = QUrl(url)
+        webSocketUrl.setScheme("wss" if webSocketUrl.scheme() == "https" else "ws")
+        webSocketUrl.setPath(webSocketUrl.path().rstrip("/") + "/websocket")
+        if self._url == webSocketUrl and self._apiKey == apiKey and (self._connected or self._reconnectScheduler.isActive()):
+            return
+        self.close()
+        self._url = webSocketUrl
+        self._apiKey = apiKey
+        self._reconnect()
+
+    def close(self) -> None:
+        self._url = None
+        self._reconnectScheduler.reset()
+        if self._webSocket:
+            self._webSocket.close()
+        self._setConnected(False)
+
+    def isConnected(self) -> bool:
+        return self._connected
+
+    def getKlippyState(self) -> str:
+        # None if the state is unknown (no connection)
+        return self._klippyState if self._connected else None
+
+    def call(self, method: str, params: dict = None, on_success = None, on_error = None) -> bool:
+        if not self._connected:
+            return False
+        self._requestId += 1
+        request = {"jsonrpc": "2.0", "method": method, "id": self._requestId}
+        if params:
+            request["params"] = params
+        self._callbacks[self._requestId] = (on_success, on_error)
+        self._webSocket.sendTextMessage(json.dumps(request))
+        return True
+
+    def _reconnect(self) -> None:
+        if not self._url:
+            return
+        Logger.log("d", "Opening websocket {}.".format(self._url.toString()))
+        request = QNetworkRequest(self._url)
+        if self._apiKey:
+            request.setRawHeader(b"X-Api-Key", self._apiKey.encode())
+        self._webSocket.open(request)
+
+    def _onConnected(self) -> None:
+        Logger.log("i", "Websocket {} connected.".format(self._url.toString() if self._url else ""))
+        self._reconnectScheduler.reset()
+        self._setConnected(True)
+        self.call("server.connection.identify", {"client_name": "Cura Moonraker Plugin", "version": "1", "type": "other", "url": "https://github.com/emtrax-ltd/Cura2MoonrakerPlugin"})
+        self.call("server.info", on_success = lambda result: self._setKlippyState(result.get("klippy_state")))
+
+    def _onStateChanged(self, state) -> None:
+        if state == UnconnectedState:
+            self._onDisconnected()
+
+    def _onDisconnected(self) -> None:
+        self._setConnected(False)
+        for on_success, on_error in self._callbacks.values():
+            if on_error:
+                on_error({"message": "Websocket disconnected."})
+        self._callbacks = {}
+        if self._url and not self._reconnectScheduler.isActive():
+            # fall back to HTTP until the connection is back
+            self._reconnectScheduler.schedule(self._reconnect)
+
+    def _setConnected(self, connected: bool) -> None:
+        if self._connected != connected:
+            self._connected = connected
+            if not connected:
+                self._klippyState = None
+            self.connectedChanged.emit(connected)
+
+    def _setKlippyState(self, klippyState: str) -> None:
+        if self._klippyState != klippyState:
+            Logger.log("d", "Klippy state changed to '{}'.".format(klippyState))
+            self._klippyState = klippyState
+            self.klippyStateChanged.emit(klippyState)
+
+    def _onTextMessageReceived(self, message: str) -> None:
+        try:
+            response = json.loads(message)
+        except json.JSONDecodeError:
+            Logger.log("w", "Websocket message is not a JSON: {}".format(message[:200]))
+            return
+
+        if "id" in response:
+            on_success, on_error = self._callbacks.pop(response["id"], (None, None))
+            if "error" in response:
+                Logger.log("w", "Websocket request #{} failed: {}".format(response["id"], response["error"]))
+                if on_error:
+                    on_error(response["error"])
+            elif on_success:
+                on_success(response.get("result", {}))
+            return
+
+        method = response.get("method", "")
+        params = response.get("params", [])
+        if method in KLIPPY_NOTIFICATIONS:
+            self._setKlippyState(KLIPPY_NOTIFICATIONS[method])
+        elif method == "notify_power_changed":
+            for powerDevice in params:
+                self.powerDeviceChanged.emit(powerDevice.get("device", ""), powerDevice.get("status", ""))
+        self.notificationReceived.emit(method, params)
@@ -1,14 +1,17 @@
 import os
 import json
+import time
 
 from UM.Logger import Logger
 
-from . import MoonrakerMachineAction, MoonrakerOutputDevicePlugin
-
 def getMetaData():
     return {}
 
 def register(app):
+    started = time.perf_counter()
+    # Cura calls register() right after importing the package => the imports are timed with it
+    from . import MoonrakerMachineAction, MoonrakerOutputDevicePlugin
+
     plugin_file_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "plugin.json")
     try:
         with open(plugin_file_path) as plugin_file:
@@ -17,7 +20,9 @@ def register(app):
     except:
         Logger.log("w", "MoonrakerOutputDevicePlugin failed to get version information!")
 
-    return {
+    plugin_objects = {
         "output_device": MoonrakerOutputDevicePlugin.MoonrakerOutputDevicePlugin(),
         "machine_action": MoonrakerMachineAction.MoonrakerMachineAction()
     }
+    Logger.log("i", "MoonrakerOutputDevicePlugin registered in {:.1f} ms.".format((time.perf_counter() - started) * 1000))
+    return plugin_objects
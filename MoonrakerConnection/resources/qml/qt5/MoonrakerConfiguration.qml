@@ -20,6 +20,10 @@ Cura.MachineAction {
         return outputFormatUfp.checked ? "ufp" : "gcode"
     }
 
+    function ufpCompressionLevel() {
+        return ufpCompressionNone.checked ? "0" : ufpCompressionFast.checked ? "1" : ufpCompressionBest.checked ? "9" : ""
+    }
+
     function cameraImageRotation() {
         return cameraImageRotation90.checked ? "90" : cameraImageRotation180.checked ? "180" : cameraImageRotation270.checked ? "270" : "0"
     }
@@ -35,10 +39,23 @@ Cura.MachineAction {
                 retry_interval: retryIntervalField.text,
                 frontend_url: frontendUrlField.text,
                 output_format: outputFormat(),
+                ufp_compression_level: ufpCompressionLevel(),
                 upload_dialog: uploadDialogVisible.checked,
                 upload_start_print_job: uploadStartPrintJobBox.checked,
                 upload_remember_state: uploadRememberStateBox.checked,
                 upload_autohide_messagebox: uploadAutohideMessageboxBox.checked,
+                upload_compression: uploadCompressionBox.checked,
+                upload_verify: uploadVerifyBox.checked,
+                upload_skip_identical: uploadSkipIdenticalBox.checked,
+                metrics_dump: metricsDumpBox.checked,
+                upload_pipelined: uploadPipelinedBox.checked,
+                upload_embed_metadata: uploadEmbedMetadataBox.checked,
+                upload_while_booting: uploadWhileBootingBox.checked,
+                gcode_strip_comments: gcodeStripCommentsBox.checked,
+                gcode_drop_modal: gcodeDropModalBox.checked,
+                gcode_limit_precision: gcodeLimitPrecisionBox.checked,
+                upload_preheat: uploadPreheatBox.checked,
+                upload_job_queue: uploadJobQueueBox.checked,
                 trans_input: translateInputField.text,
                 trans_output: translateOutputField.text,
                 trans_remove: translateRemoveField.text,
@@ -243,7 +260,7 @@ Cura.MachineAction {
                             Label {
                                 color: UM.Theme.getColor("text")
                                 font: UM.Theme.getFont("default")       
-                                text: catalog.i18nc("@label", "Retry interval in seconds (Optional - default: 0.5 [20 iterations])")
+                                text: catalog.i18nc("@label", "Initial retry interval in seconds (Optional - default: 0.5 [max. 20 retries with backoff])")
                                 renderType: Text.NativeRendering
                             }
                             Label {
@@ -349,6 +366,51 @@ Cura.MachineAction {
                                 checked: manager.settingsOutputFormat == "ufp"
                             }
                         }
+                        Label {
+                            x: 25
+                            visible: outputFormatUfp.checked
+                            text: catalog.i18nc("@label", "UFP compression")
+                        }
+                        ButtonGroup {
+                            id: ufpCompressionValue
+                        }
+                        RowLayout {
+                            x: 35
+                            visible: outputFormatUfp.checked
+
+                            Cura.RadioButton {
+                                ButtonGroup.group: ufpCompressionValue
+
+                                id: ufpCompressionDefault
+
+                                text: catalog.i18nc("@label", "Default")
+                                checked: manager.settingsUfpCompressionLevel == ""
+                            }
+                            Cura.RadioButton {
+                                ButtonGroup.group: ufpCompressionValue
+
+                                id: ufpCompressionNone
+
+                                text: catalog.i18nc("@label", "None")
+                                checked: manager.settingsUfpCompressionLevel == "0"
+                            }
+                            Cura.RadioButton {
+                                ButtonGroup.group: ufpCompressionValue
+
+                                id: ufpCompressionFast
+
+                                text: catalog.i18nc("@label", "Fast")
+                                checked: manager.settingsUfpCompressionLevel == "1"
+                            }
+                            Cura.RadioButton {
+                                ButtonGroup.group: ufpCompressionValue
+
+                                id: ufpCompressionBest
+
+                                text: catalog.i18nc("@label", "Best")
+                                checked: manager.settingsUfpCompressionLevel == "9"
+                            }
+                        }
 
         		        Item {
                             width: parent.width
@@ -395,6 +457,33 @@ Cura.MachineAction {
                             checked: manager.settingsUploadStartPrintJob
                             visible: uploadDialogBypass.checked
                         }
+                        Cura.CheckBox {
+                            id: uploadJobQueueBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Add print jobs to the job queue of Moonraker")
+                            checked: manager.settingsUploadJobQueue
+                        }
+                        Cura.CheckBox {
+                            id: uploadWhileBootingBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Upload while the printer is powering on")
+                            checked: manager.settingsUploadWhileBooting
+                        }
+                        Cura.CheckBox {
+                            id: uploadPreheatBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Preheat the printer while uploading (print job only)")
+                            checked: manager.settingsUploadPreheat
+                        }
                         Cura.CheckBox {
                             id: uploadRememberStateBox
 
@@ -415,6 +504,87 @@ Cura.MachineAction {
                             text: catalog.i18nc("@label", "Auto hide messagebox for successful upload (30 seconds)")
                             checked: manager.settingsUploadAutohideMessagebox
                         }
+                        Cura.CheckBox {
+                            id: uploadCompressionBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Compress upload with gzip (plain upload if not supported by Moonraker)")
+                            checked: manager.settingsUploadCompression
+                        }
+                        Cura.CheckBox {
+                            id: uploadVerifyBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Verify upload (SHA256 checksum and size) and resend damaged files")
+                            checked: manager.settingsUploadVerify
+                        }
+                        Cura.CheckBox {
+                            id: uploadSkipIdenticalBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Skip upload if an identical G-code file already exists on the printer")
+                            checked: manager.settingsUploadSkipIdentical
+                        }
+                        Cura.CheckBox {
+                            id: metricsDumpBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Write upload metrics to moonraker_metrics.json in the configuration folder")
+                            checked: manager.settingsMetricsDump
+                        }
+                        Cura.CheckBox {
+                            id: uploadPipelinedBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Write G-code while connecting to the printer")
+                            checked: manager.settingsUploadPipelined
+                        }
+                        Cura.CheckBox {
+                            id: uploadEmbedMetadataBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Embed thumbnails and metadata in the G-code")
+                            checked: manager.settingsUploadEmbedMetadata
+                        }
+                        Cura.CheckBox {
+                            id: gcodeStripCommentsBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Strip comments from the G-code (header and thumbnails are kept)")
+                            checked: manager.settingsGcodeStripComments
+                        }
+                        Cura.CheckBox {
+                            id: gcodeDropModalBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Drop repeated feedrates and positions from the G-code")
+                            checked: manager.settingsGcodeDropModal
+                        }
+                        Cura.CheckBox {
+                            id: gcodeLimitPrecisionBox
+
+                            x: 25
+                            height: UM.Theme.getSize("checkbox").height
+                            font: UM.Theme.getFont("default")
+                            text: catalog.i18nc("@label", "Limit the G-code to 0.01 mm precision")
+                            checked: manager.settingsGcodeLimitPrecision
+                        }
 
                         Item {
                             width: parent.width
@@ -1,5 +1,6 @@
 import QtQuick 2.10
 import QtQuick.Controls 2.3
+import QtQuick.Window 2.2
 
 import UM 1.5 as UM
 import Cura 1.1 as Cura
@@ -55,42 +56,43 @@ Component {
                 text: "Url: " + (parent.cameraConfigured ? OutputDevice.activePrinter.cameraUrl : "None")
             }
 
-            Cura.NetworkMJPGImage {
-                property bool imageRotated: OutputDevice.activePrinter.cameraImageRotation == "90" || OutputDevice.activePrinter.cameraImageRotation == "270"
+            Image {
+                // frames are decoded, scaled, mirrored and rotated by the camera stream of the printer
+                property var stream: OutputDevice.activePrinter.cameraStream
                 property real maxViewWidth: parent.width - 2 * UM.Theme.getSize("default_margin").width
                 property real maxViewHeight: parent.height - 2 * UM.Theme.getSize("default_margin").height
-                property real scaleFactor: {
-                    if (imageRotated) {
-                        Math.min(Math.min(maxViewWidth / imageHeight, maxViewHeight / imageWidth), 2)
-                    } else {
-                        Math.min(Math.min(maxViewWidth / imageWidth, maxViewHeight / imageHeight), 2)
-                    }
-                }
+                property real scaleFactor: stream.frameWidth > 0 && stream.frameHeight > 0 ? Math.min(Math.min(maxViewWidth / stream.frameWidth, maxViewHeight / stream.frameHeight), 2) : 1
 
                 id: cameraImage
                 anchors {
                     horizontalCenter: parent.horizontalCenter
                     verticalCenter: parent.verticalCenter
                 }
-                width: Math.floor(imageWidth * scaleFactor)
-                height: Math.floor(imageHeight * scaleFactor)
-                source: parent.cameraConfigured ? OutputDevice.activePrinter.cameraUrl : ""
-                rotation:  OutputDevice.activePrinter.cameraImageRotation
-                mirror: OutputDevice.activePrinter.cameraImageMirror
+                width: Math.floor(stream.frameWidth * scaleFactor)
+                height: Math.floor(stream.frameHeight * scaleFactor)
+                cache: false
+                smooth: true
+                source: parent.cameraConfigured ? stream.source : ""
+
+                function updateViewSize() {
+                    stream.setViewSize(Math.ceil(maxViewWidth * Screen.devicePixelRatio), Math.ceil(maxViewHeight * Screen.devicePixelRatio))
+                }
+                onMaxViewWidthChanged: updateViewSize()
+                onMaxViewHeightChanged: updateViewSize()
                 onVisibleChanged: {
-                    if (source != "") {
-                        if (visible) {
-                            start()
-                        } else {
-                            stop()
-                        }
+                    if (visible) {
+                        stream.start()
+                    } else {
+                        stream.stop()
                     }
                 }
                 Component.onCompleted: {
-                    if (source != "") {
-                        start()
+                    updateViewSize()
+                    if (visible) {
+                        stream.start()
                     }
                 }
+                Component.onDestruction: stream.stop()
             }
         }
 
@@ -125,6 +127,93 @@ Component {
                 text: OutputDevice != null ? OutputDevice.activePrinter.name : ""
             }
 
+            UM.Label {
+                id: dashboardLabel
+                anchors {
+                    top: outputDeviceNameLabel.bottom
+                    left: parent.left
+                    right: parent.right
+                    margins: UM.Theme.getSize("default_margin").width
+                }
+                color: UM.Theme.getColor("text_inactive")
+                font: UM.Theme.getFont("default_bold")
+                text: "All printers"
+            }
+
+            ListView {
+                // state of all configured printers - polled by one shared scheduler while the monitor is visible
+                property var dashboard: OutputDevice.activePrinter.dashboard
+
+                id: dashboardList
+                anchors {
+                    top: dashboardLabel.bottom
+                    bottom: parent.bottom
+                    left: parent.left
+                    right: parent.right
+                    margins: UM.Theme.getSize("default_margin").width
+                }
+                clip: true
+                spacing: UM.Theme.getSize("narrow_margin").height
+                model: dashboard.printers
+
+                ScrollBar.vertical: UM.ScrollBar {}
+
+                delegate: Column {
+                    width: dashboardList.width
+
+                    Item {
+                        width: parent.width
+                        height: printerNameLabel.height
+
+                        UM.Label {
+                            id: printerNameLabel
+                            anchors {
+                                left: parent.left
+                                right: printerStateLabel.left
+                                rightMargin: UM.Theme.getSize("default_margin").width
+                            }
+                            color: UM.Theme.getColor("text")
+                            font: UM.Theme.getFont("default")
+                            text: modelData.name
+                            elide: Text.ElideRight
+                        }
+                        UM.Label {
+                            id: printerStateLabel
+                            anchors.right: parent.right
+                            color: UM.Theme.getColor(modelData.state == "offline" || modelData.state == "unauthorized" || modelData.state == "error" || modelData.state == "shutdown" ? "error" : (modelData.state == "printing" ? "primary" : "text_inactive"))
+                            font: UM.Theme.getFont("default")
+                            text: modelData.state
+                        }
+                    }
+                    UM.Label {
+                        visible: modelData.filename != ""
+                        width: parent.width
+                        color: UM.Theme.getColor("text_inactive")
+                        font: UM.Theme.getFont("small")
+                        text: modelData.filename + (modelData.state == "printing" || modelData.state == "paused" ? " - " + Math.round(modelData.progress * 100) + "%" : "")
+                        elide: Text.ElideMiddle
+                    }
+                }
+
+                onVisibleChanged: {
+                    if (visible) {
+                        dashboard.start()
+                    } else {
+                        dashboard.stop()
+                    }
+                }
+                Component.onCompleted: {
+                    if (visible) {
+                        dashboard.start()
+                    }
+                }
+                Component.onDestruction: {
+                    if (visible) {
+                        dashboard.stop()
+                    }
+                }
+            }
+
             /*Cura.PrintMonitor {
                 id: printMonitor
 
@@ -0,0 +1,107 @@
+import QtQuick 2.10
+import QtQuick.Controls 2.15
+import QtQuick.Layouts 1.3
+import QtQuick.Window 2.1
+
+import UM 1.5 as UM
+import Cura 1.1 as Cura
+
+UM.Dialog {
+    property variant catalog: UM.I18nCatalog { id: catalog; name: "cura" }
+
+    id: base
+    title: catalog.i18nc("@title:window", "Upload Queue of {0}").arg(printerName)
+    minimumWidth: screenScaleFactor * 500
+    minimumHeight: screenScaleFactor * 300
+
+    Cura.RoundedRectangle {
+        anchors {
+            top: parent.top
+            bottom: parent.bottom
+            left: parent.left
+            right: parent.right
+        }
+        cornerSide: Cura.RoundedRectangle.Direction.Down
+        border.color: UM.Theme.getColor("lining")
+        border.width: UM.Theme.getSize("default_lining").width
+        radius: UM.Theme.getSize("default_radius").width
+        color: UM.Theme.getColor("main_background")
+
+        UM.Label {
+            anchors.centerIn: parent
+            visible: queue.jobs.length == 0
+            text: catalog.i18nc("@label", "No uploads queued.")
+            color: UM.Theme.getColor("text_disabled")
+        }
+
+        ListView {
+            id: jobList
+            anchors.fill: parent
+            anchors.margins: UM.Theme.getSize("default_margin").width
+            clip: true
+            spacing: 3 * screenScaleFactor
+            model: queue.jobs
+
+            ScrollBar.vertical: UM.ScrollBar {}
+
+            delegate: RowLayout {
+                width: jobList.width
+                spacing: UM.Theme.getSize("default_margin").width
+
+                UM.Label {
+                    Layout.fillWidth: true
+                    text: (index + 1) + ". " + (modelData.path_name ? modelData.path_name + "/" : "") + modelData.file_name + (modelData.start_print ? "  ▶" : "")
+                    elide: Text.ElideMiddle
+                }
+                UM.Label {
+                    text: (modelData.size / 1048576).toFixed(1) + " MB"
+                    color: UM.Theme.getColor("text_disabled")
+                }
+                UM.SimpleButton {
+                    iconSource: UM.Theme.getIcon("ChevronSingleUp")
+                    enabled: index > 0
+                    height: UM.Theme.getSize("small_button_icon").height
+                    width: height
+                    color: enabled ? UM.Theme.getColor("setting_control_button") : UM.Theme.getColor("text_disabled")
+                    hoverColor: UM.Theme.getColor("setting_control_button_hover")
+                    onClicked: queue.moveJobUp(modelData.id)
+                }
+                UM.SimpleButton {
+                    iconSource: UM.Theme.getIcon("ChevronSingleDown")
+                    enabled: index < jobList.count - 1
+                    height: UM.Theme.getSize("small_button_icon").height
+                    width: height
+                    color: enabled ? UM.Theme.getColor("setting_control_button") : UM.Theme.getColor("text_disabled")
+                    hoverColor: UM.Theme.getColor("setting_control_button_hover")
+                    onClicked: queue.moveJobDown(modelData.id)
+                }
+                UM.SimpleButton {
+                    iconSource: UM.Theme.getIcon("Cancel")
+                    height: UM.Theme.getSize("small_button_icon").height
+                    width: height
+                    // the job being uploaded can't be cancelled
+                    enabled: !modelData.active
+                    color: enabled ? UM.Theme.getColor("setting_control_button") : UM.Theme.getColor("text_disabled")
+                    hoverColor: UM.Theme.getColor("setting_control_button_hover")
+                    onClicked: queue.cancelJob(modelData.id)
+                }
+            }
+        }
+    }
+
+    rightButtons: [
+        Cura.SecondaryButton {
+            visible: queue.paused
+            text: catalog.i18nc("@action:button", "Resume")
+            onClicked: queue.resume()
+        },
+        Label {
+            text: ''
+            width: 10
+        },
+        Cura.PrimaryButton {
+            text: catalog.i18nc("@action:button", "Close")
+            onClicked: base.accept()
+        }
+    ]
+}
@@ -13,6 +13,7 @@ UM.Dialog {
     property string validationPathError
     property bool validName: true
     property string validationNameError
+    property string overwriteWarning
 
     id: base
     title: catalog.i18nc("@title:window", "Upload to Moonraker")
@@ -80,6 +81,7 @@ UM.Dialog {
                         editable: true
                         property string path
                         property var pathes
+                        property var remotePathes
                         property bool initialized: false
 
                         onPathesChanged: {
@@ -102,6 +104,19 @@ UM.Dialog {
                             }
                         }
 
+                        onRemotePathesChanged: {
+                            // directories on the printer - listed, but not remembered
+                            var text = editText
+                            for (var i = 0; i < remotePathes.length; i++) {
+                                if (find(remotePathes[i]) === -1) {
+                                    model.append({text: remotePathes[i]})
+                                }
+                            }
+                            model.sort()
+                            currentIndex = find(text)
+                            editText = text
+                        }
+
                         onCurrentTextChanged: {
                             editText = currentText
                             base.textChanged(currentText)
@@ -237,6 +252,13 @@ UM.Dialog {
                             color: UM.Theme.getColor("error")
                             leftPadding: 15
                         }
+                        UM.Label {
+                            visible: base.validName && base.overwriteWarning != ""
+                            text: base.overwriteWarning
+                            font: UM.Theme.getFont("default_italic")
+                            color: UM.Theme.getColor("warning")
+                            leftPadding: 15
+                        }
                     }
 
                     Cura.TextField {
@@ -0,0 +1,400 @@
+#!/usr/bin/env python3
+# Local stand-in for Moonraker - just enough of the API for the upload flow of the plugin:
+#   GET  /server/info
+#   GET  /server/files/directory
+#   GET  /server/files/metadata             (parsed from the head of the uploaded file, like Moonraker does)
+#   POST /server/files/upload               (plain or "Content-Encoding: gzip", optional checksum)
+#   GET  /machine/device_power/device(s), /machine/device_power/status?dev1&dev2
+#   POST /machine/device_power/device, /machine/device_power/on|off?dev1&dev2   (Klippy boots for --boot-time seconds)
+#   GET  /websocket                         (JSON-RPC: identify, server.info, printer.objects.subscribe)
+# Bandwidth, latency and dropped connections are simulated on request. Uploads are counted and hashed,
+# but only their metadata is stored. Needs the standard library only, so it can also be started as upload target for Cura:
+#   python3 benchmarks/fake_moonraker.py --port 7125 --bandwidth 2M --latency 50 --drop-rate 0.1
+
+import argparse
+import base64
+import hashlib
+import json
+import os
+import random
+import re
+import struct
+import sys
+import threading
+import time
+import urllib.parse
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+READ_SIZE = 64 * 1024
+# bytes at the end of the body kept back to find the form fields behind the file part
+TAIL_SIZE = 16 * 1024
+# bytes at the start of the file searched for metadata - the metadata parser of Moonraker reads the same amount
+METADATA_HEAD_SIZE = 512 * 1024
+WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+def parseMetadata(head: bytes) -> dict:
+    # subset of the metadata Moonraker extracts from the header of a Cura file
+    text = head.decode("utf-8", "replace")
+    metadata = {"slicer": "Cura" if "Cura_SteamEngine" in text else "Unknown"}
+    for key, pattern in (("estimated_time", r";TIME:(\d+)"), ("filament_total", r";Filament used:\s*([\d.]+)m"), ("layer_height", r";Layer height:\s*([\d.]+)"),
+                         ("layer_count", r";LAYER_COUNT:(\d+)"), ("first_layer_bed_temp", r";BUILD_PLATE.INITIAL_TEMPERATURE:([\d.]+)"),
+                         ("first_layer_extr_temp", r";EXTRUDER_TRAIN.0.INITIAL_TEMPERATURE:([\d.]+)"), ("nozzle_diameter", r";EXTRUDER_TRAIN.0.NOZZLE.DIAMETER:([\d.]+)"),
+                         ("filament_weight_total", r";Filament weight = ([\d.]+)")):
+        match = re.search(pattern, text)
+        if match:
+            metadata[key] = float(match.group(1))
+    metadata["thumbnails"] = [{"width": int(width), "height": int(height), "size": int(size)} for width, height, size in re.findall(r"; thumbnail begin (\d+)x(\d+) (\d+)", text)]
+    return metadata
+
+def parseSize(value: str) -> int:
+    # "10M" => 10485760
+    match = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kKmMgG]?)[bB]?\s*", value)
+    if not match:
+        raise argparse.ArgumentTypeError("invalid size '{}'".format(value))
+    return int(float(match.group(1)) * 1024 ** " KMG".index(match.group(2).upper() or " "))
+
+class UploadParser:
+    # Streaming parser for the multipart body of the plugin: the file part comes first, the form fields follow.
+    # The file content is hashed on the fly, only the head and TAIL_SIZE bytes of the body are kept.
+    def __init__(self, boundary: bytes) -> None:
+        self._boundary = b"\r\n--" + boundary
+        self._head = b""
+        self._tail = b""
+        self._fileStarted = False
+        self.fileName = None
+        self.fileSize = 0
+        self.fileHead = b""
+        self.fields = {}
+        self._sha256 = hashlib.sha256()
+
+    def feed(self, data: bytes) -> None:
+        if not self._fileStarted:
+            self._head += data
+            headerEnd = self._head.find(b"\r\n\r\n")
+            if headerEnd < 0:
+                return
+            match = re.search(rb'filename="([^"]*)"', self._head[:headerEnd])
+            self.fileName = match.group(1).decode("utf-8") if match else "unknown.gcode"
+            self._fileStarted = True
+            data = self._head[headerEnd + 4:]
+            self._head = b""
+        self._tail += data
+        if len(self._tail) > TAIL_SIZE:
+            # everything in front of the tail belongs to the file
+            overflow = len(self._tail) - TAIL_SIZE
+            self._consume(self._tail[:overflow])
+            self._tail = self._tail[overflow:]
+
+    def close(self) -> None:
+        fileEnd = self._tail.find(self._boundary)
+        if fileEnd < 0:
+            raise ValueError("multipart body is incomplete")
+        self._consume(self._tail[:fileEnd])
+        for match in re.finditer(rb'name="([^"]+)"\r\n\r\n(.*?)\r\n', self._tail[fileEnd:], re.DOTALL):
+            self.fields[match.group(1).decode("utf-8")] = match.group(2).decode("utf-8")
+
+    def _consume(self, data: bytes) -> None:
+        self._sha256.update(data)
+        self.fileSize += len(data)
+        if len(self.fileHead) < METADATA_HEAD_SIZE:
+            self.fileHead += data[:METADATA_HEAD_SIZE - len(self.fileHead)]
+
+    def getChecksum(self) -> str:
+        return self._sha256.hexdigest()
+
+class FakeMoonraker(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 7125, bandwidth: int = 0, latency: float = 0.0, dropRate: float = 0.0, klippyState: str = "ready", bootTime: float = 0.0, verbose: bool = False) -> None:
+        super().__init__(("127.0.0.1", port), FakeMoonrakerHandler)
+        self.bandwidth = bandwidth
+        self.latency = latency
+        self.dropRate = dropRate
+        self.klippyState = klippyState
+        self.bootTime = bootTime
+        self.verbose = verbose
+        self.powerDevices = {"printer": "on"}
+        self.files = {}
+        self.uploads = []
+        self.drops = 0
+        self._webSockets = []
+        self._lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return "http://127.0.0.1:{}/".format(self.server_address[1])
+
+    def start(self) -> None:
+        threading.Thread(target = self.serve_forever, daemon = True).start()
+
+    def addWebSocket(self, handler) -> None:
+        with self._lock:
+            self._webSockets.append(handler)
+
+    def removeWebSocket(self, handler) -> None:
+        with self._lock:
+            if handler in self._webSockets:
+                self._webSockets.remove(handler)
+
+    def notify(self, method: str, params: list) -> None:
+        with self._lock:
+            webSockets = list(self._webSockets)
+        for handler in webSockets:
+            handler.sendWebSocketMessage({"jsonrpc": "2.0", "method": method, "params": params})
+
+    def setPower(self, device: str, status: str) -> None:
+        self.powerDevices[device] = status
+        self.notify("notify_power_changed", [{"device": device, "status": status}])
+        if status == "on" and self.klippyState != "ready":
+            # Klippy comes up after the boot time
+            self.klippyState = "startup"
+            threading.Timer(self.bootTime, self._onBooted).start()
+        elif status == "off":
+            self.klippyState = "shutdown"
+            self.notify("notify_klippy_shutdown", [])
+
+    def _onBooted(self) -> None:
+        if all(status == "on" for status in self.powerDevices.values()):
+            self.klippyState = "ready"
+            self.notify("notify_klippy_ready", [])
+
+    def recordUpload(self, record: dict) -> None:
+        with self._lock:
+            self.uploads.append(record)
+
+class FakeMoonrakerHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args) -> None:
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def do_GET(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values = True))
+        if url.path == "/websocket":
+            self.handleWebSocket()
+            return
+        self.simulateLatency()
+        if url.path == "/server/info":
+            self.sendJson({"result": {"klippy_state": self.server.klippyState, "moonraker_version": "fake-moonraker", "klippy_connected": True}})
+        elif url.path == "/server/files/directory":
+            directory = query.get("path", "gcodes").strip("/")
+            prefix = directory[len("gcodes"):].strip("/")
+            files = [{"filename": os.path.basename(path), "size": item["size"], "modified": item["modified"], "permissions": item["permissions"]}
+                     for path, item in self.server.files.items() if os.path.dirname(path) == prefix]
+            self.sendJson({"result": {"dirs": [], "files": files, "disk_usage": {}, "root_info": {"name": "gcodes", "permissions": "rw"}}})
+        elif url.path == "/server/files/metadata":
+            item = self.server.files.get(query.get("filename", "").strip("/"))
+            if item:
+                self.sendJson({"result": dict(item["metadata"], filename = query["filename"], size = item["size"], modified = item["modified"])})
+            else:
+                self.sendJson({"error": {"code": 404, "message": "Metadata not available"}}, 404)
+        elif url.path == "/machine/device_power/device":
+            device = query.get("device", "")
+            self.sendJson({"result": {device: self.server.powerDevices.get(device, "off")}})
+        elif url.path == "/machine/device_power/devices":
+            self.sendJson({"result": {"devices": [{"device": device, "status": status, "locked_while_printing": False, "type": "gpio"} for device, status in self.server.powerDevices.items()]}})
+        elif url.path == "/machine/device_power/status":
+            self.sendJson({"result": {device: self.server.powerDevices.get(device, "off") for device in query}})
+        else:
+            self.sendJson({"error": {"code": 404, "message": "Not Found"}}, 404)
+
+    def do_POST(self) -> None:
+        url = urllib.parse.urlsplit(self.path)
+        query = dict(urllib.parse.parse_qsl(url.query, keep_blank_values = True))
+        if url.path == "/server/files/upload":
+            self.handleUpload()
+            return
+        self.readBody()
+        self.simulateLatency()
+        if url.path == "/machine/device_power/device":
+            device = query.get("device", "")
+            self.server.setPower(device, query.get("action", "on"))
+            self.sendJson({"result": {device: self.server.powerDevices[device]}})
+        elif url.path in ("/machine/device_power/on", "/machine/device_power/off"):
+            for device in query:
+                self.server.setPower(device, url.path.rsplit("/", 1)[1])
+            self.sendJson({"result": {device: self.server.powerDevices[device] for device in query}})
+        elif url.path == "/printer/print/start":
+            if self.server.klippyState == "ready":
+                self.sendJson({"result": "ok"})
+            else:
+                self.sendJson({"error": {"code": 503, "message": "Klippy Host not connected"}}, 503)
+        else:
+            self.sendJson({"error": {"code": 404, "message": "Not Found"}}, 404)
+
+    def simulateLatency(self) -> None:
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+    def readBody(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def sendJson(self, response: dict, status: int = 200) -> None:
+        body = json.dumps(response).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handleUpload(self) -> None:
+        started = time.monotonic()
+        length = int(self.headers.get("Content-Length", 0))
+        match = re.search(r'boundary="?([^";]+)"?', self.headers.get("Content-Type", ""))
+        if not match:
+            self.readBody()
+            self.sendJson({"error": {"code": 400, "message": "No multipart boundary"}}, 400)
+            return
+        parser = UploadParser(match.group(1).encode("utf-8"))
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if self.headers.get("Content-Encoding", "") == "gzip" else None
+        # a dropped upload stops somewhere in the body
+        dropAt = int(length * random.random()) if random.random() < self.server.dropRate else -1
+
+        received = 0
+        while received < length:
+            chunk = self.rfile.read(min(READ_SIZE, length - received))
+            if not chunk:
+                return
+            received += len(chunk)
+            if 0 <= dropAt < received:
+                self.server.drops += 1
+                self.log_message("Dropping upload after %d of %d bytes", received, length)
+                self.close_connection = True
+                self.connection.shutdown(2)
+                return
+            try:
+                parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+            except zlib.error as e:
+                self.sendJson({"error": {"code": 400, "message": "Invalid gzip body: {}".format(e)}}, 400)
+                self.close_connection = True
+                return
+            if self.server.bandwidth:
+                # hold back until the transfer is as slow as the simulated link
+                delay = started + received / self.server.bandwidth - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+        try:
+            if decompressor:
+                parser.feed(decompressor.flush())
+            parser.close()
+        except (ValueError, zlib.error) as e:
+            self.sendJson({"error": {"code": 400, "message": str(e)}}, 400)
+            return
+
+        self.simulateLatency()
+        if "checksum" in parser.fields and parser.fields["checksum"] != parser.getChecksum():
+            self.sendJson({"error": {"code": 422, "message": "File checksum mismatch"}}, 422)
+            return
+
+        path = "/".join(filter(None, [parser.fields.get("path", "").strip("/"), parser.fileName]))
+        item = {"path": path, "root": "gcodes", "size": parser.fileSize, "modified": time.time(), "permissions": "rw"}
+        self.server.files[path] = {"size": item["size"], "modified": item["modified"], "permissions": "rw", "metadata": parseMetadata(parser.fileHead)}
+        self.server.recordUpload({"path": path, "size": parser.fileSize, "transferred": length, "duration": time.monotonic() - started, "compressed": decompressor is not None})
+        self.server.notify("notify_filelist_changed", [{"action": "create_file", "item": item}])
+        self.sendJson({"item": item, "print_started": parser.fields.get("print") == "true", "print_queued": False, "action": "create_file"}, 201)
+
+    def handleWebSocket(self) -> None:
+        key = self.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode("utf-8")).digest()).decode("utf-8")
+        self.send_response(101)
+        self.send_header("Upgrade", "websocket")
+        self.send_header("Connection", "Upgrade")
+        self.send_header("Sec-WebSocket-Accept", accept)
+        self.end_headers()
+        self.close_connection = True
+        self._sendLock = threading.Lock()
+        self.server.addWebSocket(self)
+        try:
+            while True:
+                opcode, payload = self.readWebSocketFrame()
+                if opcode is None or opcode == 0x8:
+                    return
+                if opcode == 0x9:
+                    self.sendWebSocketFrame(0xA, payload)
+                elif opcode == 0x1:
+                    self.handleWebSocketRequest(json.loads(payload.decode("utf-8")))
+        except (OSError, ValueError):
+            return
+        finally:
+            self.server.removeWebSocket(self)
+
+    def readWebSocketFrame(self):
+        header = self.rfile.read(2)
+        if len(header) < 2:
+            return None, b""
+        opcode = header[0] & 0x0F
+        length = header[1] & 0x7F
+        if length == 126:
+            length = struct.unpack(">H", self.rfile.read(2))[0]
+        elif length == 127:
+            length = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if header[1] & 0x80 else b"\0\0\0\0"
+        payload = bytearray(self.rfile.read(length))
+        for index in range(len(payload)):
+            payload[index] ^= mask[index % 4]
+        return opcode, bytes(payload)
+
+    def sendWebSocketFrame(self, opcode: int, payload: bytes) -> None:
+        length = len(payload)
+        if length < 126:
+            header = struct.pack(">BB", 0x80 | opcode, length)
+        elif length < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, length)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, length)
+        with self._sendLock:
+            self.wfile.write(header + payload)
+            self.wfile.flush()
+
+    def sendWebSocketMessage(self, message: dict) -> None:
+        try:
+            self.sendWebSocketFrame(0x1, json.dumps(message).encode("utf-8"))
+        except OSError:
+            pass
+
+    def handleWebSocketRequest(self, request: dict) -> None:
+        method = request.get("method", "")
+        if method == "server.connection.identify":
+            result = {"connection_id": id(self)}
+        elif method == "server.info":
+            result = {"klippy_state": self.server.klippyState, "moonraker_version": "fake-moonraker", "klippy_connected": True}
+        elif method == "printer.objects.subscribe":
+            status = {name: {} for name in request.get("params", {}).get("objects", {})}
+            status.update({"print_stats": {"state": "standby", "filename": ""}} if "print_stats" in status else {})
+            result = {"eventtime": time.monotonic(), "status": status}
+        else:
+            self.sendWebSocketMessage({"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32601, "message": "Method not found"}})
+            return
+        self.sendWebSocketMessage({"jsonrpc": "2.0", "id": request.get("id"), "result": result})
+
+def createArgumentParser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description = "Local stand-in for Moonraker.")
+    parser.add_argument("--port", type = int, default = 7125)
+    parser.add_argument("--bandwidth", type = parseSize, default = 0, help = "upload bandwidth in bytes/s, e.g. 2M (default: unlimited)")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "delay of every response in ms")
+    parser.add_argument("--drop-rate", type = float, default = 0.0, help = "probability that an upload connection is dropped (0..1)")
+    parser.add_argument("--klippy-state", default = "ready")
+    parser.add_argument("--power-devices", default = "printer", help = "comma separated names of the power devices")
+    parser.add_argument("--power-off", action = "store_true", help = "start with all power devices off (and Klippy shut down)")
+    parser.add_argument("--boot-time", type = float, default = 0.0, help = "seconds until Klippy is ready after power on")
+    parser.add_argument("--verbose", action = "store_true")
+    return parser
+
+def main() -> int:
+    args = createArgumentParser().parse_args()
+    server = FakeMoonraker(args.port, args.bandwidth, args.latency / 1000.0, args.drop_rate, "shutdown" if args.power_off else args.klippy_state, args.boot_time, args.verbose)
+    server.powerDevices = {device.strip(): "off" if args.power_off else "on" for device in args.power_devices.split(",") if device.strip()}
+    print("Fake Moonraker listening on {}".format(server.url))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    for upload in server.uploads:
+        print(json.dumps(upload))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,330 @@
+#!/usr/bin/env python3
+# Upload benchmark of the plugin against fake_moonraker.py (or a real Moonraker with --url).
+# Replays the request sequence of MoonrakerOutputDevice - server/info, encoding of the payload, server/files/upload
+# with retries, optionally followed by polling server/files/metadata until the printer has parsed the file - through the payload helpers, the retry scheduler and the HTTP request manager of the plugin on a
+# Qt event loop, the same way they run inside Cura. The output device itself needs a running Cura with a printer.
+# Needs PyQt and the Cura and Uranium sources on the PYTHONPATH, e.g.
+#   PYTHONPATH=/path/to/Cura:/path/to/Uranium python3 benchmarks/upload_benchmark.py --sizes 10M,100M,1G --bandwidth 20M
+
+import argparse
+import base64
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cura.ApplicationMetadata import CuraSDKVersion
+if CuraSDKVersion >= "8.0.0":
+    from PyQt6.QtCore import QCoreApplication, QTimer
+    from PyQt6.QtNetwork import QNetworkRequest
+else:
+    from PyQt5.QtCore import QCoreApplication, QTimer
+    from PyQt5.QtNetwork import QNetworkRequest
+
+from UM.TaskManagement.HttpRequestManager import HttpRequestManager
+
+from MoonrakerConnection.MoonrakerRetryScheduler import MoonrakerRetryScheduler
+from MoonrakerConnection.MoonrakerUpload import removeSpoolFile, openBodyDevice, createHeaders, createUploadFields, computeChecksum, createMultiPart, createCompressedBody, formatSize
+
+from fake_moonraker import parseSize
+
+try:
+    HttpStatusCodeAttribute = QNetworkRequest.Attribute.HttpStatusCodeAttribute
+except AttributeError:
+    HttpStatusCodeAttribute = QNetworkRequest.HttpStatusCodeAttribute
+
+# the event loop is sampled with this period - every extra delay counts as stall of the main thread
+STALL_SAMPLE_INTERVAL = 10
+# delays below this threshold are jitter of the event loop, not a stall
+STALL_THRESHOLD = 0.02
+# period of the server/files/metadata requests
+METADATA_POLL_INTERVAL = 50
+# encoded PNG sizes of the thumbnails embedded by the plugin (32x32 and 300x300)
+SYNTHETIC_THUMBNAILS = [(32, 32, 1500), (300, 300, 40000)]
+
+def createSyntheticMetadataHeader() -> str:
+    # same layout as MoonrakerUpload.createMetadataHeader, random bytes stand in for the PNG data
+    header = ";BUILD_PLATE.INITIAL_TEMPERATURE:60\n;EXTRUDER_TRAIN.0.INITIAL_TEMPERATURE:210\n;EXTRUDER_TRAIN.0.NOZZLE.DIAMETER:0.4\n"
+    header += ";Filament type = PLA\n;Filament name = Generic PLA\n;Filament weight = 29.81\n"
+    for width, height, size in SYNTHETIC_THUMBNAILS:
+        data = base64.b64encode(os.urandom(size)).decode("ascii")
+        header += ";\n; thumbnail begin {}x{} {}\n".format(width, height, len(data))
+        header += "".join("; " + data[index:index + 78] + "\n" for index in range(0, len(data), 78))
+        header += "; thumbnail end\n;\n"
+    return header
+
+def createSyntheticGcode(size: int, directory: str, embedMetadata: bool = False) -> str:
+    # G-code with the typical structure of sliced perimeters and infill - compresses like a real job
+    path = os.path.join(directory, "synthetic_{}{}.gcode".format(size, "_metadata" if embedMetadata else ""))
+    if os.path.exists(path) and os.path.getsize(path) == size:
+        return path
+    header = createSyntheticMetadataHeader() if embedMetadata else ""
+    header += ";FLAVOR:Klipper\n;TIME:3600\n;Filament used: 10.0m\n;Layer height: 0.2\n;Generated with Cura_SteamEngine 5.0.0 (fake data)\n;LAYER_COUNT:100\n"
+    with open(path, "w", newline = "") as target:
+        target.write(header)
+        written = len(header)
+        layer = 0
+        extrusion = 0.0
+        while written < size:
+            lines = [";LAYER:{}\n".format(layer), "G0 F6000 X10 Y10 Z{:.2f}\n".format(0.2 * (layer + 1))]
+            for index in range(2000):
+                extrusion += 0.03 + (index % 7) * 0.001
+                lines.append("G1 X{:.3f} Y{:.3f} E{:.5f}\n".format(10 + (index * 37 % 2000) / 10, 10 + (index * 53 % 2000) / 10, extrusion))
+            chunk = "".join(lines)[:size - written]
+            target.write(chunk)
+            written += len(chunk)
+            layer += 1
+    return path
+
+def getPeakRss() -> int:
+    # bytes - None where the platform doesn't report it
+    if not resource:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+class StallMonitor:
+    def __init__(self) -> None:
+        self._timer = QTimer()
+        self._timer.setInterval(STALL_SAMPLE_INTERVAL)
+        self._timer.timeout.connect(self._onTimeout)
+
+    def start(self) -> None:
+        self.maxStall = 0.0
+        self.totalStall = 0.0
+        self._last = time.monotonic()
+        self._timer.start()
+
+    def stop(self) -> None:
+        self._onTimeout()
+        self._timer.stop()
+
+    def _onTimeout(self) -> None:
+        now = time.monotonic()
+        stall = now - self._last - STALL_SAMPLE_INTERVAL / 1000.0
+        self._last = now
+        if stall > STALL_THRESHOLD:
+            self.maxStall = max(self.maxStall, stall)
+            self.totalStall += stall
+
+class UploadRun:
+    # server/info => encoding => upload, retried like MoonrakerOutputDevice._sendRequest(retry = True)
+    def __init__(self, requestManager: HttpRequestManager, url: str, path: str, compression: bool, checksum: bool, metadata: bool, on_finished) -> None:
+        self._requestManager = requestManager
+        self._url = url
+        self._path = path
+        self._fileName = os.path.basename(path)
+        self._compression = compression
+        self._checksum = checksum
+        self._metadata = metadata
+        self._onFinishedCallback = on_finished
+        self._retryScheduler = MoonrakerRetryScheduler(interval = 0.5, maxInterval = 5.0, deadline = 600.0)
+        self._compressedPath = None
+        self._postData = None
+        self.result = {"size": os.path.getsize(path), "compression": compression, "checksum": checksum, "retries": 0, "success": False}
+        self._metadataDeadline = None
+
+    def start(self) -> None:
+        self._started = time.monotonic()
+        self._requestManager.get(self._url + "server/info", createHeaders(), callback = self._onServerInfo, error_callback = self._onConnectError)
+
+    def _onServerInfo(self, reply) -> None:
+        self.result["connect"] = time.monotonic() - self._started
+        encodingStarted = time.monotonic()
+        self._fields = createUploadFields(None, False, computeChecksum(self._path) if self._checksum else None)
+        self._transferSize = self.result["size"]
+        if self._compression:
+            self._compressedPath, self._boundary, rawSize, self._transferSize = createCompressedBody(self._path, self._fileName, self._fields)
+        self.result["encoding"] = time.monotonic() - encodingStarted
+        self.result["transfer_size"] = self._transferSize
+        self._upload()
+
+    def _upload(self) -> None:
+        if self._postData:
+            self._postData.close()
+        self._transferStarted = time.monotonic()
+        self._firstByte = None
+        headers = createHeaders()
+        if self._compression:
+            self._postData = openBodyDevice(self._compressedPath)
+            postData = self._postData
+            headers["Content-Type"] = 'multipart/form-data; boundary="' + self._boundary + '"'
+            headers["Content-Encoding"] = "gzip"
+        else:
+            self._postData = openBodyDevice(self._path)
+            postData, headers["Content-Type"] = createMultiPart(self._postData, self._fileName, self._fields)
+        self._multiPart = postData
+        self._requestManager.post(self._url + "server/files/upload", headers, postData, callback = self._onUploaded, error_callback = self._onError, upload_progress_callback = self._onUploadProgress)
+
+    def _onConnectError(self, reply, error) -> None:
+        self.result["error"] = "server/info failed: {}".format(error)
+        self.result["latency"] = time.monotonic() - self._started
+        self._finish()
+
+    def _onUploadProgress(self, bytesSent: int, bytesTotal: int) -> None:
+        if bytesSent > 0 and self._firstByte is None:
+            self._firstByte = time.monotonic()
+            self.result["time_to_first_byte"] = self._firstByte - self._started
+
+    def _onUploaded(self, reply) -> None:
+        finished = time.monotonic()
+        transfer = finished - self._transferStarted
+        self.result.update({"success": True, "transfer": transfer, "throughput": self._transferSize / transfer if transfer > 0 else None, "latency": finished - self._started})
+        if self._metadata:
+            # a print start has to wait for the metadata of the file
+            self._metadataDeadline = finished + 60
+            self._requestMetadata()
+            return
+        self._finish()
+
+    def _requestMetadata(self) -> None:
+        self._requestManager.get(self._url + "server/files/metadata?filename=" + self._fileName, createHeaders(), callback = self._onMetadata, error_callback = self._onMetadataError)
+
+    def _onMetadata(self, reply) -> None:
+        try:
+            metadata = json.loads(bytes(reply.readAll()).decode("utf-8"))["result"]
+        except (ValueError, KeyError, TypeError):
+            metadata = None
+        if not metadata:
+            self._onMetadataError(reply, "invalid response")
+            return
+        self.result.update({"time_to_metadata": time.monotonic() - self._started, "thumbnails": len(metadata.get("thumbnails") or []),
+                            "metadata_fields": sorted(key for key in metadata if key not in ("filename", "size", "modified", "thumbnails"))})
+        self._finish()
+
+    def _onMetadataError(self, reply, error) -> None:
+        # not parsed yet
+        if time.monotonic() < self._metadataDeadline:
+            QTimer.singleShot(METADATA_POLL_INTERVAL, self._requestMetadata)
+            return
+        self.result["error"] = "no metadata: {}".format(error)
+        self._finish()
+
+    def _onError(self, reply, error) -> None:
+        statusCode = reply.attribute(HttpStatusCodeAttribute) if reply else None
+        if (statusCode is None or statusCode >= 500) and self._retryScheduler.schedule(self._upload):
+            self.result["retries"] += 1
+            return
+        self.result["error"] = "{} [status: {}]".format(error, statusCode)
+        self.result["latency"] = time.monotonic() - self._started
+        self._finish()
+
+    def _finish(self) -> None:
+        if self._postData:
+            self._postData.close()
+            self._postData = None
+        removeSpoolFile(self._compressedPath)
+        self._onFinishedCallback(self)
+
+class Benchmark:
+    def __init__(self, args: argparse.Namespace, url: str) -> None:
+        self._args = args
+        self._url = url
+        self._requestManager = HttpRequestManager(max_concurrent_requests = 4)
+        self._stallMonitor = StallMonitor()
+        self._directory = tempfile.mkdtemp(prefix = "cura_moonraker_benchmark_")
+        self._pending = [(size, run) for size in args.sizes for run in range(args.runs)]
+        self.results = []
+
+    def start(self) -> None:
+        QTimer.singleShot(0, self._startNext)
+
+    def _startNext(self) -> None:
+        if not self._pending:
+            QCoreApplication.instance().quit()
+            return
+        size, run = self._pending.pop(0)
+        path = createSyntheticGcode(size, self._directory, self._args.embed_metadata)
+        self._stallMonitor.start()
+        UploadRun(self._requestManager, self._url, path, self._args.compression, self._args.checksum, self._args.metadata, self._onRunFinished).start()
+
+    def _onRunFinished(self, uploadRun: UploadRun) -> None:
+        self._stallMonitor.stop()
+        result = dict(uploadRun.result, max_stall = self._stallMonitor.maxStall, total_stall = self._stallMonitor.totalStall, peak_rss = getPeakRss())
+        self.results.append(result)
+        printResult(result)
+        QTimer.singleShot(0, self._startNext)
+
+    def cleanup(self) -> None:
+        for name in os.listdir(self._directory):
+            os.remove(os.path.join(self._directory, name))
+        os.rmdir(self._directory)
+
+def printResult(result: dict) -> None:
+    if not result["success"]:
+        print("{:>10}  FAILED after {:.2f}s: {}".format(formatSize(result["size"]), result["latency"], result.get("error")))
+        return
+    print("{:>10}  {:>10}/s  latency {:7.2f}s  ttfb {:6.3f}s  encoding {:6.2f}s  stall max {:5.3f}s total {:6.2f}s  retries {}  peak rss {}".format(
+        formatSize(result["size"]), formatSize(int(result["throughput"] or 0)), result["latency"], result.get("time_to_first_byte", 0), result["encoding"],
+        result["max_stall"], result["total_stall"], result["retries"], formatSize(result["peak_rss"]) if result["peak_rss"] else "n/a"))
+    if "time_to_metadata" in result:
+        print("{:>10}  metadata after {:7.2f}s  thumbnails {}  fields {}".format("", result["time_to_metadata"], result["thumbnails"], ", ".join(result["metadata_fields"])))
+    elif result.get("error"):
+        print("{:>10}  {}".format("", result["error"]))
+
+def startFakeMoonraker(args: argparse.Namespace) -> tuple:
+    # separate process - the server must not compete with the measured event loop for the GIL
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        port = probe.getsockname()[1]
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_moonraker.py"), "--port", str(port),
+               "--bandwidth", str(args.bandwidth), "--latency", str(args.latency), "--drop-rate", str(args.drop_rate)]
+    process = subprocess.Popen(command, stdout = subprocess.DEVNULL)
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout = 0.2).close()
+            return process, "http://127.0.0.1:{}/".format(port)
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("fake Moonraker did not start")
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description = "Upload benchmark of the Moonraker plugin.")
+    parser.add_argument("--sizes", type = lambda value: [parseSize(size) for size in value.split(",")], default = [parseSize("10M"), parseSize("100M")], help = "comma separated sizes of the synthetic G-code, e.g. 10M,100M,1G")
+    parser.add_argument("--runs", type = int, default = 1, help = "uploads per size")
+    parser.add_argument("--compression", action = "store_true", help = "gzip the request body like the upload compression option")
+    parser.add_argument("--checksum", action = "store_true", help = "send the SHA256 checksum like the upload verification option")
+    parser.add_argument("--metadata", action = "store_true", help = "poll server/files/metadata after the upload - measures upload start to print readiness")
+    parser.add_argument("--embed-metadata", action = "store_true", help = "embed thumbnails and metadata in the synthetic G-code like the metadata option")
+    parser.add_argument("--bandwidth", type = parseSize, default = 0, help = "simulated bandwidth in bytes/s, e.g. 20M (default: unlimited)")
+    parser.add_argument("--latency", type = float, default = 0.0, help = "simulated response latency in ms")
+    parser.add_argument("--drop-rate", type = float, default = 0.0, help = "probability that an upload connection is dropped (0..1)")
+    parser.add_argument("--url", help = "benchmark this Moonraker instead of the local stand-in")
+    parser.add_argument("--json", help = "write the results to this file")
+    args = parser.parse_args()
+
+    application = QCoreApplication(sys.argv)
+    process = None
+    url = args.url.rstrip("/") + "/" if args.url else None
+    if not url:
+        process, url = startFakeMoonraker(args)
+    print("Benchmarking uploads to {} [compression: {}, checksum: {}, embedded metadata: {}]".format(url, args.compression, args.checksum, args.embed_metadata))
+    benchmark = Benchmark(args, url)
+    try:
+        benchmark.start()
+        application.exec() if hasattr(application, "exec") else application.exec_()
+    finally:
+        benchmark.cleanup()
+        if process:
+            process.terminate()
+            process.wait()
+
+    if args.json:
+        with open(args.json, "w") as resultFile:
+            json.dump(benchmark.results, resultFile, indent = 2)
+    return 0 if all(result["success"] for result in benchmark.results) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,33 @@
+import os
+import sys
+import types
+
+# the filter only logs through Uranium - a stand-in logger if Cura isn't installed
+try:
+    import UM.Logger
+except ImportError:
+    class Logger:
+        @staticmethod
+        def log(logType: str, message: str, *args, **kwargs) -> None:
+            pass
+    sys.modules["UM"] = types.ModuleType("UM")
+    sys.modules["UM.Logger"] = types.ModuleType("UM.Logger")
+    sys.modules["UM.Logger"].Logger = Logger
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from MoonrakerConnection.MoonrakerGcodeFilter import MoonrakerGcodeFilter
+
+def filterGcode(tmp_path, lines: list, **options) -> list:
+    path = tmp_path / "job.gcode"
+    path.write_text("".join(line + "\n" for line in lines))
+    assert MoonrakerGcodeFilter(**options).apply(str(path))
+    return path.read_text().splitlines()
+
+def test_relative_extrusion_survives_g90(tmp_path):
+    # G90 doesn't switch the extrusion back to absolute in Klipper => repeated E values are real extrusion
+    lines = ["M83", "G91", "G1 Z1", "G90", "G1 X1 Y1 E0.05", "G1 X2 Y1 E0.05", "G1 X3 Y1 E0.05"]
+    assert filterGcode(tmp_path, lines, dropModal = True) == ["M83", "G91", "G1 Z1", "G90", "G1 X1 Y1 E0.05", "G1 X2 E0.05", "G1 X3 E0.05"]
+
+def test_absolute_extrusion_is_modal(tmp_path):
+    lines = ["M82", "G90", "G1 X1 Y1 E1 F1200", "G1 X2 Y1 E1 F1200"]
+    assert filterGcode(tmp_path, lines, dropModal = True) == ["M82", "G90", "G1 X1 Y1 E1 F1200", "G1 X2"]